@@ -0,0 +1 @@
+Packuments of distributions without a remote are now rendered on the content app event loop using the async ORM, so they no longer occupy content app threads.
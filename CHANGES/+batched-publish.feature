@@ -0,0 +1 @@
+Packages uploaded with ``npm publish`` in quick succession are now added to their repository in a single repository version, see ``NPM_PUBLISH_BATCH_WINDOW``.
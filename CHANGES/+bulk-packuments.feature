@@ -0,0 +1 @@
+Added a ``packuments`` action to npm distributions that returns the packuments of many packages in one newline delimited JSON response.
@@ -0,0 +1,3 @@
+Added an ``import`` action to npm repositories, importing the tarballs of a directory of the Pulp
+server, like the storage of Verdaccio, into a single new repository version. The tarballs are
+hashed in ``NPM_IMPORT_PROCESSES`` processes.
@@ -0,0 +1,2 @@
+Added the ``npm dist-tag`` endpoints, ``/-/package/<name>/dist-tags``. Changing a dist-tag does not
+create a repository version, and only the cached dist-tags of that package are invalidated.
@@ -0,0 +1,3 @@
+The content app now caches the repository version and tarball URL prefix each distribution
+serves, instead of querying them on every request. New and deleted repository versions invalidate
+the cache of every process through a PostgreSQL notification channel.
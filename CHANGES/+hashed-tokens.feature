@@ -0,0 +1,5 @@
+npm auth tokens are now stored as HMACs and verified against a short lived in-process cache,
+configured with ``NPM_TOKEN_CACHE_TTL``. ``npm logout`` revokes the token, immediately in all
+processes.
+Tokens expire after ``NPM_TOKEN_MAX_AGE`` seconds, and logging in again deletes the oldest
+tokens of a user beyond ``NPM_MAX_TOKENS_PER_USER``.
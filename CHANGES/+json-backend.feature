@@ -0,0 +1 @@
+Packuments and npm publish documents are now encoded and decoded with orjson or msgspec when installed (`pulp-npm[orjson]`/`pulp-npm[msgspec]`), selectable with the `NPM_JSON_BACKEND` setting.
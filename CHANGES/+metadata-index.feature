@@ -0,0 +1 @@
+Added the `NPM_METADATA_INDEX_DIR` setting. When set, every new repository version gets a memory-mapped packument index that content app processes read instead of querying the database.
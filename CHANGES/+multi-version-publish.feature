@@ -0,0 +1,3 @@
+Every version attached to an ``npm publish`` document is now added, in a single repository
+version, and the dist-tags of the document are stored and served in packuments. Documents
+carrying only dist-tags are accepted.
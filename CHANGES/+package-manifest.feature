@@ -0,0 +1,2 @@
+Packages now store the install-time fields of their package.json, such as ``engines``, ``bin``, peer and optional dependencies, ``fileCount`` and ``unpackedSize``, and serve them in packuments.
+The package.json of uploaded tarballs is read while the upload is decoded, and synced and pull-through packages take it from the upstream packument.
@@ -0,0 +1 @@
+Packuments are now built from a single joined query over the needed columns and advertise `shasum`/`integrity` for tarballs whose digests are known.
@@ -0,0 +1 @@
+Added the `NPM_PACKUMENT_SQL_RENDERING` setting to build the packument `versions` object inside PostgreSQL.
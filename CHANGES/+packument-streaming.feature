@@ -0,0 +1 @@
+Added the `NPM_PACKUMENT_STREAMING` setting to send packuments version by version with chunked encoding.
@@ -0,0 +1,3 @@
+``npm publish`` now matches the integrity and shasum declared by the publish document against
+existing packages and artifacts. Known versions are linked to the repository without decoding
+or storing their tarball again.
@@ -0,0 +1 @@
+``npm publish`` requests now only spool the request body; parsing, hashing and creating the package happen in the publish task.
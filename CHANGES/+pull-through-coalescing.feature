@@ -0,0 +1 @@
+Concurrent requests for a packument missing from a pull-through distribution now share a single upstream fetch.
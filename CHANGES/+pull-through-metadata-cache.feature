@@ -0,0 +1,2 @@
+Pull-through distributions now cache the packuments fetched from their remote for a configurable ``metadata_ttl``.
+Expired packuments are served while being refreshed in the background (``NPM_METADATA_STALE_WHILE_REVALIDATE``), and when the remote fails (``NPM_METADATA_STALE_IF_ERROR``).
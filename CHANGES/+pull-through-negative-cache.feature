@@ -0,0 +1 @@
+Pull-through distributions now remember packages missing from their remote for ``NPM_NEGATIVE_CACHE_TTL`` seconds, instead of asking the remote again on every request.
@@ -0,0 +1 @@
+Added opt-in prefetching to pull-through distributions: with ``prefetch_depth`` set, fetching a packument from the remote also fetches the tarball of its latest version and warms the packuments of its dependencies, within a per-distribution ``prefetch_concurrency`` budget.
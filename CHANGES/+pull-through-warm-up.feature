@@ -0,0 +1 @@
+Added a ``warm-up`` action to npm distributions that fetches the packages of a lockfile or a list of ``name@version`` specs through the remote, and records them as content.
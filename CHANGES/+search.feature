@@ -0,0 +1,2 @@
+Distributions now implement the registry search API, ``/-/v1/search``, so ``npm search`` works against them.
+Package names and descriptions are searched through trigram indexes, which requires the ``pg_trgm`` PostgreSQL extension.
@@ -0,0 +1 @@
+``npm publish`` request bodies are now parsed incrementally, and tarballs are base64-decoded and hashed straight to a temporary file instead of being held in memory.
@@ -0,0 +1,3 @@
+With object storage, published tarballs are now written to the storage while they are decoded,
+as a multipart upload, instead of to a local temporary file first. Controlled by
+``NPM_STREAM_UPLOADS_TO_STORAGE``.
@@ -9,3 +9,7 @@ class PulpNpmPluginAppConfig(PulpPluginAppConfig):
     version = "0.4.0.dev"
     python_package_name = "pulp-npm"
     domain_compatible = True
+
+    def ready(self):
+        super().ready()
+        from . import signals  # noqa
@@ -0,0 +1,538 @@
+"""
+In-process caches of the content app and the API.
+
+The content app resolves the same distributions over and over, and the API verifies the same
+auth tokens over and over. Entries that depend on the database are invalidated through the
+``NOTIFY_CHANNEL`` PostgreSQL channel: the processes that change a repository or revoke a token
+send a notification, and every process using these caches listens to it (see ``listen_in_task()``
+and ``listen_in_thread()``). Caches that need it are bypassed while the listener is not
+connected, so a lost connection never serves stale data.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from logging import getLogger
+
+import psycopg
+from django.conf import settings
+from django.db import connection, transaction
+
+log = getLogger(__name__)
+
+NOTIFY_CHANNEL = "pulp_npm_invalidate"
+
+# Django specific entries of DATABASES["default"]["OPTIONS"] that psycopg does not understand
+DJANGO_DATABASE_OPTIONS = ("isolation_level", "server_side_binding", "pool", "assume_role")
+
+RECONNECT_DELAY = 5
+
+
+def connection_params():
+    """
+    The psycopg connection parameters of the default database.
+    """
+    database = settings.DATABASES["default"]
+    params = {
+        "dbname": database.get("NAME"),
+        "user": database.get("USER"),
+        "password": database.get("PASSWORD"),
+        "host": database.get("HOST"),
+        "port": database.get("PORT"),
+    }
+    for option, value in database.get("OPTIONS", {}).items():
+        if option not in DJANGO_DATABASE_OPTIONS:
+            params[option] = value
+    return {key: value for key, value in params.items() if value}
+
+
+class InvalidatedCache:
+    """
+    Base of the caches invalidated through ``NOTIFY_CHANNEL``.
+
+    An entry read from the database while an invalidation arrives is stale as soon as it is
+    stored. Invalidations bump the generation of the scope they apply to, like a repository, and
+    ``clear()`` the generation of the whole cache: callers take the generation of an entry before
+    querying the database and pass it to ``set()``, which drops the entry if it changed.
+
+    Beyond ``MAX_ENTRIES``, the least recently used entries are evicted.
+    """
+
+    # Number of entries kept, None keeps them all
+    MAX_ENTRIES = None
+
+    # Number of invalidated scopes remembered, after which the cache starts over
+    MAX_GENERATIONS = 100000
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._generations = {}
+
+    def _generation(self, scope):
+        return self._epoch, self._generations.get(scope, 0)
+
+    def _is_current(self, scope, generation):
+        # to be called with the lock held
+        return self.enabled and generation == self._generation(scope)
+
+    def _bump(self, scope):
+        # to be called with the lock held
+        if len(self._generations) >= self.MAX_GENERATIONS:
+            self._clear()
+        else:
+            self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry):
+        # to be called with the lock held
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if self.MAX_ENTRIES is not None:
+            while len(self._entries) > self.MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def _clear(self):
+        self._entries.clear()
+        self._generations.clear()
+        self._epoch += 1
+
+    def clear(self):
+        """
+        Drop all entries.
+        """
+        with self._lock:
+            self._clear()
+
+
+class ResolutionCache(InvalidatedCache):
+    """
+    Remembers which repository version and tarball URL prefix a distribution serves.
+
+    Entries are keyed on the distribution attributes the resolution depends on, so editing a
+    distribution simply stops hitting its old entry. New or deleted repository versions drop the
+    entries of their repository.
+    """
+
+    @staticmethod
+    def key(distribution):
+        """
+        The cache key of a distribution.
+        """
+        return (
+            distribution.pk,
+            distribution.repository_id,
+            distribution.repository_version_id,
+            distribution.base_path,
+            distribution.pulp_domain.name,
+        )
+
+    def get(self, distribution):
+        """
+        Get the cached ``(repository_version, prefix_url)`` of a distribution, if any.
+        """
+        if not self.enabled:
+            return None
+        return self._get(self.key(distribution))
+
+    def generation(self, distribution):
+        """
+        The generation of the entry of a distribution, to pass to ``set()``.
+        """
+        return self._generation(str(distribution.repository_id))
+
+    def set(self, distribution, repository_version, prefix_url, generation):
+        """
+        Cache the resolution of a distribution, unless its repository changed since
+        ``generation``.
+        """
+        with self._lock:
+            if self._is_current(str(distribution.repository_id), generation):
+                self._store(self.key(distribution), (repository_version, prefix_url))
+
+    def invalidate_repository(self, repository_pk):
+        """
+        Drop the entries of distributions serving a repository.
+        """
+        with self._lock:
+            self._bump(repository_pk)
+            for key in [key for key in self._entries if str(key[1]) == repository_pk]:
+                self._entries.pop(key, None)
+
+
+resolutions = ResolutionCache()
+
+
+class PackumentCache:
+    """
+    Least recently used cache of packuments fetched from remotes, bounded in bytes.
+
+    Entries are never invalidated, callers decide from their age whether they are still usable.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        """
+        Get the cached packument of a key and its age in seconds, or None.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        body, stored_at = entry
+        return body, time.monotonic() - stored_at
+
+    def set(self, key, body):
+        """
+        Cache a packument, evicting the least recently used ones if needed.
+        """
+        self.pop(key)
+        if len(body) > self.max_bytes:
+            return
+        self._entries[key] = (body, time.monotonic())
+        self._size += len(body)
+        while self._size > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def pop(self, key):
+        """
+        Drop the entry of a key, if any.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+
+    def clear(self):
+        """
+        Drop all entries.
+        """
+        self._entries.clear()
+        self._size = 0
+
+
+upstream_packuments = PackumentCache(settings.NPM_METADATA_CACHE_MAX_BYTES)
+
+
+class NegativeCache:
+    """
+    Least recently used set of keys known to be missing, each remembered for ``ttl`` seconds.
+    """
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._expiries = OrderedDict()
+
+    def __contains__(self, key):
+        expires_at = self._expiries.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self._expiries[key]
+            return False
+        self._expiries.move_to_end(key)
+        return True
+
+    def add(self, key):
+        """
+        Remember that a key is missing.
+        """
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        self._expiries[key] = time.monotonic() + self.ttl
+        self._expiries.move_to_end(key)
+        while len(self._expiries) > self.max_entries:
+            self._expiries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drop all entries.
+        """
+        self._expiries.clear()
+
+
+missing_upstream = NegativeCache(
+    settings.NPM_NEGATIVE_CACHE_TTL, settings.NPM_NEGATIVE_CACHE_MAX_ENTRIES
+)
+
+
+class TokenCache(InvalidatedCache):
+    """
+    Remembers verified auth tokens for ``NPM_TOKEN_CACHE_TTL`` seconds.
+
+    Entries are keyed on the digest of the token, the tokens themselves are not kept in memory.
+    Revoking a token drops the entries of its ``AuthToken.key``.
+    """
+
+    MAX_ENTRIES = 10000
+
+    def get(self, digest):
+        """
+        Get the cached ``AuthToken`` of a token digest, if any.
+        """
+        if not self.enabled:
+            return None
+        entry = self._get(digest)
+        if entry is None:
+            return None
+        auth_token, expires_at = entry
+        if expires_at <= time.monotonic():
+            with self._lock:
+                self._entries.pop(digest, None)
+            return None
+        return auth_token
+
+    def generation(self, token_key):
+        """
+        The generation of the entries of an ``AuthToken.key``, to pass to ``set()``.
+        """
+        return self._generation(token_key)
+
+    def set(self, digest, auth_token, generation):
+        """
+        Cache a verified token, unless it was revoked since ``generation``.
+        """
+        if settings.NPM_TOKEN_CACHE_TTL <= 0:
+            return
+        with self._lock:
+            if self._is_current(auth_token.key, generation):
+                expires_at = time.monotonic() + settings.NPM_TOKEN_CACHE_TTL
+                self._store(digest, (auth_token, expires_at))
+
+    def invalidate_token(self, token_key):
+        """
+        Drop the entries of a revoked token, identified by its ``AuthToken.key``.
+        """
+        with self._lock:
+            self._bump(token_key)
+            for key, (auth_token, _) in list(self._entries.items()):
+                if auth_token.key == token_key:
+                    self._entries.pop(key, None)
+
+
+tokens = TokenCache()
+
+
+class DistTagCache(InvalidatedCache):
+    """
+    Remembers the stored dist-tags of package names, including names without any.
+
+    Entries are keyed on ``(repository_pk, name)`` and dropped one name at a time when its tags
+    change, so moving a tag does not affect the other packages of a repository.
+    """
+
+    MAX_ENTRIES = 100000
+
+    def get(self, repository_pk, name):
+        """
+        Get the cached ``{tag: version}`` of a package name, or None.
+        """
+        if not self.enabled:
+            return None
+        return self._get((str(repository_pk), name))
+
+    def generation(self, repository_pk, name):
+        """
+        The generation of the entry of a package name, to pass to ``set()``.
+        """
+        return self._generation((str(repository_pk), name))
+
+    def set(self, repository_pk, name, tags, generation):
+        """
+        Cache the ``{tag: version}`` of a package name, unless they changed since ``generation``.
+        """
+        key = (str(repository_pk), name)
+        with self._lock:
+            if self._is_current(key, generation):
+                self._store(key, tags)
+
+    def invalidate(self, repository_pk, name):
+        """
+        Drop the entry of a package name.
+        """
+        key = (str(repository_pk), name)
+        with self._lock:
+            self._bump(key)
+            self._entries.pop(key, None)
+
+
+dist_tags = DistTagCache()
+
+
+def handle_notification(payload):
+    """
+    Apply an invalidation sent on ``NOTIFY_CHANNEL``.
+    """
+    message = json.loads(payload)
+    if "repository" in message:
+        resolutions.invalidate_repository(message["repository"])
+    if "token" in message:
+        tokens.invalidate_token(message["token"])
+    if "dist_tags" in message:
+        dist_tags.invalidate(*message["dist_tags"])
+
+
+def set_listening(listening):
+    """
+    Enable or disable the caches depending on whether invalidations are received.
+    """
+    for cache in (resolutions, tokens, dist_tags):
+        cache.enabled = listening
+        cache.clear()
+
+
+def _listen_forever():
+    while True:
+        try:
+            with psycopg.connect(**connection_params(), autocommit=True) as conn:
+                conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                set_listening(True)
+                for notification in conn.notifies():
+                    handle_notification(notification.payload)
+        except Exception:
+            log.exception("Listening for npm cache invalidations failed, retrying.")
+        finally:
+            set_listening(False)
+        time.sleep(RECONNECT_DELAY)
+
+
+async def _alisten_forever():
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(
+                **connection_params(), autocommit=True
+            ) as conn:
+                await conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                set_listening(True)
+                async for notification in conn.notifies():
+                    handle_notification(notification.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Listening for npm cache invalidations failed, retrying.")
+        finally:
+            set_listening(False)
+        await asyncio.sleep(RECONNECT_DELAY)
+
+
+_listener_task = None
+
+
+def listen_in_task():
+    """
+    Apply the invalidations sent by other processes from a task of the running event loop.
+
+    For the content app, whose handlers call it. Starts the task on the first call, the caches
+    stay disabled until it is connected.
+    """
+    global _listener_task
+    loop = asyncio.get_running_loop()
+    if _listener_task is None or _listener_task.done() or _listener_task.get_loop() is not loop:
+        _listener_task = loop.create_task(_alisten_forever())
+
+
+_listener_lock = threading.Lock()
+_listener = None
+
+
+def listen_in_thread():
+    """
+    Apply the invalidations sent by other processes from a daemon thread.
+
+    For processes without an event loop, like the API workers. Starts the thread on the first
+    call, the caches stay disabled until it is connected.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(
+                target=_listen_forever, name="npm-cache-invalidations", daemon=True
+            )
+            _listener.start()
+
+
+def notify(message):
+    """
+    Send an invalidation to all listening processes, once the current transaction commits.
+    """
+    payload = json.dumps(message)
+    transaction.on_commit(partial(handle_notification, payload))
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", [NOTIFY_CHANNEL, payload])
+
+
+def notify_repository_changed(repository_pk):
+    """
+    Tell the content app that the latest version of a repository changed.
+    """
+    notify({"repository": str(repository_pk)})
+
+
+def notify_dist_tags_changed(repository_pk, name):
+    """
+    Tell the content app that the dist-tags of a package name changed in a repository.
+    """
+    notify({"dist_tags": [str(repository_pk), name]})
+
+
+def notify_token_revoked(token_key):
+    """
+    Tell the API workers that an auth token was revoked.
+    """
+    notify({"token": token_key})
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single execution.
+
+    The first caller for a key starts the call, callers arriving while it runs wait for the same
+    result or exception. A caller being cancelled does not cancel the call for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    def start(self, key, function):
+        """
+        Start ``function()`` unless a call is already running for ``key``.
+
+        Returns:
+            asyncio.Future: The running call.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(function())
+            self._calls[key] = call
+            call.add_done_callback(lambda done: self._done(key, done))
+        return call
+
+    async def run(self, key, function):
+        """
+        Await ``function()``, or the call already running for ``key``.
+        """
+        return await asyncio.shield(self.start(key, function))
+
+    def _done(self, key, call):
+        self._calls.pop(key, None)
+        if not call.cancelled():
+            # mark the exception as retrieved in case every caller went away
+            call.exception()
@@ -0,0 +1,128 @@
+"""
+JSON encoding and decoding for the npm endpoints.
+
+Packument rendering and publish document parsing go through this module. It uses orjson or
+msgspec when one of them is installed and falls back to the standard library otherwise. The
+``NPM_JSON_BACKEND`` setting picks a backend explicitly.
+"""
+
+import json
+from gettext import gettext as _
+from typing import Any, Optional
+
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+def _select_backend(name):
+    available = {"orjson": orjson is not None, "msgspec": msgspec is not None, "json": True}
+    if name == "auto":
+        return next(backend for backend in BACKENDS if available[backend])
+    if name not in BACKENDS:
+        raise ValueError(_("Unknown NPM_JSON_BACKEND '{}'.").format(name))
+    if not available[name]:
+        raise ValueError(_("NPM_JSON_BACKEND '{}' is not installed.").format(name))
+    return name
+
+
+BACKEND = _select_backend(settings.NPM_JSON_BACKEND)
+
+if BACKEND == "orjson":
+    DecodeError = orjson.JSONDecodeError
+
+    def dumps(obj):
+        """
+        Serialize ``obj`` to JSON bytes.
+        """
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+
+elif BACKEND == "msgspec":
+    DecodeError = msgspec.DecodeError
+
+    class Dist(msgspec.Struct, omit_defaults=True):
+        """
+        The "dist" object of a packument version entry.
+        """
+
+        tarball: str
+        shasum: Optional[str] = None
+        integrity: Optional[str] = None
+
+    class VersionEntry(msgspec.Struct, rename={"id": "_id"}):
+        """
+        A version entry of a packument.
+        """
+
+        name: str
+        version: str
+        id: str
+        dist: Dist
+        dependencies: Any
+
+    _encoder = msgspec.json.Encoder()
+    dumps = _encoder.encode
+    loads = msgspec.json.Decoder().decode
+
+else:
+    DecodeError = json.JSONDecodeError
+
+    def dumps(obj):
+        """
+        Serialize ``obj`` to JSON bytes.
+        """
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    loads = json.loads
+
+
+def version_entry(name, version, dist, dependencies, manifest=None):
+    """
+    Make a packument version entry in the most efficient form for the backend.
+
+    Args:
+        name (str): The package name.
+        version (str): The version.
+        dist (dict): The "dist" object, "tarball" and optionally "shasum" and "integrity".
+        dependencies (dict): The dependencies of the version.
+        manifest (dict): Other fields of the entry, see ``Package.manifest``.
+
+    Returns:
+        A dict, or a ``VersionEntry`` struct with msgspec and no manifest.
+    """
+    if manifest:
+        return {
+            **manifest,
+            "name": name,
+            "version": version,
+            "_id": f"{name}@{version}",
+            "dist": {**manifest.get("dist", {}), **dist},
+            "dependencies": dependencies,
+        }
+    if BACKEND == "msgspec":
+        return VersionEntry(
+            name=name,
+            version=version,
+            id=f"{name}@{version}",
+            dist=Dist(**dist),
+            dependencies=dependencies,
+        )
+    return {
+        "name": name,
+        "version": version,
+        "_id": f"{name}@{version}",
+        "dist": dist,
+        "dependencies": dependencies,
+    }
@@ -0,0 +1,236 @@
+"""
+Immutable per repository version index of packument rows.
+
+When ``NPM_METADATA_INDEX_DIR`` is set, an index file is written for every new repository
+version. Content app processes memory-map these files read-only, so packument lookups become
+binary searches over pages shared by all processes through the page cache, without touching
+the database.
+
+File layout, all integers little endian unsigned 32 bit::
+
+    header   magic (8 bytes), name count, record count
+    names    name offset, name length, first record, record count; sorted by name bytes
+    records  record offset, record length; grouped by name in ascending version order
+    data     UTF-8 names and records, a record is a JSON array of ``PACKUMENT_FIELDS``
+
+Offsets are relative to the start of the data section, which is therefore limited to 4 GiB:
+repository versions with more metadata get no index and are served from the database. The
+data section is streamed to disk while it is written, only the name and record tables are kept
+in memory, 16 bytes per package name plus the name itself and 8 bytes per package version.
+"""
+
+import mmap
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from itertools import groupby
+from logging import getLogger
+from struct import Struct
+
+from django.conf import settings
+
+from . import json_codec
+
+log = getLogger(__name__)
+
+# changes with the format or PACKUMENT_FIELDS, indexes in an older format are ignored
+MAGIC = b"NPMIDX03"
+HEADER = Struct("<8sII")
+NAME = Struct("<IIII")
+RECORD = Struct("<II")
+
+# Largest data section, offsets being 32 bit
+MAX_DATA_SIZE = 2**32 - 1
+
+# Number of index files a process keeps mapped
+MAX_OPEN_INDEXES = 32
+
+
+def index_path(repository_version_pk):
+    """
+    The path of the index file of a repository version, or None if indexes are disabled.
+    """
+    if not settings.NPM_METADATA_INDEX_DIR:
+        return None
+    return os.path.join(settings.NPM_METADATA_INDEX_DIR, f"{repository_version_pk}.idx")
+
+
+def write_index(repository_version, domain_pk):
+    """
+    Write the index file of a repository version.
+
+    The file is written under a temporary name and renamed, readers never see a partial file.
+
+    Args:
+        repository_version (pulpcore.plugin.models.RepositoryVersion): The repository version.
+        domain_pk (uuid.UUID): The pk of the domain the repository lives in.
+
+    Raises:
+        OSError: If the index could not be written.
+        ValueError: If the data section would exceed ``MAX_DATA_SIZE``.
+    """
+    from .packument import PACKUMENT_FIELDS, repository_version_packages
+    from .models import Package
+
+    path = index_path(repository_version.pk)
+    if not path:
+        return
+
+    rows = (
+        repository_version_packages(repository_version, domain_pk)
+        .order_by("name", *Package.VERSION_ORDERING)
+        .values_list(*PACKUMENT_FIELDS)
+        .iterator()
+    )
+    os.makedirs(settings.NPM_METADATA_INDEX_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=settings.NPM_METADATA_INDEX_DIR, suffix=".tmp", delete=False
+    ) as index_file:
+        try:
+            build_index(rows, index_file, settings.NPM_METADATA_INDEX_DIR)
+        except BaseException:
+            index_file.close()
+            os.unlink(index_file.name)
+            raise
+    os.replace(index_file.name, path)
+
+
+def build_index(rows, index_file, temp_dir=None):
+    """
+    Write an index to a file.
+
+    Args:
+        rows (iterable): Rows of ``PACKUMENT_FIELDS`` grouped by name, in ascending version order
+            within each name.
+        index_file (file): The binary file to write the index to.
+        temp_dir (str): The directory of the temporary file holding the data section.
+
+    Raises:
+        ValueError: If the data section would exceed ``MAX_DATA_SIZE``.
+    """
+    names, records, record_count = [], bytearray(), 0
+    with tempfile.TemporaryFile(dir=temp_dir) as data:
+        offset = 0
+
+        def append(value):
+            nonlocal offset
+            if offset + len(value) > MAX_DATA_SIZE:
+                raise ValueError("The npm metadata index would exceed 4 GiB.")
+            data.write(value)
+            offset += len(value)
+            return offset - len(value)
+
+        for name, group in groupby(rows, key=lambda row: row[0]):
+            name = name.encode()
+            first_record = record_count
+            name_offset = append(name)
+            for row in group:
+                record = json_codec.dumps(list(row))
+                records += RECORD.pack(append(record), len(record))
+                record_count += 1
+            names.append(
+                (name, NAME.pack(name_offset, len(name), first_record, record_count - first_record))
+            )
+
+        # the database collation may differ from the byte order the readers search in
+        names.sort(key=lambda item: item[0])
+        index_file.write(HEADER.pack(MAGIC, len(names), record_count))
+        index_file.writelines(entry for _, entry in names)
+        index_file.write(records)
+        data.seek(0)
+        shutil.copyfileobj(data, index_file)
+
+
+def delete_index(repository_version_pk):
+    """
+    Delete the index file of a repository version, if there is one.
+    """
+    path = index_path(repository_version_pk)
+    if path:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+class MetadataIndex:
+    """
+    A read-only memory-mapped index file.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as index_file:
+            self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.name_count, self.record_count = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not an npm metadata index.")
+        self._records_start = HEADER.size + self.name_count * NAME.size
+        self._data_start = self._records_start + self.record_count * RECORD.size
+
+    def _find(self, name):
+        """
+        Binary search the name table, returning ``(first record, record count)``.
+        """
+        name = name.encode()
+        low, high = 0, self.name_count
+        while low < high:
+            middle = (low + high) // 2
+            offset, length, first, count = NAME.unpack_from(
+                self._mmap, HEADER.size + middle * NAME.size
+            )
+            offset += self._data_start
+            candidate = self._mmap[offset : offset + length]
+            if candidate == name:
+                return first, count
+            if candidate < name:
+                low = middle + 1
+            else:
+                high = middle
+        return 0, 0
+
+    def rows(self, name):
+        """
+        Get the rows of ``PACKUMENT_FIELDS`` of a package in ascending version order.
+        """
+        first, count = self._find(name)
+        rows = []
+        for record in range(first, first + count):
+            offset, length = RECORD.unpack_from(
+                self._mmap, self._records_start + record * RECORD.size
+            )
+            offset += self._data_start
+            rows.append(tuple(json_codec.loads(self._mmap[offset : offset + length])))
+        return rows
+
+
+_open_indexes = OrderedDict()
+
+
+def open_index(repository_version_pk):
+    """
+    Get the mapped index of a repository version.
+
+    Returns:
+        MetadataIndex: The index, or None if indexes are disabled or the version has none.
+    """
+    if repository_version_pk in _open_indexes:
+        _open_indexes.move_to_end(repository_version_pk)
+        return _open_indexes[repository_version_pk]
+
+    path = index_path(repository_version_pk)
+    if not path or not os.path.exists(path):
+        return None
+
+    try:
+        index = MetadataIndex(path)
+    except (OSError, ValueError):
+        log.exception("Could not open npm metadata index %s.", path)
+        return None
+
+    _open_indexes[repository_version_pk] = index
+    if len(_open_indexes) > MAX_OPEN_INDEXES:
+        # not closed explicitly, a concurrent request may still be reading it
+        _open_indexes.popitem(last=False)
+    return index
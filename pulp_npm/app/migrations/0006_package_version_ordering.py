@@ -0,0 +1,120 @@
+# Generated by Django 4.2.20 on 2026-10-19 10:00
+
+import re
+
+from django.db import migrations, models
+
+SEMVER_PATTERN = re.compile(
+    r"^\s*[=v]?(?P<major>\d+)(?:\.(?P<minor>\d+))?(?:\.(?P<patch>\d+))?"
+    r"(?:-?(?P<prerelease>[0-9A-Za-z.-]+?))?(?:\+[0-9A-Za-z.-]*)?\s*$"
+)
+RELEASE_KEY = "~"
+PRERELEASE_KEY_LENGTH = 255
+PRERELEASE_NUMBER_LENGTH_WIDTH = 3
+VERSION_NUMBER_MAX = 2**63 - 1
+
+
+def semver_sort_key(version):
+    """
+    A copy of pulp_npm.app.utils.semver_sort_key as of this migration, with the numbers
+    clamped to the bigint columns like Package.set_version_ordering does.
+    """
+    match = SEMVER_PATTERN.match(version or "")
+    if not match:
+        return 0, 0, 0, ""
+
+    prerelease = match.group("prerelease")
+    if prerelease:
+        identifiers = []
+        for identifier in prerelease.split("."):
+            if identifier.isdigit():
+                number = identifier.lstrip("0") or "0"
+                length = str(len(number)).zfill(PRERELEASE_NUMBER_LENGTH_WIDTH)
+                identifiers.append(f"0{length}{number}")
+            else:
+                identifiers.append("1" + identifier)
+        prerelease_key = " ".join(identifiers)[:PRERELEASE_KEY_LENGTH]
+    else:
+        prerelease_key = RELEASE_KEY
+
+    return (
+        min(int(match.group("major")), VERSION_NUMBER_MAX),
+        min(int(match.group("minor") or 0), VERSION_NUMBER_MAX),
+        min(int(match.group("patch") or 0), VERSION_NUMBER_MAX),
+        prerelease_key,
+    )
+
+
+BATCH_SIZE = 1000
+
+
+def populate_version_ordering(apps, schema_editor):
+    Package = apps.get_model("npm", "Package")
+
+    batch = []
+    for package in Package.objects.only("pk", "version").iterator(chunk_size=BATCH_SIZE):
+        (
+            package.version_major,
+            package.version_minor,
+            package.version_patch,
+            package.version_prerelease,
+        ) = semver_sort_key(package.version)
+        batch.append(package)
+        if len(batch) >= BATCH_SIZE:
+            Package.objects.bulk_update(
+                batch,
+                ["version_major", "version_minor", "version_patch", "version_prerelease"],
+            )
+            batch = []
+
+    if batch:
+        Package.objects.bulk_update(
+            batch,
+            ["version_major", "version_minor", "version_patch", "version_prerelease"],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("npm", "0005_package_dependencies_authtoken"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="package",
+            name="version_major",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="package",
+            name="version_minor",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="package",
+            name="version_patch",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="package",
+            name="version_prerelease",
+            field=models.CharField(db_collation="C", default="", max_length=255),
+        ),
+        migrations.RunPython(
+            populate_version_ordering, reverse_code=migrations.RunPython.noop, elidable=True
+        ),
+        migrations.AddIndex(
+            model_name="package",
+            index=models.Index(
+                fields=[
+                    "name",
+                    "version_major",
+                    "version_minor",
+                    "version_patch",
+                    "version_prerelease",
+                ],
+                name="npm_package_name_semver_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.20 on 2026-10-19 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("npm", "0006_package_version_ordering"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="package",
+            index=models.Index(
+                fields=["_pulp_domain", "name", "version"],
+                name="npm_package_domain_name_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("npm", "0007_package_domain_name_version_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="npmdistribution",
+            name="metadata_ttl",
+            field=models.PositiveIntegerField(default=300),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-19 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("npm", "0008_npmdistribution_metadata_ttl"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="npmdistribution",
+            name="prefetch_depth",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="npmdistribution",
+            name="prefetch_concurrency",
+            field=models.PositiveSmallIntegerField(default=4),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.20 on 2026-10-19 13:00
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("npm", "0009_npmdistribution_prefetch"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="package",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["name"], name="npm_package_name_trgm_idx", opclasses=["gin_trgm_ops"]
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.20 on 2026-10-19 14:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("npm", "0010_package_name_trigram_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingPublish",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "package",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="npm.package",
+                    ),
+                ),
+                (
+                    "repository",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="npm.npmrepository",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("repository", "package")},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("npm", "0011_pendingpublish"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="package",
+            name="manifest",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.20 on 2026-10-19 16:00
+
+import hashlib
+import hmac
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def hash_tokens(apps, schema_editor):
+    AuthToken = apps.get_model("npm", "AuthToken")
+    for auth_token in AuthToken.objects.all():
+        auth_token.key = auth_token.token[:12]
+        auth_token.digest = hmac.new(
+            settings.SECRET_KEY.encode(), auth_token.token.encode(), hashlib.sha256
+        ).hexdigest()
+        auth_token.save(update_fields=["key", "digest"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("npm", "0012_package_manifest"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="authtoken",
+            name="key",
+            field=models.CharField(max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name="authtoken",
+            name="digest",
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.RunPython(hash_tokens, reverse_code=migrations.RunPython.noop, elidable=True),
+        migrations.RemoveField(
+            model_name="authtoken",
+            name="token",
+        ),
+        migrations.AlterField(
+            model_name="authtoken",
+            name="key",
+            field=models.CharField(max_length=12, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="authtoken",
+            name="digest",
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AlterField(
+            model_name="authtoken",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL
+            ),
+        ),
+    ]
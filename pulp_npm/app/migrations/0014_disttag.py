@@ -0,0 +1,41 @@
+# Generated by Django 4.2.20 on 2026-10-19 17:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("npm", "0013_authtoken_digest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DistTag",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=214)),
+                ("tag", models.CharField(max_length=255)),
+                ("version", models.CharField(max_length=128)),
+                (
+                    "repository",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="npm.npmrepository",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("repository", "name", "tag")},
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.20 on 2026-10-19 18:00
+
+import re
+
+from django.db import migrations
+
+SEMVER_PATTERN = re.compile(
+    r"^\s*[=v]?(?P<major>\d+)(?:\.(?P<minor>\d+))?(?:\.(?P<patch>\d+))?"
+    r"(?:-?(?P<prerelease>[0-9A-Za-z.-]+?))?(?:\+[0-9A-Za-z.-]*)?\s*$"
+)
+RELEASE_KEY = "~"
+PRERELEASE_KEY_LENGTH = 255
+PRERELEASE_NUMBER_LENGTH_WIDTH = 3
+
+
+def semver_sort_key(version):
+    """
+    A copy of pulp_npm.app.utils.semver_sort_key as of this migration.
+    """
+    match = SEMVER_PATTERN.match(version or "")
+    if not match:
+        return 0, 0, 0, ""
+
+    prerelease = match.group("prerelease")
+    if prerelease:
+        identifiers = []
+        for identifier in prerelease.split("."):
+            if identifier.isdigit():
+                number = identifier.lstrip("0") or "0"
+                length = str(len(number)).zfill(PRERELEASE_NUMBER_LENGTH_WIDTH)
+                identifiers.append(f"0{length}{number}")
+            else:
+                identifiers.append("1" + identifier)
+        prerelease_key = " ".join(identifiers)[:PRERELEASE_KEY_LENGTH]
+    else:
+        prerelease_key = RELEASE_KEY
+
+    return (
+        int(match.group("major")),
+        int(match.group("minor") or 0),
+        int(match.group("patch") or 0),
+        prerelease_key,
+    )
+
+
+BATCH_SIZE = 1000
+
+
+def recompute_prerelease_keys(apps, schema_editor):
+    Package = apps.get_model("npm", "Package")
+
+    batch = []
+    packages = Package.objects.exclude(version_prerelease__in=("", RELEASE_KEY))
+    for package in packages.only("pk", "version").iterator(chunk_size=BATCH_SIZE):
+        package.version_prerelease = semver_sort_key(package.version)[3]
+        batch.append(package)
+        if len(batch) >= BATCH_SIZE:
+            Package.objects.bulk_update(batch, ["version_prerelease"])
+            batch = []
+
+    if batch:
+        Package.objects.bulk_update(batch, ["version_prerelease"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("npm", "0014_disttag"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            recompute_prerelease_keys, reverse_code=migrations.RunPython.noop, elidable=True
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.20 on 2026-10-19 19:00
+
+import django.contrib.postgres.indexes
+import django.db.models.fields.json
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("npm", "0015_package_prerelease_key"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="package",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.fields.json.KeyTextTransform("description", "manifest"),
+                    name="gin_trgm_ops",
+                ),
+                name="npm_package_description_trgm_idx",
+            ),
+        ),
+    ]
@@ -1,11 +1,15 @@
-import json
-import uuid
+import hashlib
+import hmac
+import secrets
+from datetime import timedelta
 from logging import getLogger
 
-from aiohttp.web_response import Response
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import models, transaction
+from django.db.models.fields.json import KeyTextTransform
+from django.utils import timezone
 
 
 from pulpcore.plugin.models import (
@@ -16,7 +20,9 @@ from pulpcore.plugin.models import (
 )
 
 from pulpcore.plugin.util import get_domain_pk
-from .utils import urlpath_sanitize, extract_package_info
+from . import cache, metadata_index
+from .responses import PackumentResponse, SearchResponse
+from .utils import urlpath_sanitize, extract_package_info, semver_sort_key
 
 logger = getLogger(__name__)
 
@@ -31,12 +37,23 @@ class Package(Content):
 
     TYPE = "package"
     repo_key_fields = ("name", "version")
+    VERSION_ORDERING = ("version_major", "version_minor", "version_patch", "version_prerelease")
+    # Largest value of the bigint version_major, version_minor and version_patch columns
+    VERSION_NUMBER_MAX = 2**63 - 1
 
     name = models.CharField(max_length=214)
     version = models.CharField(max_length=128)
     dependencies = models.JSONField(blank=True, default=list)
+    # install-time fields of the package.json, see utils.manifest_fields
+    manifest = models.JSONField(blank=True, default=dict)
     _pulp_domain = models.ForeignKey("core.Domain", default=get_domain_pk, on_delete=models.PROTECT)
 
+    # semver components of "version", see utils.semver_sort_key
+    version_major = models.PositiveBigIntegerField(default=0)
+    version_minor = models.PositiveBigIntegerField(default=0)
+    version_patch = models.PositiveBigIntegerField(default=0)
+    version_prerelease = models.CharField(max_length=255, default="", db_collation="C")
+
     @property
     def relative_path(self):
         """
@@ -50,9 +67,51 @@ class Package(Content):
 
         return Package(name=name, version=version)
 
+    def set_version_ordering(self):
+        """
+        Populate the version ordering columns from the version string.
+
+        ``save()`` calls this, code creating packages with ``bulk_create`` must call it itself.
+        Numbers too large for the columns are clamped to ``VERSION_NUMBER_MAX``: such versions
+        sort after every other one and among themselves by their pre-release key only.
+        """
+        major, minor, patch, self.version_prerelease = semver_sort_key(self.version)
+        self.version_major = min(major, self.VERSION_NUMBER_MAX)
+        self.version_minor = min(minor, self.VERSION_NUMBER_MAX)
+        self.version_patch = min(patch, self.VERSION_NUMBER_MAX)
+
+    def save(self, *args, **kwargs):
+        self.set_version_ordering()
+        super().save(*args, **kwargs)
+
     class Meta:
         default_related_name = "%(app_label)s_%(model_name)s"
         unique_together = ("name", "version", "_pulp_domain")
+        indexes = [
+            models.Index(
+                fields=["_pulp_domain", "name", "version"],
+                name="npm_package_domain_name_idx",
+            ),
+            models.Index(
+                fields=[
+                    "name",
+                    "version_major",
+                    "version_minor",
+                    "version_patch",
+                    "version_prerelease",
+                ],
+                name="npm_package_name_semver_idx",
+            ),
+            GinIndex(
+                fields=["name"],
+                opclasses=["gin_trgm_ops"],
+                name="npm_package_name_trgm_idx",
+            ),
+            GinIndex(
+                OpClass(KeyTextTransform("description", "manifest"), name="gin_trgm_ops"),
+                name="npm_package_description_trgm_idx",
+            ),
+        ]
 
 
 class NpmRemote(Remote):
@@ -90,6 +149,18 @@ class NpmRepository(Repository):
 
     PULL_THROUGH_SUPPORTED = True
 
+    def on_new_version(self, version):
+        """
+        Index the new version and invalidate the cached resolutions of this repository.
+
+        The index is an optimization: failing to write it is logged, it does not fail the version.
+        """
+        try:
+            metadata_index.write_index(version, self.pulp_domain_id)
+        except (OSError, ValueError):
+            logger.exception("Could not write the npm metadata index of %s.", version.pk)
+        cache.notify_repository_changed(self.pk)
+
     class Meta:
         default_related_name = "%(app_label)s_%(model_name)s"
 
@@ -101,86 +172,279 @@ class NpmDistribution(Distribution):
 
     TYPE = "npm"
 
+    metadata_ttl = models.PositiveIntegerField(default=300)
+    prefetch_depth = models.PositiveSmallIntegerField(default=0)
+    prefetch_concurrency = models.PositiveSmallIntegerField(default=4)
+
     class Meta:
         default_related_name = "%(app_label)s_%(model_name)s"
 
-    def content_handler(self, path):
-        data = {}
+    def tarball_prefix_url(self):
+        """
+        The URL the relative paths of the tarballs are served under, ending with a slash.
+        """
+        if settings.DOMAIN_ENABLED:
+            return "{}/".format(
+                urlpath_sanitize(
+                    settings.CONTENT_ORIGIN,
+                    settings.CONTENT_PATH_PREFIX,
+                    self.pulp_domain.name,
+                    self.base_path,
+                )
+            )
+        return "{}/".format(
+            urlpath_sanitize(
+                settings.CONTENT_ORIGIN,
+                settings.CONTENT_PATH_PREFIX,
+                self.base_path,
+            )
+        )
+
+    def resolve(self):
+        """
+        Get the repository version served and the URL prefix of its tarballs.
+
+        Resolutions are cached until the repository gets a new version.
+
+        Returns:
+            tuple: The repository version, None if there is none, and the URL prefix.
+        """
+        if resolution := cache.resolutions.get(self):
+            return resolution
+
+        generation = cache.resolutions.generation(self)
+        repository_version = self.repository_version or self.repository.latest_version()
+        prefix_url = self.tarball_prefix_url()
+        if repository_version:
+            cache.resolutions.set(self, repository_version, prefix_url, generation)
+        return repository_version, prefix_url
+
+    async def aresolve(self):
+        """
+        Asynchronous version of ``resolve()``, for the content app.
+        """
+        cache.listen_in_task()
+        if resolution := cache.resolutions.get(self):
+            return resolution
+
+        generation = cache.resolutions.generation(self)
+        repository_version = self.repository_version or await self.repository.alatest_version()
+        prefix_url = self.tarball_prefix_url()
+        if repository_version:
+            cache.resolutions.set(self, repository_version, prefix_url, generation)
+        return repository_version, prefix_url
+
+    def render_packument(self, name):
+        """
+        Render the serialized packument of a package served by this distribution.
+
+        Returns:
+            bytes: The packument, or None if the package is not served.
+        """
+        from .packument import render_packument
 
         if not self.repository:
             return None
+        repository_version, prefix_url = self.resolve()
+        if not repository_version:
+            return None
+        return render_packument(
+            repository_version, self.repository.pulp_domain_id, name, prefix_url
+        )
+
+    def render_packuments(self, names):
+        """
+        Render the serialized packuments of several packages served by this distribution.
 
-        repository_version = self.repository_version
+        Yields:
+            tuple: The name and the packument of each package served, in no particular order.
+        """
+        from .packument import render_packuments
+
+        if not self.repository:
+            return
+        repository_version, prefix_url = self.resolve()
         if not repository_version:
-            repository_version = self.repository.latest_version()
+            return
+        yield from render_packuments(
+            repository_version, self.repository.pulp_domain_id, names, prefix_url
+        )
 
-        content = repository_version.content
-        name, version = extract_package_info(path)
-        if name and version:
+    async def arender_packument(self, name):
+        """
+        Asynchronous version of ``render_packument()``.
+        """
+        from .packument import arender_packument
+
+        if not self.repository:
+            return None
+        repository_version, prefix_url = await self.aresolve()
+        if not repository_version:
             return None
+        return await arender_packument(
+            repository_version, self.repository.pulp_domain_id, name, prefix_url
+        )
 
-        packages = Package.objects.filter(name=name, pk__in=content)
+    async def astream_packument(self, name):
+        """
+        Serialize the packument of a package served by this distribution incrementally.
 
-        if not packages:
-            return None
+        Yields:
+            bytes: Consecutive parts of the packument. Nothing if the package is not served.
+        """
+        from .packument import astream_packument
 
-        data["name"] = name
-        data["versions"] = {}
-        data["dependencies"] = {}
-        versions = []
+        if not self.repository:
+            return
+        repository_version, prefix_url = await self.aresolve()
+        if not repository_version:
+            return
+        chunks = astream_packument(
+            repository_version, self.repository.pulp_domain_id, name, prefix_url
+        )
+        async for chunk in chunks:
+            yield chunk
+
+    async def asearch(self, text, size, offset):
+        """
+        Search the packages served by this distribution, see ``search.asearch()``.
+        """
+        from .search import asearch
 
-        if settings.DOMAIN_ENABLED:
-            prefix_url = "{}/".format(
-                urlpath_sanitize(
-                    settings.CONTENT_ORIGIN,
-                    settings.CONTENT_PATH_PREFIX,
-                    self.pulp_domain.name,
-                    self.base_path,
-                )
-            )
-        else:
-            prefix_url = "{}/".format(
-                urlpath_sanitize(
-                    settings.CONTENT_ORIGIN,
-                    settings.CONTENT_PATH_PREFIX,
-                    self.base_path,
-                )
-            )
+        results = {"objects": [], "total": 0}
+        if not self.repository or not text:
+            return results
+        repository_version, _ = await self.aresolve()
+        if not repository_version:
+            return results
+        return await asearch(repository_version, self.repository.pulp_domain_id, text, size, offset)
 
-        for package in packages:
-            tarball_url = f"{prefix_url}{package.name}/-/{package.relative_path.split('/')[-1]}"
+    def content_handler(self, path):
+        if path == "-/v1/search":
+            return SearchResponse(self)
 
-            version = {
-                package.version: {
-                    "name": f"{package.name}",
-                    "version": f"{package.version}",
-                    "_id": f"{package.name}@{package.version}",
-                    "dist": {"tarball": tarball_url},
-                    "dependencies": package.dependencies,
-                }
-            }
-            versions.append(package.version)
-            data["versions"].update(version)
+        if not self.repository and not self.remote:
+            return None
 
-        data["dist-tags"] = {"latest": max(versions)}
+        name, version = extract_package_info(path)
+        if not name or version:
+            return None
 
-        serialized_data = json.dumps(data)
-        return Response(body=serialized_data)
+        return PackumentResponse(self, name)
 
 
 class AuthToken(models.Model):
     """
     AuthToken for "npm" login.
+
+    Only an HMAC of the token is stored. Its first ``KEY_LENGTH`` characters are kept in clear as
+    ``key`` to find the row of a token, the HMAC is then compared in constant time.
     """
 
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
-    token = models.CharField(max_length=255, unique=True)
+    KEY_LENGTH = 12
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=KEY_LENGTH, unique=True)
+    digest = models.CharField(max_length=64)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(self, *args, **kwargs):
-        if not self.token:
-            self.token = uuid.uuid4().hex
-        super().save(*args, **kwargs)
+    @staticmethod
+    def hash(token):
+        """
+        The HMAC of a token, keyed with the ``SECRET_KEY`` of the installation.
+        """
+        return hmac.new(settings.SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+    @classmethod
+    def issue(cls, user):
+        """
+        Create a new token for a user.
+
+        Every "npm login" issues a new token, the existing ones cannot be handed out again since
+        only their HMAC is stored. The tokens of the user older than ``NPM_TOKEN_MAX_AGE`` are
+        deleted, and so are the oldest ones beyond ``NPM_MAX_TOKENS_PER_USER``.
+
+        Returns:
+            tuple: The AuthToken and the token itself, which is not stored anywhere.
+        """
+        token = secrets.token_hex(24)
+        with transaction.atomic():
+            auth_token = cls.objects.create(
+                user=user, key=token[: cls.KEY_LENGTH], digest=cls.hash(token)
+            )
+            tokens = cls.objects.filter(user=user)
+            kept = tokens.order_by("-created_at", "-pk")[: settings.NPM_MAX_TOKENS_PER_USER]
+            stale = ~models.Q(pk__in=list(kept.values_list("pk", flat=True)))
+            if settings.NPM_TOKEN_MAX_AGE:
+                max_age = timedelta(seconds=settings.NPM_TOKEN_MAX_AGE)
+                stale |= models.Q(created_at__lt=timezone.now() - max_age)
+            tokens.filter(stale).exclude(pk=auth_token.pk).delete()
+        return auth_token, token
+
+    @classmethod
+    def verify(cls, token):
+        """
+        Get the AuthToken of a token, or None if it is not valid.
+
+        Verified tokens are cached for ``NPM_TOKEN_CACHE_TTL`` seconds, deleting an AuthToken
+        drops it from the cache of every process.
+        """
+        cache.listen_in_thread()
+        digest = cls.hash(token)
+        auth_token = cache.tokens.get(digest)
+        if auth_token is not None:
+            return None if auth_token.is_expired() else auth_token
+
+        key = token[: cls.KEY_LENGTH]
+        generation = cache.tokens.generation(key)
+        try:
+            auth_token = cls.objects.select_related("user").get(key=key)
+        except cls.DoesNotExist:
+            return None
+        if not hmac.compare_digest(auth_token.digest, digest) or auth_token.is_expired():
+            return None
+        cache.tokens.set(digest, auth_token, generation)
+        return auth_token
+
+    def is_expired(self):
+        """
+        Whether the token is older than ``NPM_TOKEN_MAX_AGE``.
+        """
+        max_age = settings.NPM_TOKEN_MAX_AGE
+        return bool(max_age) and self.created_at < timezone.now() - timedelta(seconds=max_age)
 
     def __str__(self):
         return f"Token for {self.user.username}"
+
+
+class PendingPublish(models.Model):
+    """
+    A package uploaded with "npm publish" waiting to be added to its repository.
+
+    Uploads are added in batches, see ``tasks.publish_pending``.
+    """
+
+    repository = models.ForeignKey(NpmRepository, on_delete=models.CASCADE)
+    package = models.ForeignKey(Package, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("repository", "package")
+
+
+class DistTag(models.Model):
+    """
+    A dist-tag of a package in a repository, like "next" or "beta".
+
+    Dist-tags are not versioned content: changing one does not create a repository version. The
+    packuments of a repository serve the tags pointing to versions they hold, the "latest" tag
+    defaults to the highest release.
+    """
+
+    repository = models.ForeignKey(NpmRepository, on_delete=models.CASCADE)
+    name = models.CharField(max_length=214)
+    tag = models.CharField(max_length=255)
+    version = models.CharField(max_length=128)
+
+    class Meta:
+        unique_together = ("repository", "name", "tag")
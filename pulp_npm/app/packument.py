@@ -0,0 +1,508 @@
+import base64
+from collections import defaultdict
+from itertools import groupby
+
+from django.conf import settings
+from django.db.models import Aggregate, F, Func, JSONField, Q, TextField, Value
+from django.db.models.fields.json import KeyTransform
+from django.db.models.functions import Cast, Coalesce, Concat, JSONObject
+
+from . import cache, json_codec, metadata_index
+from .models import DistTag, Package
+from .utils import RELEASE_KEY
+
+# Number of rows fetched at once from the server-side cursor when streaming packuments
+STREAMING_CHUNK_SIZE = 500
+
+# Columns needed to render the version entries of a packument
+PACKUMENT_FIELDS = (
+    "name",
+    "version",
+    "version_prerelease",
+    "dependencies",
+    "contentartifact__relative_path",
+    "contentartifact__artifact__sha1",
+    "contentartifact__artifact__sha512",
+    "manifest",
+)
+
+
+def repository_version_packages(repository_version, domain_pk):
+    """
+    Get the packages of a repository version.
+
+    Unlike ``repository_version.content`` this joins the repository content table instead of
+    filtering with a large ``IN`` subquery, which keeps name lookups on the package indexes.
+
+    Args:
+        repository_version (pulpcore.plugin.models.RepositoryVersion): The repository version.
+        domain_pk (uuid.UUID): The pk of the domain the repository lives in.
+
+    Returns:
+        django.db.models.QuerySet: The packages present in the repository version.
+    """
+    number = repository_version.number
+    return Package.objects.filter(
+        Q(version_memberships__version_removed__isnull=True)
+        | Q(version_memberships__version_removed__number__gt=number),
+        _pulp_domain_id=domain_pk,
+        version_memberships__repository_id=repository_version.repository_id,
+        version_memberships__version_added__number__lte=number,
+    )
+
+
+def packument_rows(repository_version, domain_pk, names):
+    """
+    Get the rows needed to render the packuments of the given package names.
+
+    Args:
+        repository_version (pulpcore.plugin.models.RepositoryVersion): The repository version.
+        domain_pk (uuid.UUID): The pk of the domain the repository lives in.
+        names (list): The package names.
+
+    Returns:
+        django.db.models.QuerySet: Tuples of ``PACKUMENT_FIELDS`` ordered by name and version.
+    """
+    return (
+        repository_version_packages(repository_version, domain_pk)
+        .filter(name__in=names)
+        .order_by("name", *Package.VERSION_ORDERING)
+        .values_list(*PACKUMENT_FIELDS)
+    )
+
+
+def _dist_tag_rows(repository_pk, names):
+    return DistTag.objects.filter(repository_id=repository_pk, name__in=names).values_list(
+        "name", "tag", "version"
+    )
+
+
+def stored_dist_tags(repository_version, names):
+    """
+    Get the dist-tags stored for the given package names in the repository of a version.
+
+    Tags are cached in-process per name, only the names missing from the cache are queried.
+
+    Returns:
+        dict: The ``{tag: version}`` of each package name having stored dist-tags.
+    """
+    repository_pk = repository_version.repository_id
+    tags = {}
+    missing = {}
+    for name in set(names):
+        cached = cache.dist_tags.get(repository_pk, name)
+        if cached is None:
+            missing[name] = cache.dist_tags.generation(repository_pk, name)
+        elif cached:
+            tags[name] = cached
+
+    if missing:
+        fetched = defaultdict(dict)
+        for name, tag, version in _dist_tag_rows(repository_pk, list(missing)):
+            fetched[name][tag] = version
+        for name, generation in missing.items():
+            cache.dist_tags.set(repository_pk, name, fetched.get(name, {}), generation)
+        tags.update(fetched)
+    return tags
+
+
+async def astored_dist_tags(repository_version, name):
+    """
+    Get the ``{tag: version}`` dist-tags stored for a single package name.
+    """
+    repository_pk = repository_version.repository_id
+    tags = cache.dist_tags.get(repository_pk, name)
+    if tags is None:
+        generation = cache.dist_tags.generation(repository_pk, name)
+        rows = _dist_tag_rows(repository_pk, [name])
+        tags = {tag: version async for _, tag, version in rows}
+        cache.dist_tags.set(repository_pk, name, tags, generation)
+    return tags
+
+
+def dist_tags(latest, tags, versions):
+    """
+    Build the "dist-tags" of a packument.
+
+    Args:
+        latest (str): The version "latest" points to unless it is stored.
+        tags (dict): The stored ``{tag: version}``.
+        versions (collections.abc.Container): The versions in the packument. Tags pointing to
+            other versions are left out.
+
+    Returns:
+        dict: The dist-tags, starting with "latest".
+    """
+    result = {"latest": latest}
+    result.update((tag, version) for tag, version in tags.items() if version in versions)
+    return result
+
+
+class JSONBObjectAgg(Aggregate):
+    """
+    Aggregate key/value pairs into a JSON object.
+    """
+
+    function = "JSONB_OBJECT_AGG"
+    output_field = JSONField()
+
+
+class JSONBConcat(Func):
+    """
+    Merge JSON objects, the keys of the last ones win.
+    """
+
+    arg_joiner = " || "
+    template = "(%(expressions)s)"
+    output_field = JSONField()
+
+
+class JSONBStripNulls(Func):
+    """
+    Remove the keys with a null value from a JSON object.
+    """
+
+    function = "JSONB_STRIP_NULLS"
+    output_field = JSONField()
+
+
+class Integrity(Func):
+    """
+    SQL counterpart of ``integrity()``.
+    """
+
+    template = (
+        "'sha512-' || TRANSLATE(ENCODE(DECODE(%(expressions)s, 'hex'), 'base64'), E'\\n', '')"
+    )
+    output_field = TextField()
+
+
+def integrity(sha512):
+    """
+    Convert a hex sha512 digest to a Subresource Integrity string as used by npm.
+    """
+    return "sha512-{}".format(base64.b64encode(bytes.fromhex(sha512)).decode())
+
+
+def version_entry(row, prefix_url):
+    """
+    Render the entry of a single version in the packument.
+
+    Args:
+        row (tuple): A row of ``PACKUMENT_FIELDS``.
+        prefix_url (str): The URL tarball paths are relative to, ending with a slash.
+
+    Returns:
+        The version entry, see ``json_codec.version_entry()``.
+    """
+    name, version, _, dependencies, relative_path, sha1, sha512, manifest = row
+    if not relative_path:
+        relative_path = f"{name}/-/{name.split('/')[-1]}-{version}.tgz"
+
+    dist = {"tarball": f"{prefix_url}{relative_path}"}
+    if sha1:
+        dist["shasum"] = sha1
+    if sha512:
+        dist["integrity"] = integrity(sha512)
+
+    return json_codec.version_entry(name, version, dist, dependencies, manifest)
+
+
+class LatestVersion:
+    """
+    Track the version the "latest" dist-tag points to over rows in ascending version order.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.is_prerelease = True
+
+    def update(self, row):
+        """
+        Account for the next row of ``PACKUMENT_FIELDS``.
+        """
+        is_prerelease = row[2] != RELEASE_KEY
+        # prefer the highest release over any pre-release
+        if self.version is None or not is_prerelease or self.is_prerelease:
+            self.version, self.is_prerelease = row[1], is_prerelease
+
+
+def build_packument(name, rows, prefix_url, tags=None):
+    """
+    Build the packument of a package.
+
+    Args:
+        name (str): The package name.
+        rows (iterable): Rows of ``PACKUMENT_FIELDS`` for this package in ascending version order.
+        prefix_url (str): The URL tarball paths are relative to, ending with a slash.
+        tags (dict): The stored dist-tags of the package, see ``stored_dist_tags()``.
+
+    Returns:
+        dict: The packument, or None if there are no rows.
+    """
+    versions = {}
+    latest = LatestVersion()
+
+    for row in rows:
+        versions[row[1]] = version_entry(row, prefix_url)
+        latest.update(row)
+
+    if latest.version is None:
+        return None
+
+    return {
+        "name": name,
+        "versions": versions,
+        "dependencies": {},
+        "dist-tags": dist_tags(latest.version, tags or {}, versions),
+    }
+
+
+async def _aiterate(rows):
+    for row in rows:
+        yield row
+
+
+async def astream_packument(repository_version, domain_pk, name, prefix_url):
+    """
+    Serialize the packument of a package incrementally.
+
+    Rows are read from a server-side cursor and every version is yielded as soon as it is
+    rendered, so memory use does not grow with the number of versions. The "dist-tags" object
+    comes last because "latest" is only known once all versions have been seen.
+
+    Args:
+        repository_version (pulpcore.plugin.models.RepositoryVersion): The repository version.
+        domain_pk (uuid.UUID): The pk of the domain the repository lives in.
+        name (str): The package name.
+        prefix_url (str): The URL tarball paths are relative to, ending with a slash.
+
+    Yields:
+        bytes: Consecutive parts of the packument. Nothing if the package is not present.
+    """
+    index = metadata_index.open_index(repository_version.pk)
+    if index:
+        rows = _aiterate(index.rows(name))
+    else:
+        rows = packument_rows(repository_version, domain_pk, [name])
+        rows = rows.aiterator(chunk_size=STREAMING_CHUNK_SIZE)
+
+    tags = await astored_dist_tags(repository_version, name)
+    tagged = set(tags.values())
+    present = set()
+    latest = LatestVersion()
+    dumps = json_codec.dumps
+    separator = b'{"name":' + dumps(name) + b',"dependencies":{},"versions":{'
+
+    async for row in rows:
+        yield separator + dumps(row[1]) + b":" + dumps(version_entry(row, prefix_url))
+        separator = b","
+        latest.update(row)
+        if row[1] in tagged:
+            present.add(row[1])
+
+    if latest.version is not None:
+        yield b'},"dist-tags":' + dumps(dist_tags(latest.version, tags, present)) + b"}"
+
+
+def version_entry_expression(prefix_url):
+    """
+    SQL counterpart of ``version_entry()``.
+
+    Args:
+        prefix_url (str): The URL tarball paths are relative to, ending with a slash.
+
+    Returns:
+        django.db.models.Expression: A JSON object expression to evaluate on the packages.
+    """
+    return JSONBConcat(
+        F("manifest"),
+        JSONObject(
+            name=F("name"),
+            version=F("version"),
+            _id=Concat(F("name"), Value("@"), F("version")),
+            dist=JSONBConcat(
+                Coalesce(KeyTransform("dist", "manifest"), Value({}, output_field=JSONField())),
+                JSONBStripNulls(
+                    JSONObject(
+                        tarball=Concat(Value(prefix_url), F("contentartifact__relative_path")),
+                        shasum=F("contentartifact__artifact__sha1"),
+                        integrity=Integrity(F("contentartifact__artifact__sha512")),
+                    )
+                ),
+            ),
+            dependencies=F("dependencies"),
+        ),
+    )
+
+
+def _version_querysets(packages):
+    """
+    Get the querysets to pick the "latest" version from, in order of preference.
+    """
+    versions = packages.order_by(*(F(field).desc() for field in Package.VERSION_ORDERING))
+    versions = versions.values_list("version", flat=True)
+    return versions.filter(version_prerelease=RELEASE_KEY), versions
+
+
+def latest_version(packages):
+    """
+    Get the version the "latest" dist-tag points to, the highest release if there is one.
+
+    Args:
+        packages (django.db.models.QuerySet): The packages of a single package name.
+
+    Returns:
+        str: The version or None if there are no packages.
+    """
+    releases, versions = _version_querysets(packages)
+    return releases.first() or versions.first()
+
+
+def package_dist_tags(repository_version, domain_pk, name):
+    """
+    Get the dist-tags of a package as served from a repository version.
+
+    Args:
+        repository_version (pulpcore.plugin.models.RepositoryVersion): The repository version.
+        domain_pk (uuid.UUID): The pk of the domain the repository lives in.
+        name (str): The package name.
+
+    Returns:
+        dict: The dist-tags, see ``dist_tags()``, or None if the package is not present.
+    """
+    packages = repository_version_packages(repository_version, domain_pk).filter(name=name)
+    latest = latest_version(packages)
+    if latest is None:
+        return None
+    tags = stored_dist_tags(repository_version, [name]).get(name, {})
+    present = packages.filter(version__in=tags.values()).values_list("version", flat=True)
+    return dist_tags(latest, tags, set(present) if tags else ())
+
+
+async def alatest_version(packages):
+    """
+    Asynchronous version of ``latest_version()``.
+    """
+    releases, versions = _version_querysets(packages)
+    return await releases.afirst() or await versions.afirst()
+
+
+def _versions_aggregate(prefix_url):
+    return Cast(
+        JSONBObjectAgg(F("version"), version_entry_expression(prefix_url)),
+        output_field=TextField(),
+    )
+
+
+def _splice_packument(name, tags, versions):
+    head = json_codec.dumps({"name": name, "dependencies": {}, "dist-tags": tags})
+    return head[:-1] + b',"versions":' + versions.encode() + b"}"
+
+
+def render_packument_sql(repository_version, domain_pk, name, prefix_url):
+    """
+    Render the packument of a package inside the database.
+
+    The "versions" object is built with ``jsonb_object_agg`` and returned as text, so the
+    version entries are never materialized as Python objects.
+
+    Args:
+        repository_version (pulpcore.plugin.models.RepositoryVersion): The repository version.
+        domain_pk (uuid.UUID): The pk of the domain the repository lives in.
+        name (str): The package name.
+        prefix_url (str): The URL tarball paths are relative to, ending with a slash.
+
+    Returns:
+        bytes: The serialized packument, or None if the package is not in the repository version.
+    """
+    packages = repository_version_packages(repository_version, domain_pk).filter(name=name)
+    versions = packages.aggregate(versions=_versions_aggregate(prefix_url))["versions"]
+    if versions is None:
+        return None
+    tags = package_dist_tags(repository_version, domain_pk, name)
+    return _splice_packument(name, tags, versions)
+
+
+async def arender_packument_sql(repository_version, domain_pk, name, prefix_url):
+    """
+    Asynchronous version of ``render_packument_sql()``.
+    """
+    packages = repository_version_packages(repository_version, domain_pk).filter(name=name)
+    versions = (await packages.aaggregate(versions=_versions_aggregate(prefix_url)))["versions"]
+    if versions is None:
+        return None
+
+    tags = await astored_dist_tags(repository_version, name)
+    present = packages.filter(version__in=tags.values()).values_list("version", flat=True)
+    present = {version async for version in present} if tags else ()
+    tags = dist_tags(await alatest_version(packages), tags, present)
+    return _splice_packument(name, tags, versions)
+
+
+def render_packument(repository_version, domain_pk, name, prefix_url):
+    """
+    Render the serialized packument of a package.
+
+    Args:
+        repository_version (pulpcore.plugin.models.RepositoryVersion): The repository version.
+        domain_pk (uuid.UUID): The pk of the domain the repository lives in.
+        name (str): The package name.
+        prefix_url (str): The URL tarball paths are relative to, ending with a slash.
+
+    Returns:
+        bytes: The serialized packument, or None if the package is not in the repository version.
+    """
+    index = metadata_index.open_index(repository_version.pk)
+    if index:
+        rows = index.rows(name)
+    elif settings.NPM_PACKUMENT_SQL_RENDERING:
+        return render_packument_sql(repository_version, domain_pk, name, prefix_url)
+    else:
+        rows = packument_rows(repository_version, domain_pk, [name])
+    tags = stored_dist_tags(repository_version, [name]).get(name)
+    data = build_packument(name, rows, prefix_url, tags)
+    return json_codec.dumps(data) if data else None
+
+
+def render_packuments(repository_version, domain_pk, names, prefix_url):
+    """
+    Render the serialized packuments of several packages with a single query.
+
+    Args:
+        repository_version (pulpcore.plugin.models.RepositoryVersion): The repository version.
+        domain_pk (uuid.UUID): The pk of the domain the repository lives in.
+        names (list): The package names.
+        prefix_url (str): The URL tarball paths are relative to, ending with a slash.
+
+    Yields:
+        tuple: The name and the serialized packument of each package in the repository version.
+    """
+    index = metadata_index.open_index(repository_version.pk)
+    if index:
+        groups = ((name, index.rows(name)) for name in sorted(set(names)))
+    else:
+        rows = packument_rows(repository_version, domain_pk, names)
+        groups = groupby(rows.iterator(chunk_size=STREAMING_CHUNK_SIZE), key=lambda row: row[0])
+
+    tags = stored_dist_tags(repository_version, names)
+    for name, rows in groups:
+        data = build_packument(name, rows, prefix_url, tags.get(name))
+        if data:
+            yield name, json_codec.dumps(data)
+
+
+async def arender_packument(repository_version, domain_pk, name, prefix_url):
+    """
+    Asynchronous version of ``render_packument()``.
+    """
+    index = metadata_index.open_index(repository_version.pk)
+    if index:
+        rows = index.rows(name)
+    elif settings.NPM_PACKUMENT_SQL_RENDERING:
+        return await arender_packument_sql(repository_version, domain_pk, name, prefix_url)
+    else:
+        rows = [row async for row in packument_rows(repository_version, domain_pk, [name])]
+    tags = await astored_dist_tags(repository_version, name)
+    data = build_packument(name, rows, prefix_url, tags)
+    return json_codec.dumps(data) if data else None
@@ -0,0 +1,262 @@
+import base64
+import binascii
+import re
+from gettext import gettext as _
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from pulpcore.plugin.files import PulpTemporaryUploadedFile
+
+from . import json_codec
+from .tarball import TarballReader
+
+# Number of bytes read from the request body at once
+CHUNK_SIZE = 1024 * 1024
+
+# The next character that changes the structure of a JSON document
+STRUCTURE = re.compile(rb'["{}\[\]:,]')
+
+# The rest of a JSON string after its opening quote
+STRING_REST = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+
+
+class NpmPublishParser(BaseParser):
+    """
+    Spools npm publish documents to a temporary file without parsing them.
+
+    Publish documents embed the package tarball, so they are parsed by the publish task, with
+    ``PublishDocumentReader``, rather than while handling the request. The parsed data is
+    ``{"document": PulpTemporaryUploadedFile}``.
+    """
+
+    media_type = "application/json"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Copy the incoming bytestream to a temporary file.
+
+        The document is not hashed, only the attachments decoded from it by the task are.
+        """
+        upload = PulpTemporaryUploadedFile("publish.json", media_type, 0, "utf-8")
+        while chunk := stream.read(CHUNK_SIZE):
+            upload.write(chunk)
+            upload.size += len(chunk)
+        upload.seek(0)
+        return {"document": upload}
+
+
+class PublishDocumentReader:
+    """
+    Splits an npm publish document read incrementally into metadata and attachment files.
+
+    The document is scanned for its structure only, to locate ``_attachments.<name>.data``.
+    Everything else is collected as is, with the attachment data replaced by ``null``, and
+    parsed at the end.
+
+    Attachments are decoded to ``PulpTemporaryUploadedFile`` carrying their digests, the
+    ``package_json`` of the tarball and the ``manifest`` made from it, see ``TarballReader``.
+    Attachments that are not decoded, see ``decode`` and ``skip``, are left ``null``.
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE, decode=True, skip=(), upload_class=None):
+        """
+        Args:
+            stream: The file-like object to read the document from.
+            chunk_size (int): The number of bytes read at once.
+            decode (bool): Whether to decode the attachments at all.
+            skip (collections.abc.Container): The names of attachments not to decode.
+            upload_class (type): Called with the file name of each attachment to create the file
+                it is decoded to, like ``pulp_npm.app.storage.StorageUpload``. Defaults to a
+                local ``PulpTemporaryUploadedFile``.
+        """
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decode = decode
+        self.skip = skip
+        self.upload_class = upload_class
+        self.buffer = b""
+        self.position = 0
+        self.eof = False
+        # parts of the document without the attachment data
+        self.metadata = []
+        # [is object, last key, expects a key] for every open object or array
+        self.stack = []
+        self.attachments = {}
+
+    def read(self):
+        """
+        Read the whole document.
+
+        Returns:
+            dict: The publish document, attachment data being ``PulpTemporaryUploadedFile``.
+
+        Raises:
+            rest_framework.exceptions.ParseError: If the document is not valid.
+        """
+        try:
+            self._scan()
+            if self.stack:
+                raise ParseError(_("JSON parse error - unexpected end of document"))
+            document = json_codec.loads(b"".join(self.metadata))
+        except (ParseError, json_codec.DecodeError, binascii.Error, ValueError) as exc:
+            for upload in self.attachments.values():
+                upload.close()
+            if isinstance(exc, ParseError):
+                raise
+            raise ParseError(_("JSON parse error - {}").format(exc))
+
+        for name, upload in self.attachments.items():
+            document["_attachments"][name]["data"] = upload
+        return document
+
+    def _fill(self):
+        """
+        Read the next chunk, dropping what was already consumed.
+        """
+        chunk = self.stream.read(self.chunk_size)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+
+    def _scan(self):
+        while True:
+            match = STRUCTURE.search(self.buffer, self.position)
+            if not match:
+                self.metadata.append(self.buffer[self.position :])
+                self.position = len(self.buffer)
+                if self.eof:
+                    return
+                self._fill()
+                continue
+
+            self.metadata.append(self.buffer[self.position : match.start()])
+            self.position = match.end()
+            char = match.group()
+            frame = self.stack[-1] if self.stack else None
+
+            if char == b'"':
+                self._string(frame)
+                continue
+
+            self.metadata.append(char)
+            if char in b"{[":
+                self.stack.append([char == b"{", None, char == b"{"])
+            elif char in b"}]":
+                if not self.stack:
+                    raise ParseError(_("JSON parse error - unexpected '{}'").format(char.decode()))
+                self.stack.pop()
+            elif char == b":" and frame:
+                frame[2] = False
+            elif char == b"," and frame and frame[0]:
+                frame[2] = True
+
+    def _attachment_name(self):
+        """
+        The name of the attachment whose data the next value is, if it is one.
+        """
+        if len(self.stack) != 3 or not all(frame[0] for frame in self.stack):
+            return None
+        attachments, name, data = (frame[1] for frame in self.stack)
+        if attachments == "_attachments" and data == "data" and not self.stack[2][2]:
+            return name
+        return None
+
+    def _string(self, frame):
+        """
+        Consume a string whose opening quote was just read.
+        """
+        is_key = frame is not None and frame[0] and frame[2]
+        if not is_key:
+            name = self._attachment_name()
+            if name is not None:
+                if self.decode and name not in self.skip:
+                    self._attachment(name)
+                else:
+                    self._skip_string()
+                self.metadata.append(b"null")
+                return
+
+        while not (match := STRING_REST.match(self.buffer, self.position)):
+            if self.eof:
+                raise ParseError(_("JSON parse error - unterminated string"))
+            self._fill()
+
+        string = b'"' + self.buffer[self.position : match.end()]
+        self.position = match.end()
+        self.metadata.append(string)
+        if is_key:
+            frame[1] = json_codec.loads(string)
+
+    def _skip_string(self):
+        """
+        Consume the rest of a string without keeping it, like the data of a skipped attachment.
+        """
+        while True:
+            match = STRING_REST.match(self.buffer, self.position)
+            if match:
+                self.position = match.end()
+                return
+            # keep an odd trailing backslash, the character it escapes is in the next chunk
+            backslashes = len(self.buffer) - len(self.buffer.rstrip(b"\\"))
+            self.position = len(self.buffer) - backslashes % 2
+            if self.eof:
+                raise ParseError(_("JSON parse error - unterminated string"))
+            self._fill()
+
+    def _attachment(self, name):
+        """
+        Decode the base64 data of an attachment to a temporary file.
+        """
+        file_name = name.split("/")[-1]
+        if self.upload_class:
+            upload = self.upload_class(file_name)
+        else:
+            upload = PulpTemporaryUploadedFile(file_name, "application/octet-stream", 0, "")
+        if name in self.attachments:
+            self.attachments[name].close()
+        self.attachments[name] = upload
+
+        tarball = TarballReader()
+        pending = b""
+        while True:
+            end = self.buffer.find(b'"', self.position)
+            segment = self.buffer[self.position : end if end >= 0 else len(self.buffer)]
+            self.position += len(segment)
+            if end < 0 and segment.endswith(b"\\"):
+                # the escaped character is in the next chunk
+                segment = segment[:-1]
+                self.position -= 1
+            if b"\\" in segment:
+                segment = segment.replace(b"\\/", b"/").replace(b"\\n", b"").replace(b"\\r", b"")
+
+            pending += segment
+            usable = len(pending) - len(pending) % 4
+            if usable:
+                data = base64.b64decode(pending[:usable], validate=True)
+                self.write(upload, data)
+                tarball.feed(data)
+                pending = pending[usable:]
+
+            if end >= 0:
+                self.position = end + 1
+                break
+            if self.eof:
+                raise ParseError(_("JSON parse error - unterminated string"))
+            self._fill()
+
+        if pending:
+            raise ParseError(_("Attachment '{}' is not valid base64.").format(name))
+        upload.manifest = tarball.manifest()
+        upload.package_json = tarball.package_json if upload.manifest is not None else None
+        upload.seek(0)
+
+    @staticmethod
+    def write(upload, data):
+        """
+        Append data to an upload, updating its size and digests.
+        """
+        upload.write(data)
+        upload.size += len(data)
+        for hasher in upload.hashers.values():
+            hasher.update(data)
@@ -0,0 +1,321 @@
+"""
+Packument lookups on the remote of pull-through distributions.
+
+Fetched packuments are cached for the ``metadata_ttl`` of the distribution. Once expired, they
+are still served for ``NPM_METADATA_STALE_WHILE_REVALIDATE`` seconds while a fresh copy is
+fetched in the background, and for ``NPM_METADATA_STALE_IF_ERROR`` seconds when the remote
+fails.
+
+Packages the remote does not have are remembered for ``NPM_NEGATIVE_CACHE_TTL`` seconds, so
+repeated requests for them are answered without contacting the remote.
+
+Distributions with a ``prefetch_depth`` prefetch, in the background, what an install usually
+requests next: the tarball of the latest version and the packuments of its dependencies.
+"""
+
+import asyncio
+import base64
+import os
+from functools import partial
+from logging import getLogger
+
+from aiohttp import ClientError, ClientResponseError
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from pulpcore.plugin.exceptions import TimeoutException
+from pulpcore.plugin.models import Artifact, ContentArtifact, RemoteArtifact
+
+from . import json_codec
+from .cache import SingleFlight, missing_upstream, upstream_packuments
+from .utils import manifest_fields
+
+log = getLogger(__name__)
+
+# errors of downloads from a remote that could not be reached or failed, the downloaders of
+# pulpcore raise TimeoutException when a remote is too slow
+UPSTREAM_ERRORS = (ClientError, TimeoutException, asyncio.TimeoutError)
+
+# upstream packument downloads in flight, keyed on the cache key
+upstream_fetches = SingleFlight()
+
+# prefetch semaphores of the distributions, keyed on distribution pk
+_prefetch_budgets = {}
+
+# running prefetches, referenced until they finish
+_prefetches = set()
+
+
+def _read_and_remove(path):
+    try:
+        with open(path, "rb") as downloaded:
+            return downloaded.read()
+    finally:
+        os.unlink(path)
+
+
+def _cache_key(distribution, name):
+    return (distribution.pk, distribution.remote_id, name)
+
+
+async def download_packument(remote, name):
+    """
+    Download the packument of a package from a remote, bypassing the caches.
+
+    Returns:
+        bytes: The packument, or None if the remote does not have it.
+
+    Raises:
+        aiohttp.ClientError: When the remote could not be reached or returned an error.
+        pulpcore.plugin.exceptions.TimeoutException: When the remote timed out.
+    """
+    downloader = remote.get_downloader(url=remote.get_remote_artifact_url(name))
+    try:
+        result = await downloader.run()
+    except ClientResponseError as exc:
+        if exc.status == 404:
+            return None
+        raise
+    return await asyncio.to_thread(_read_and_remove, result.path)
+
+
+async def _download_packument(key, remote, name):
+    body = await download_packument(remote, name)
+    if body is None:
+        upstream_packuments.pop(key)
+        missing_upstream.add(key)
+    else:
+        upstream_packuments.set(key, body)
+    return body
+
+
+async def _download_and_prefetch(distribution, key, remote, name):
+    body = await _download_packument(key, remote, name)
+    if body:
+        schedule_prefetch(distribution, remote, body)
+    return body
+
+
+def _log_revalidation(name, call):
+    if not call.cancelled() and isinstance(call.exception(), UPSTREAM_ERRORS):
+        log.warning("Revalidating the packument of %s failed: %s", name, call.exception())
+
+
+async def fetch_packument(distribution, name):
+    """
+    Get the packument of a package from the remote of a distribution.
+
+    Concurrent requests for the same package on the same distribution share one download.
+
+    Args:
+        distribution (pulp_npm.app.models.NpmDistribution): A distribution with a remote.
+        name (str): The package name.
+
+    Returns:
+        bytes: The packument as served upstream, or None if the remote does not have it.
+
+    Raises:
+        aiohttp.ClientError: When the remote could not be reached or returned an error, and
+            there is no cached packument to fall back to. Or, in the same case, one of the
+            other ``UPSTREAM_ERRORS`` when the remote timed out.
+    """
+    key = _cache_key(distribution, name)
+    if key in missing_upstream:
+        return None
+
+    cached = upstream_packuments.get(key)
+    if cached:
+        body, age = cached
+        stale_for = age - distribution.metadata_ttl
+        if stale_for < 0:
+            return body
+
+    remote = await distribution.remote.acast()
+
+    if cached and stale_for < settings.NPM_METADATA_STALE_WHILE_REVALIDATE:
+        call = upstream_fetches.start(key, partial(_download_packument, key, remote, name))
+        call.add_done_callback(partial(_log_revalidation, name))
+        return body
+
+    try:
+        return await upstream_fetches.run(
+            key, partial(_download_and_prefetch, distribution, key, remote, name)
+        )
+    except UPSTREAM_ERRORS as exc:
+        if cached and stale_for < settings.NPM_METADATA_STALE_IF_ERROR:
+            log.warning("Serving a stale packument of %s, fetching it failed: %s", name, exc)
+            return body
+        raise
+
+
+def tarball_relative_path(name, url):
+    """
+    The relative path a tarball downloaded from ``url`` is stored under.
+    """
+    return f"{name}/-/{url.split('/')[-1]}"
+
+
+def expected_digests(dist):
+    """
+    The digests a tarball must match according to the "dist" object of its version entry.
+    """
+    for digest in (dist.get("integrity") or "").split():
+        algorithm, _, value = digest.partition("-")
+        if algorithm == "sha512":
+            return {"sha512": base64.b64decode(value).hex()}
+    return None
+
+
+def record_tarball(remote, download_result, entry):
+    """
+    Save a tarball downloaded from a remote as a package.
+
+    Creates, or completes, the package, its artifact, content artifact and remote artifact.
+
+    Args:
+        remote (pulp_npm.app.models.NpmRemote): The remote the tarball was downloaded from.
+        download_result (pulpcore.plugin.download.DownloadResult): The downloaded tarball.
+        entry (dict): The version entry of the package in its packument.
+
+    Returns:
+        pulpcore.plugin.models.ContentArtifact: The content artifact of the tarball.
+    """
+    from .models import Package
+
+    url = entry["dist"]["tarball"]
+    artifact = Artifact(**download_result.artifact_attributes, file=download_result.path)
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                artifact.save()
+        except IntegrityError:
+            artifact = Artifact.objects.get(artifact.q())
+            artifact.touch()
+            os.unlink(download_result.path)
+
+        package, _ = Package.objects.get_or_create(
+            name=entry["name"],
+            version=entry["version"],
+            _pulp_domain_id=remote.pulp_domain_id,
+            defaults={
+                "dependencies": entry.get("dependencies") or {},
+                "manifest": manifest_fields(entry),
+            },
+        )
+        content_artifact, created = ContentArtifact.objects.get_or_create(
+            content=package,
+            relative_path=tarball_relative_path(entry["name"], url),
+            defaults={"artifact": artifact},
+        )
+        if not created and content_artifact.artifact_id is None:
+            content_artifact.artifact = artifact
+            content_artifact.save()
+        RemoteArtifact.objects.get_or_create(
+            remote=remote, content_artifact=content_artifact, defaults={"url": url}
+        )
+    return content_artifact
+
+
+async def fetch_tarball(remote, entry):
+    """
+    Download the tarball of a version entry from a remote and save it, unless already saved.
+
+    Returns:
+        pulpcore.plugin.models.ContentArtifact: The content artifact, or None if it was saved.
+    """
+    url = entry["dist"]["tarball"]
+    saved = RemoteArtifact.objects.filter(
+        remote=remote, url=url, content_artifact__artifact__isnull=False
+    )
+    if await saved.aexists():
+        return None
+
+    downloader = remote.get_downloader(url=url, expected_digests=expected_digests(entry["dist"]))
+    result = await downloader.run()
+    return await sync_to_async(record_tarball)(remote, result, entry)
+
+
+def _prefetch_budget(distribution):
+    concurrency, budget = _prefetch_budgets.get(distribution.pk, (None, None))
+    if concurrency != distribution.prefetch_concurrency:
+        budget = asyncio.Semaphore(distribution.prefetch_concurrency)
+        _prefetch_budgets[distribution.pk] = (distribution.prefetch_concurrency, budget)
+    return budget
+
+
+def schedule_prefetch(distribution, remote, body):
+    """
+    Prefetch in the background what an install usually requests after a packument.
+
+    Prefetching is best effort: nothing is scheduled while the distribution uses all of its
+    ``prefetch_concurrency``. Prefetched tarballs are saved for the remote only, they are added
+    to the repository of the distribution when a client requests them, like any other tarball.
+
+    Args:
+        distribution (pulp_npm.app.models.NpmDistribution): A distribution with a remote.
+        remote (pulp_npm.app.models.NpmRemote): The remote of the distribution.
+        body (bytes): The packument just fetched from the remote.
+    """
+    if not distribution.prefetch_depth:
+        return
+    budget = _prefetch_budget(distribution)
+    if budget.locked():
+        return
+
+    prefetch = asyncio.ensure_future(_prefetch_root(distribution, remote, budget, body))
+    _prefetches.add(prefetch)
+    prefetch.add_done_callback(_prefetches.discard)
+
+
+async def _prefetch_root(distribution, remote, budget, body):
+    try:
+        await _prefetch(distribution, remote, budget, body, distribution.prefetch_depth)
+    except Exception:
+        log.exception("Prefetching for distribution %s failed.", distribution.name)
+
+
+async def _prefetch(distribution, remote, budget, body, depth, seen=None):
+    packument = await asyncio.to_thread(json_codec.loads, body)
+    latest = packument.get("dist-tags", {}).get("latest")
+    entry = packument.get("versions", {}).get(latest)
+    if not entry:
+        return
+
+    seen = seen if seen is not None else {packument.get("name")}
+    dependencies = [name for name in entry.get("dependencies") or {} if name not in seen]
+    seen.update(dependencies)
+
+    results = await asyncio.gather(
+        _prefetch_tarball(remote, budget, entry),
+        *(
+            _prefetch_dependency(distribution, remote, budget, name, depth, seen)
+            for name in dependencies
+        ),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            log.info("Prefetching for %s failed: %s", packument.get("name"), result)
+
+
+async def _prefetch_tarball(remote, budget, entry):
+    # only saved as an artifact of the remote, the repository gets the package once requested
+    async with budget:
+        await fetch_tarball(remote, entry)
+
+
+async def _prefetch_dependency(distribution, remote, budget, name, depth, seen):
+    key = _cache_key(distribution, name)
+    if key in missing_upstream:
+        return
+
+    cached = upstream_packuments.get(key)
+    if cached and cached[1] < distribution.metadata_ttl:
+        body = cached[0]
+    else:
+        async with budget:
+            body = await upstream_fetches.run(key, partial(_download_packument, key, remote, name))
+
+    if body and depth > 1:
+        await _prefetch(distribution, remote, budget, body, depth - 1, seen)
@@ -0,0 +1,155 @@
+import json
+from logging import getLogger
+
+from aiohttp import ClientResponseError
+from aiohttp.web_response import StreamResponse
+from django.conf import settings
+
+from . import json_codec, pull_through
+
+log = getLogger(__name__)
+
+
+def error_body(message):
+    """
+    Serialize an error the way the npm registry does.
+    """
+    return json.dumps({"error": message}).encode()
+
+
+class PackumentResponse(StreamResponse):
+    """
+    A response that renders the packument of a package when aiohttp prepares it.
+
+    ``NpmDistribution.content_handler`` is called from a thread of the content app, so it only
+    decides what is requested. The database work happens here, on the event loop, through
+    Django's async ORM, and does not hold one of the content app's threads.
+
+    Packages the distribution does not serve are looked up on its remote, if it has one.
+    """
+
+    NOT_FOUND = error_body("Not found")
+
+    def __init__(self, distribution, name):
+        """
+        Args:
+            distribution (pulp_npm.app.models.NpmDistribution): The distribution to serve from.
+            name (str): The package name.
+        """
+        super().__init__(headers={"Content-Type": "application/json"})
+        self.distribution = distribution
+        self.name = name
+
+    async def prepare(self, request):
+        """
+        Render the packument, then send the headers and the body.
+        """
+        if self.prepared:
+            return await super().prepare(request)
+
+        if settings.NPM_PACKUMENT_STREAMING and not settings.NPM_PACKUMENT_SQL_RENDERING:
+            return await self._prepare_streamed(request)
+
+        body = await self.distribution.arender_packument(self.name)
+        if body is None:
+            return await self._prepare_upstream(request)
+        return await self._prepare_body(request, body)
+
+    async def _prepare_body(self, request, body):
+        """
+        Send a complete body, or a 404 if there is none.
+        """
+        if body is None:
+            self.set_status(404)
+            body = self.NOT_FOUND
+
+        self.content_length = len(body)
+        writer = await super().prepare(request)
+        if request.method != "HEAD":
+            await self.write(body)
+        return writer
+
+    async def _prepare_upstream(self, request):
+        """
+        Send the packument from the remote of the distribution.
+        """
+        if not self.distribution.remote:
+            return await self._prepare_body(request, None)
+
+        try:
+            body = await pull_through.fetch_packument(self.distribution, self.name)
+        except ClientResponseError as exc:
+            log.warning("Fetching the packument of %s failed: %s", self.name, exc)
+            self.set_status(exc.status if exc.status >= 500 else 502)
+            body = error_body(f"Upstream registry returned {exc.status}")
+        except pull_through.UPSTREAM_ERRORS as exc:
+            log.warning("Fetching the packument of %s failed: %s", self.name, exc)
+            self.set_status(502)
+            body = error_body("Upstream registry unreachable")
+        return await self._prepare_body(request, body)
+
+    async def _prepare_streamed(self, request):
+        """
+        Send the packument with chunked encoding while it is being rendered.
+        """
+        chunks = self.distribution.astream_packument(self.name)
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            return await self._prepare_upstream(request)
+
+        self.enable_chunked_encoding()
+        writer = await super().prepare(request)
+        if request.method == "HEAD":
+            await chunks.aclose()
+            return writer
+
+        await self.write(first)
+        async for chunk in chunks:
+            await self.write(chunk)
+        return writer
+
+
+class SearchResponse(StreamResponse):
+    """
+    A response that runs a registry search when aiohttp prepares it.
+
+    Like ``PackumentResponse``, the query runs on the event loop rather than in the thread that
+    called ``NpmDistribution.content_handler``.
+    """
+
+    def __init__(self, distribution):
+        """
+        Args:
+            distribution (pulp_npm.app.models.NpmDistribution): The distribution to search.
+        """
+        super().__init__(headers={"Content-Type": "application/json"})
+        self.distribution = distribution
+
+    async def prepare(self, request):
+        """
+        Run the search, then send the headers and the results.
+        """
+        if self.prepared:
+            return await super().prepare(request)
+
+        from .search import DEFAULT_SIZE, MAX_SIZE
+
+        text = request.query.get("text", "").strip()
+        try:
+            size = min(int(request.query.get("size", DEFAULT_SIZE)), MAX_SIZE)
+            offset = int(request.query.get("from", 0))
+            if size < 1 or offset < 0:
+                raise ValueError()
+        except ValueError:
+            self.set_status(400)
+            body = error_body("'size' and 'from' must be positive integers")
+        else:
+            results = await self.distribution.asearch(text, size, offset)
+            body = json_codec.dumps(results)
+
+        self.content_length = len(body)
+        writer = await super().prepare(request)
+        if request.method != "HEAD":
+            await self.write(body)
+        return writer
@@ -0,0 +1,113 @@
+"""
+The npm registry search API, ``/-/v1/search``.
+
+Package names and descriptions are matched with ``ILIKE``, which PostgreSQL answers from the
+trigram indexes on ``Package.name`` and on the description of ``Package.manifest``. Packages are
+ranked by the trigram similarity of their name to the searched text, matches in descriptions
+weighing half as much.
+
+Django's ``icontains`` is not used: it compiles to ``UPPER(name) LIKE UPPER(...)``, which the
+trigram indexes do not serve.
+"""
+
+from django.contrib.postgres.search import TrigramSimilarity, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import BooleanField, ExpressionWrapper, F, Lookup, Max, Q, Value
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Greatest
+
+from .models import Package
+from .packument import repository_version_packages
+from .utils import RELEASE_KEY
+
+DEFAULT_SIZE = 20
+MAX_SIZE = 250
+
+
+class ILike(Lookup):
+    """
+    Case insensitive ``LIKE``, a pattern lookup the ``gin_trgm_ops`` indexes serve.
+    """
+
+    lookup_name = "ilike"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} ILIKE {rhs}", [*lhs_params, *rhs_params]
+
+
+def _contains(expression, text):
+    pattern = f"%{connection.ops.prep_for_like_query(text)}%"
+    return ILike(expression, Value(pattern))
+
+
+def _latest_versions(packages, names):
+    is_release = ExpressionWrapper(Q(version_prerelease=RELEASE_KEY), output_field=BooleanField())
+    return (
+        packages.filter(name__in=names)
+        .annotate(is_release=is_release)
+        .order_by(
+            "name",
+            F("is_release").desc(),
+            *(F(field).desc() for field in Package.VERSION_ORDERING),
+        )
+        .distinct("name")
+        .values_list("name", "version", "pulp_created", "manifest__description")
+    )
+
+
+async def asearch(repository_version, domain_pk, text, size=DEFAULT_SIZE, offset=0):
+    """
+    Search the packages of a repository version by name and description.
+
+    Args:
+        repository_version (pulpcore.plugin.models.RepositoryVersion): The repository version.
+        domain_pk (uuid.UUID): The pk of the domain the repository lives in.
+        text (str): The text to search for in the package names and descriptions.
+        size (int): The maximum number of results.
+        offset (int): The number of results to skip.
+
+    Returns:
+        dict: The search results, in the format of the npm registry.
+    """
+    packages = repository_version_packages(repository_version, domain_pk)
+    description = KeyTextTransform("description", "manifest")
+    score = Greatest(TrigramSimilarity("name", text), TrigramWordSimilarity(text, description) / 2)
+    matches = (
+        packages.filter(Q(_contains(F("name"), text)) | Q(_contains(description, text)))
+        .values("name")
+        .annotate(score=Max(score))
+        .order_by("-score", "name")
+    )
+
+    total = await matches.acount()
+    page = [match async for match in matches[offset : offset + size]]
+    latest = {
+        name: (version, created, description)
+        async for name, version, created, description in _latest_versions(
+            packages, [match["name"] for match in page]
+        )
+    }
+
+    objects = []
+    for match in page:
+        version, created, description = latest[match["name"]]
+        score = match["score"]
+        objects.append(
+            {
+                "package": {
+                    "name": match["name"],
+                    "version": version,
+                    "description": description if isinstance(description, str) else "",
+                    "date": created.isoformat(),
+                    "links": {},
+                },
+                "score": {
+                    "final": score,
+                    "detail": {"quality": score, "popularity": score, "maintenance": score},
+                },
+                "searchScore": score,
+            }
+        )
+    return {"objects": objects, "total": total}
@@ -1,10 +1,14 @@
+import os
 from gettext import gettext as _
+
+from django.conf import settings
 from rest_framework import serializers
 
 from pulpcore.plugin import models as core_models
 from pulpcore.plugin import serializers as core_serializers
 
 from . import models
+from .utils import lockfile_packages, parse_package_spec
 
 
 class PackageSerializer(core_serializers.SingleArtifactContentUploadSerializer):
@@ -16,6 +20,10 @@ class PackageSerializer(core_serializers.SingleArtifactContentUploadSerializer):
     version = serializers.CharField()
     relative_path = serializers.CharField()
     dependencies = serializers.JSONField()
+    manifest = serializers.JSONField(
+        read_only=True,
+        help_text=_("The fields of the package.json npm needs to install the package."),
+    )
 
     class Meta:
         fields = core_serializers.SingleArtifactContentUploadSerializer.Meta.fields + (
@@ -23,6 +31,7 @@ class PackageSerializer(core_serializers.SingleArtifactContentUploadSerializer):
             "version",
             "relative_path",
             "dependencies",
+            "manifest",
         )
         model = models.Package
 
@@ -93,6 +102,33 @@ class NpmRepositorySyncSerializer(core_serializers.RepositorySyncURLSerializer):
     sync_deps = serializers.BooleanField(default=False, required=False)
 
 
+class NpmRepositoryImportSerializer(serializers.Serializer):
+    """
+    Serializer for importing a directory of npm tarballs into a repository.
+    """
+
+    path = serializers.CharField(
+        help_text=_(
+            "Absolute path of a directory of the Pulp server holding npm tarballs, like the "
+            "storage of Verdaccio or as 'name/-/name-version.tgz'. It must be within "
+            "ALLOWED_IMPORT_PATHS."
+        ),
+    )
+
+    def validate_path(self, value):
+        """
+        Check that the path is absolute and within ALLOWED_IMPORT_PATHS.
+        """
+        if not os.path.isabs(value):
+            raise serializers.ValidationError(_("The path must be absolute."))
+        path = os.path.realpath(value)
+        if not any(path.startswith(allowed) for allowed in settings.ALLOWED_IMPORT_PATHS):
+            raise serializers.ValidationError(
+                _("'{}' is not an allowed import path.").format(value)
+            )
+        return path
+
+
 class NpmDistributionSerializer(core_serializers.DistributionSerializer):
     """
     Serializer for NPM Distributions.
@@ -105,12 +141,99 @@ class NpmDistributionSerializer(core_serializers.DistributionSerializer):
         queryset=core_models.Remote.objects.all(),
         allow_null=True,
     )
+    metadata_ttl = serializers.IntegerField(
+        required=False,
+        min_value=0,
+        help_text=_(
+            "Number of seconds packuments fetched from the remote are served from the cache "
+            "before being fetched again. 0 fetches them on every request."
+        ),
+    )
+    prefetch_depth = serializers.IntegerField(
+        required=False,
+        min_value=0,
+        max_value=5,
+        help_text=_(
+            "When a packument is fetched from the remote, also fetch the tarball of its latest "
+            "version and the packuments of its dependencies, recursively up to this depth. "
+            "0 disables prefetching."
+        ),
+    )
+    prefetch_concurrency = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=64,
+        help_text=_("Maximum number of concurrent prefetch downloads of each content app process."),
+    )
 
     class Meta:
-        fields = core_serializers.DistributionSerializer.Meta.fields + ("remote",)
+        fields = core_serializers.DistributionSerializer.Meta.fields + (
+            "remote",
+            "metadata_ttl",
+            "prefetch_depth",
+            "prefetch_concurrency",
+        )
         model = models.NpmDistribution
 
 
+class NpmDistributionWarmUpSerializer(serializers.Serializer):
+    """
+    Serializer for warming up the pull-through cache of a distribution.
+    """
+
+    packages = serializers.ListField(
+        child=serializers.CharField(),
+        required=False,
+        help_text=_(
+            "Package specs to fetch, as 'name@version' or 'name@dist-tag'. "
+            "A spec without a version fetches the latest version."
+        ),
+    )
+    lockfile = serializers.JSONField(
+        required=False,
+        help_text=_("A package-lock.json or npm-shrinkwrap.json whose packages to fetch."),
+    )
+    concurrency = serializers.IntegerField(
+        default=10,
+        min_value=1,
+        max_value=64,
+        help_text=_("Maximum number of concurrent downloads."),
+    )
+
+    def validate_lockfile(self, value):
+        """
+        Check that the lockfile is a JSON object.
+        """
+        if not isinstance(value, dict):
+            raise serializers.ValidationError(_("The lockfile must be a JSON object."))
+        return value
+
+    def validate(self, data):
+        """
+        Merge the package specs and the lockfile into a single list of (name, version).
+        """
+        packages = {parse_package_spec(spec) for spec in data.get("packages", [])}
+        packages.update(lockfile_packages(data.get("lockfile", {})))
+        if not packages:
+            raise serializers.ValidationError(
+                _("Either 'packages' or a 'lockfile' listing packages is required.")
+            )
+        return {"packages": sorted(packages), "concurrency": data["concurrency"]}
+
+
+class NpmPackumentsSerializer(serializers.Serializer):
+    """
+    Serializer for fetching the packuments of several packages at once.
+    """
+
+    names = serializers.ListField(
+        child=serializers.CharField(max_length=214),
+        allow_empty=False,
+        max_length=10000,
+        help_text=_("Names of the packages whose packuments to return."),
+    )
+
+
 class LoginSerializer(serializers.Serializer):
     """
     Serializer for NPM Login.
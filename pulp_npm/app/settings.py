@@ -0,0 +1,54 @@
+# Render packuments inside PostgreSQL (jsonb_object_agg) instead of building them in Python.
+# Recommended for repositories holding packages with thousands of versions.
+NPM_PACKUMENT_SQL_RENDERING = False
+
+# Stream packuments version by version with chunked encoding, keeping time-to-first-byte and
+# memory flat for packages with very long version histories. Not used with SQL rendering.
+NPM_PACKUMENT_STREAMING = False
+
+# JSON library used for packuments and publish documents: "auto" picks orjson or msgspec when
+# installed and the standard library otherwise. "orjson", "msgspec" or "json" force one.
+NPM_JSON_BACKEND = "auto"
+
+# Directory for the memory-mapped packument index written for every new repository version.
+# Must be shared by the workers and the content app processes. None disables the indexes.
+NPM_METADATA_INDEX_DIR = None
+
+# Pull-through distributions keep serving a cached packument for this many seconds after its
+# TTL expired while fetching a fresh copy in the background.
+NPM_METADATA_STALE_WHILE_REVALIDATE = 3600
+
+# Pull-through distributions serve a cached packument for this many seconds after its TTL
+# expired when the remote cannot be reached or fails.
+NPM_METADATA_STALE_IF_ERROR = 86400
+
+# Memory each content app process may use for packuments fetched from remotes, in bytes.
+NPM_METADATA_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Pull-through distributions remember for this many seconds that their remote does not have a
+# package, and answer requests for it with a 404 without contacting the remote. 0 disables it.
+NPM_NEGATIVE_CACHE_TTL = 60
+
+# Number of missing packages each content app process remembers.
+NPM_NEGATIVE_CACHE_MAX_ENTRIES = 10000
+
+# Seconds the publish task waits for more "npm publish" uploads to the same repository, so that
+# they are all added in a single repository version. The repository is not locked meanwhile.
+NPM_PUBLISH_BATCH_WINDOW = 1.0
+
+# Seconds each API process trusts an auth token it verified before checking it against the
+# database again. Revoked tokens are rejected immediately regardless. 0 disables the cache.
+NPM_TOKEN_CACHE_TTL = 30
+
+# Seconds after which the auth tokens issued by "npm login" expire. 0 makes them never expire.
+NPM_TOKEN_MAX_AGE = 90 * 24 * 60 * 60
+
+# Number of auth tokens kept per user, logging in again deletes the oldest ones beyond it.
+NPM_MAX_TOKENS_PER_USER = 20
+
+# Write published tarballs straight to the storage while decoding them, instead of to a local
+# temporary file first, when the storage is not the local filesystem (e.g. S3).
+NPM_STREAM_UPLOADS_TO_STORAGE = True
+
+# Processes hashing tarballs when a directory is imported into a repository, 0 uses one per CPU.
+NPM_IMPORT_PROCESSES = 0
@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from pulpcore.plugin.models import RepositoryVersion
+
+from .cache import notify_repository_changed, notify_token_revoked
+from .metadata_index import delete_index
+from .models import AuthToken
+
+
+@receiver(post_delete, sender=RepositoryVersion)
+def invalidate_deleted_repository_version(sender, instance, **kwargs):
+    """
+    Clean up after a deleted version: drop its index and the cached resolutions of its repository.
+    """
+    delete_index(instance.pk)
+    if instance.complete:
+        notify_repository_changed(instance.repository_id)
+
+
+@receiver(post_delete, sender=AuthToken)
+def revoke_deleted_auth_token(sender, instance, **kwargs):
+    """
+    Drop a deleted token from the verification cache of every process.
+    """
+    notify_token_revoked(instance.key)
@@ -0,0 +1,174 @@
+"""
+Writing of npm tarballs to the storage of the domain.
+
+With object storage, saving an artifact from a local temporary file uploads the whole file once
+it is complete. ``StorageUpload`` writes the tarball to the storage while it is decoded instead,
+which object storage backends turn into a multipart upload, so nothing is written to the local
+disk and the upload overlaps with the decoding. Once its digests are known, the tarball is copied
+to its artifact path on the server, see ``move()``.
+"""
+
+import os
+import posixpath
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+
+from pulpcore.plugin import pulp_hashlib
+from pulpcore.plugin.models import Artifact
+from pulpcore.plugin.util import get_domain
+
+
+def streams_to_storage():
+    """
+    Whether published tarballs are written straight to the storage of the current domain.
+    """
+    storage = get_domain().get_storage()
+    return settings.NPM_STREAM_UPLOADS_TO_STORAGE and not isinstance(storage, FileSystemStorage)
+
+
+def move(storage, source, destination):
+    """
+    Move a file within a storage.
+
+    S3 compatible storages, see ``storages.backends.s3.S3Storage``, copy the object on the
+    server, so the file is not transferred again. Other storages stream it through the process,
+    reading it back and saving it under its new name.
+
+    The destination is left as is if it exists, artifact paths being content addressed.
+    """
+    if not storage.exists(destination):
+        bucket = getattr(storage, "bucket", None)
+        if bucket is not None and hasattr(bucket, "copy"):
+            bucket.copy(
+                {"Bucket": bucket.name, "Key": object_key(storage, source)},
+                object_key(storage, destination),
+                ExtraArgs=storage.get_object_parameters(destination),
+            )
+        else:
+            with storage.open(source, "rb") as source_file:
+                storage.save(destination, source_file)
+    storage.delete(source)
+
+
+def object_key(storage, name):
+    """
+    The key of a file of an S3 compatible storage, its name under the ``location`` of the storage.
+
+    Only meant for the names of this module and of artifacts, which need no cleaning.
+    """
+    location = (getattr(storage, "location", "") or "").strip("/")
+    return posixpath.join(location, name) if location else name
+
+
+def copy_local_file(storage, path, destination):
+    """
+    Copy a file of the local filesystem to a storage, leaving the original in place.
+
+    The destination is left as is if it exists, artifact paths being content addressed.
+
+    Returns:
+        str: The name of the file in the storage.
+    """
+    if storage.exists(destination):
+        return destination
+    with open(path, "rb") as local_file:
+        return storage.save(destination, File(local_file))
+
+
+class StorageUpload:
+    """
+    A tarball written to the storage of the current domain while ``PublishDocumentReader``
+    decodes it.
+
+    Like ``PulpTemporaryUploadedFile``, it carries its ``size``, ``hashers``, ``manifest`` and
+    ``package_json``. It is written under a temporary name, ``save_artifact()`` moves it to its
+    artifact path once its digests are known.
+    """
+
+    def __init__(self, name):
+        """
+        Args:
+            name (str): The file name of the tarball.
+        """
+        self.name = name
+        self.size = 0
+        self.hashers = {
+            algorithm: pulp_hashlib.new(algorithm) for algorithm in Artifact.DIGEST_FIELDS
+        }
+        self.manifest = None
+        self.package_json = None
+        self.storage = get_domain().get_storage()
+        self.storage_name = os.path.join("tmp", "npm", uuid.uuid4().hex)
+        self.file = self.storage.open(self.storage_name, "wb")
+        self.writing = True
+        self.stored = True
+
+    def write(self, data):
+        """
+        Append data to the tarball.
+        """
+        self.file.write(data)
+
+    def _finish_writing(self):
+        if self.writing:
+            self.file.close()
+            self.writing = False
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """
+        Finish writing the tarball and move to a position in it, for reading it back.
+        """
+        if self.writing:
+            self._finish_writing()
+            self.file = self.storage.open(self.storage_name, "rb")
+        return self.file.seek(offset, whence)
+
+    def read(self, size=-1):
+        """
+        Read the tarball back, once written.
+        """
+        return self.file.read(size)
+
+    def close(self):
+        """
+        Close the tarball, removing it from the storage unless it became an artifact.
+        """
+        self.file.close()
+        self.writing = False
+        if self.stored:
+            self.storage.delete(self.storage_name)
+            self.stored = False
+
+    def save_artifact(self):
+        """
+        Create the artifact of the tarball, or get the existing one.
+
+        Returns:
+            pulpcore.plugin.models.Artifact: The saved artifact.
+        """
+        self._finish_writing()
+        self.file.close()
+        digests = {name: hasher.hexdigest() for name, hasher in self.hashers.items()}
+        artifact = Artifact(size=self.size, **digests)
+
+        existing = Artifact.objects.filter(artifact.q()).first()
+        if existing:
+            self.close()
+            existing.touch()
+            return existing
+
+        path = artifact.storage_path(self.name)
+        move(self.storage, self.storage_name, path)
+        self.stored = False
+        artifact.file = path
+        try:
+            with transaction.atomic():
+                artifact.save()
+        except IntegrityError:
+            artifact = Artifact.objects.get(artifact.q())
+            artifact.touch()
+        return artifact
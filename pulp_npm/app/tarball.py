@@ -0,0 +1,209 @@
+"""
+Incremental reading of npm package tarballs.
+"""
+
+import hashlib
+import json
+import zlib
+
+from .utils import manifest_fields
+
+BLOCK_SIZE = 512
+ZERO_BLOCK = bytes(BLOCK_SIZE)
+
+# Maximum number of bytes decompressed at once
+DECOMPRESS_CHUNK_SIZE = 1024 * 1024
+
+# Largest package.json read from a tarball
+MAX_PACKAGE_JSON_SIZE = 1024 * 1024
+
+# Number of bytes read at once from tarballs on the local filesystem
+READ_SIZE = 1024 * 1024
+
+# Tar type flags of regular files
+REGULAR_FILES = (b"0", b"\0", b"7")
+
+
+def _string(field):
+    return field.split(b"\0", 1)[0].decode("utf-8", "replace")
+
+
+def _number(field):
+    if field[0] & 0x80:
+        # GNU base-256 encoding of large sizes
+        return int.from_bytes(field[1:], "big")
+    return int(_string(field).strip() or "0", 8)
+
+
+class TarballReader:
+    """
+    Reads the package.json and the statistics of a gzipped package tarball fed chunk by chunk.
+
+    npm tarballs hold the package in a single top-level directory, usually "package/". Its
+    package.json is kept, the other entries are only counted, so the tarball is read once while
+    it is being written and hashed, whatever its size.
+    """
+
+    def __init__(self):
+        self.file_count = 0
+        self.unpacked_size = 0
+        self.package_json = None
+        self.error = None
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._buffer = bytearray()
+        self._finished = False
+        # data and padding bytes left in the current entry
+        self._remaining = 0
+        self._padding = 0
+        # "package.json", "pax" or "long name" when the data of the current entry is needed
+        self._capture_kind = None
+        self._capture = bytearray()
+        # path of the next entry, set by a pax or GNU long name entry
+        self._next_path = None
+
+    def feed(self, data):
+        """
+        Read the next part of the gzipped tarball.
+        """
+        if self.error or self._finished:
+            return
+        try:
+            while data and not self._finished:
+                self._buffer += self._decompressor.decompress(data, DECOMPRESS_CHUNK_SIZE)
+                data = self._decompressor.unconsumed_tail
+                self._parse()
+        except (zlib.error, ValueError, UnicodeDecodeError) as exc:
+            self.error = exc
+
+    def manifest(self):
+        """
+        The manifest of the package, see ``utils.manifest_fields()``.
+
+        Returns:
+            dict: The manifest, or None if the tarball has no readable package.json.
+        """
+        if self.error or not isinstance(self.package_json, dict):
+            return None
+        manifest = manifest_fields(self.package_json)
+        manifest["dist"] = {"fileCount": self.file_count, "unpackedSize": self.unpacked_size}
+        return manifest
+
+    def _parse(self):
+        buffer = self._buffer
+        position = 0
+        while not self._finished:
+            available = len(buffer) - position
+            if self._remaining:
+                size = min(self._remaining, available)
+                if not size:
+                    break
+                if self._capture_kind:
+                    self._capture += buffer[position : position + size]
+                position += size
+                self._remaining -= size
+                if not self._remaining:
+                    self._end_entry()
+            elif self._padding:
+                size = min(self._padding, available)
+                if not size:
+                    break
+                position += size
+                self._padding -= size
+            elif available >= BLOCK_SIZE:
+                self._header(bytes(buffer[position : position + BLOCK_SIZE]))
+                position += BLOCK_SIZE
+            else:
+                break
+        del buffer[:position]
+
+    def _header(self, header):
+        if header == ZERO_BLOCK:
+            self._finished = True
+            return
+
+        path = self._next_path
+        if path is None:
+            path = _string(header[0:100])
+            if header[257:262] == b"ustar" and header[345]:
+                path = f"{_string(header[345:500])}/{path}"
+        self._next_path = None
+
+        size = _number(header[124:136])
+        type_flag = header[156:157]
+        self._remaining = size
+        self._padding = -size % BLOCK_SIZE
+        self._capture_kind = None
+
+        if type_flag == b"x":
+            self._capture_kind = "pax"
+        elif type_flag == b"L":
+            self._capture_kind = "long name"
+        elif type_flag in REGULAR_FILES:
+            self.file_count += 1
+            self.unpacked_size += size
+            parts = path.strip("/").split("/")
+            if parts[0] == ".":
+                parts = parts[1:]
+            if (
+                len(parts) == 2
+                and parts[1] == "package.json"
+                and self.package_json is None
+                and size <= MAX_PACKAGE_JSON_SIZE
+            ):
+                self._capture_kind = "package.json"
+
+        self._capture = bytearray()
+        if not size:
+            self._end_entry()
+
+    def _end_entry(self):
+        kind, data = self._capture_kind, bytes(self._capture)
+        self._capture_kind, self._capture = None, bytearray()
+
+        if kind == "package.json":
+            try:
+                self.package_json = json.loads(data)
+            except ValueError:
+                self.package_json = False
+        elif kind == "long name":
+            self._next_path = _string(data)
+        elif kind == "pax":
+            while data:
+                length = data.split(b" ", 1)[0]
+                record, data = data[len(length) + 1 : int(length)], data[int(length) :]
+                key, _, value = record.rstrip(b"\n").partition(b"=")
+                if key == b"path":
+                    self._next_path = value.decode("utf-8", "replace")
+
+
+def inspect_tarball(path, algorithms):
+    """
+    Hash a tarball of the local filesystem and read its package.json.
+
+    A module level function, so that it can run in a process pool.
+
+    Args:
+        path (str): The path of the tarball.
+        algorithms (list): The names of the ``hashlib`` algorithms to compute.
+
+    Returns:
+        dict: The "size" of the tarball, its "digests" by algorithm, its "package_json" and its
+            "manifest", see ``TarballReader.manifest()``. Both are None if the tarball has no
+            readable package.json.
+    """
+    hashers = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+    reader = TarballReader()
+    size = 0
+    with open(path, "rb") as tarball:
+        while chunk := tarball.read(READ_SIZE):
+            size += len(chunk)
+            for hasher in hashers.values():
+                hasher.update(chunk)
+            reader.feed(chunk)
+    manifest = reader.manifest()
+    return {
+        "size": size,
+        "digests": {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()},
+        "package_json": reader.package_json if manifest is not None else None,
+        "manifest": manifest,
+    }
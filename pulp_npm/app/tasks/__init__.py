@@ -1,2 +1,4 @@
 from .synchronizing import synchronize  # noqa
-from .publishing import publish
\ No newline at end of file
+from .publishing import batch_publish, publish, publish_pending, publish_upload  # noqa
+from .importing import import_directory  # noqa
+from .warming import warm_up  # noqa
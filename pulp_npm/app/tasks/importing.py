@@ -0,0 +1,292 @@
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from gettext import gettext as _
+from itertools import repeat
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+
+from pulpcore.plugin.models import Artifact, ContentArtifact, ProgressReport
+from pulpcore.plugin.util import get_domain
+from pulp_npm.app import json_codec
+from pulp_npm.app.models import NpmRepository, Package
+from pulp_npm.app.storage import copy_local_file
+from pulp_npm.app.tarball import inspect_tarball
+from pulp_npm.app.tasks.publishing import save_package, store_dist_tags
+
+log = logging.getLogger(__name__)
+
+# Number of tarballs whose packages are created in the same transaction
+BATCH_SIZE = 500
+
+# Number of tarballs handed to a hashing process at once
+HASH_CHUNK_SIZE = 16
+
+
+def import_directory(repository_pk, path):
+    """
+    Import the npm packages stored in a directory of the Pulp server into a repository.
+
+    The directory is laid out like the storage of Verdaccio, ``name/name-version.tgz`` next to
+    the packument of each package in ``name/package.json``, or like a registry,
+    ``name/-/name-version.tgz``. Scoped packages live in ``@scope/name``. The tarballs are
+    hashed in a process pool, their packages are created in batches and added to the repository
+    in a single new version. The dist-tags of the packuments found are stored as well.
+
+    Tarballs without a readable package.json, or holding another package than their directory
+    is named after, are skipped.
+
+    Args:
+        repository_pk (str): The repository PK.
+        path (str): The absolute path of the directory, within ``ALLOWED_IMPORT_PATHS``.
+
+    Raises:
+        ValueError: If the path is not a directory.
+    """
+    if not os.path.isdir(path):
+        raise ValueError(_("{} is not a directory.").format(path))
+
+    repository = NpmRepository.objects.get(pk=repository_pk)
+    packages = find_packages(path)
+    tarballs = [(name, tarball) for name, files in packages.items() for tarball in files]
+
+    importer = DirectoryImporter()
+    tarballs_progress = ProgressReport(
+        message=_("Importing tarballs"), code="import.tarballs", total=len(tarballs)
+    )
+    skipped_progress = ProgressReport(message=_("Skipped tarballs"), code="import.skipped")
+    with tarballs_progress, skipped_progress:
+        # forked processes must not share the database connections of the task
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=settings.NPM_IMPORT_PROCESSES or None) as pool:
+            for batch in inspect_tarballs(pool, tarballs):
+                skipped = importer.import_batch(batch)
+                tarballs_progress.increase_by(len(batch))
+                if skipped:
+                    skipped_progress.increase_by(skipped)
+
+    with repository.new_version() as new_version:
+        new_version.add_content(Package.objects.filter(pk__in=importer.package_pks))
+
+    for name in importer.versions:
+        tags = packument_dist_tags(os.path.join(path, name, "package.json"))
+        tags = {tag: version for tag, version in tags.items() if version in importer.versions[name]}
+        store_dist_tags(repository, name, tags)
+
+
+def inspect_tarballs(pool, tarballs):
+    """
+    Hash tarballs in a process pool, one batch ahead of the caller.
+
+    The next batch is hashed while the caller creates the packages of the current one.
+
+    Args:
+        pool (concurrent.futures.ProcessPoolExecutor): The pool.
+        tarballs (list): The ``(name, path)`` of each tarball.
+
+    Yields:
+        list: The ``((name, path), inspected)`` of the tarballs of each batch, see
+            ``tarball.inspect_tarball()``.
+    """
+    pending = None
+    for start in range(0, len(tarballs), BATCH_SIZE):
+        batch = tarballs[start : start + BATCH_SIZE]
+        inspected = pool.map(
+            inspect_tarball,
+            [path for name, path in batch],
+            repeat(Artifact.DIGEST_FIELDS),
+            chunksize=HASH_CHUNK_SIZE,
+        )
+        if pending:
+            yield list(zip(*pending))
+        pending = (batch, inspected)
+    if pending:
+        yield list(zip(*pending))
+
+
+def package_name(root, directory):
+    """
+    The name of the package a directory of an imported tree holds, or None if it holds none.
+    """
+    name = os.path.relpath(directory, root).replace(os.sep, "/")
+    parts = name.split("/")
+    if len(parts) == 1 and not name.startswith(("@", ".")):
+        return name
+    if len(parts) == 2 and parts[0].startswith("@") and len(parts[0]) > 1:
+        return name
+    return None
+
+
+def find_packages(root):
+    """
+    Find the tarballs of a directory to import, see ``import_directory()``.
+
+    Returns:
+        dict: The paths of the tarballs of each package name, sorted.
+    """
+    packages = defaultdict(list)
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        tarballs = sorted(filename for filename in filenames if filename.endswith(".tgz"))
+        if not tarballs:
+            continue
+        package_directory = directory
+        if os.path.basename(directory) == "-":
+            package_directory = os.path.dirname(directory)
+        name = package_name(root, package_directory)
+        if name is None:
+            log.warning(
+                _("Skipping the tarballs of {}, not a package directory.").format(directory)
+            )
+            continue
+        packages[name].extend(os.path.join(directory, filename) for filename in tarballs)
+    return dict(packages)
+
+
+def packument_dist_tags(path):
+    """
+    The dist-tags of a packument stored next to imported tarballs, if any.
+    """
+    try:
+        with open(path, "rb") as packument_file:
+            packument = json_codec.loads(packument_file.read())
+    except (OSError, ValueError):
+        return {}
+    tags = packument.get("dist-tags") if isinstance(packument, dict) else None
+    if not isinstance(tags, dict):
+        return {}
+    return {tag: version for tag, version in tags.items() if isinstance(version, str)}
+
+
+class DirectoryImporter:
+    """
+    Creates the packages of the tarballs of a directory, one batch at a time.
+
+    Attributes:
+        package_pks (list): The PKs of the packages imported so far, created or existing.
+        versions (dict): The versions imported so far of each package name.
+    """
+
+    def __init__(self):
+        self.domain = get_domain()
+        self.storage = self.domain.get_storage()
+        self.package_pks = []
+        self.versions = defaultdict(set)
+
+    def import_batch(self, batch):
+        """
+        Import a batch of tarballs.
+
+        Args:
+            batch (list): The ``((name, path), inspected)`` of each tarball, ``inspected``
+                being the result of ``tarball.inspect_tarball()``.
+
+        Returns:
+            int: The number of tarballs skipped.
+        """
+        candidates = {}
+        skipped = 0
+        for (name, path), inspected in batch:
+            package_json = inspected["package_json"]
+            version = package_json.get("version") if package_json else None
+            if not package_json or package_json.get("name") != name:
+                log.warning(_("Skipping {}, it does not hold the package {}.").format(path, name))
+                skipped += 1
+            elif not isinstance(version, str) or not 0 < len(version) <= 128:
+                log.warning(_("Skipping {}, its version is not valid.").format(path))
+                skipped += 1
+            elif version not in self.versions[name]:
+                self.versions[name].add(version)
+                candidates[(name, version)] = (path, inspected)
+
+        existing = Package.objects.filter(
+            _pulp_domain=self.domain, name__in={name for name, version in candidates}
+        ).values_list("name", "version", "pk")
+        for name, version, pk in existing:
+            if candidates.pop((name, version), None):
+                self.package_pks.append(pk)
+
+        if candidates:
+            artifacts = self.save_artifacts(list(candidates.values()))
+            self.package_pks.extend(self.save_packages(candidates, artifacts))
+        return skipped
+
+    def save_artifacts(self, tarballs):
+        """
+        Create the artifacts of tarballs, reusing the existing ones.
+
+        Args:
+            tarballs (list): The ``(path, inspected)`` of each tarball.
+
+        Returns:
+            list: The ``pulpcore.plugin.models.Artifact`` of each tarball, in the same order.
+        """
+        artifacts = [
+            Artifact(size=inspected["size"], pulp_domain=self.domain, **inspected["digests"])
+            for path, inspected in tarballs
+        ]
+        found = Artifact.objects.filter(
+            pulp_domain=self.domain, sha256__in={artifact.sha256 for artifact in artifacts}
+        )
+        found = {artifact.sha256: artifact for artifact in found}
+        Artifact.objects.filter(pk__in=[artifact.pk for artifact in found.values()]).touch()
+
+        new = {}
+        for artifact, (path, inspected) in zip(artifacts, tarballs):
+            if artifact.sha256 in found or artifact.sha256 in new:
+                continue
+            # copied to its final path, so that saving the artifact does not move the original
+            artifact.file = copy_local_file(self.storage, path, artifact.storage_path(None))
+            new[artifact.sha256] = artifact
+        for artifact in Artifact.objects.bulk_get_or_create(new.values()):
+            found[artifact.sha256] = artifact
+        return [found[artifact.sha256] for artifact in artifacts]
+
+    def save_packages(self, candidates, artifacts):
+        """
+        Create packages and their content artifacts.
+
+        ``Package`` being a multi-table model, it cannot be bulk created: packages are saved one
+        by one, in a single transaction, and their content artifacts bulk created.
+
+        Args:
+            candidates (dict): The ``(path, inspected)`` of each new ``(name, version)``.
+            artifacts (list): The artifact of each candidate, in the same order.
+
+        Returns:
+            list: The PKs of the packages.
+        """
+        fields = []
+        for ((name, version), (path, inspected)), artifact in zip(candidates.items(), artifacts):
+            dependencies = inspected["package_json"].get("dependencies")
+            if not isinstance(dependencies, dict):
+                dependencies = {}
+            attachment_name = f"{name.split('/')[-1]}-{version}.tgz"
+            fields.append(
+                (name, version, dependencies, inspected["manifest"], artifact, attachment_name)
+            )
+
+        try:
+            with transaction.atomic():
+                content_artifacts = []
+                packages = []
+                for name, version, dependencies, manifest, artifact, attachment_name in fields:
+                    package = Package(
+                        name=name, version=version, dependencies=dependencies, manifest=manifest
+                    )
+                    package.save()
+                    packages.append(package)
+                    content_artifacts.append(
+                        ContentArtifact(
+                            content=package,
+                            artifact=artifact,
+                            relative_path=f"{name}/-/{attachment_name}",
+                        )
+                    )
+                ContentArtifact.objects.bulk_create(content_artifacts)
+        except IntegrityError:
+            # some packages were published concurrently, create them one at a time
+            packages = [save_package(*package_fields) for package_fields in fields]
+        return [package.pk for package in packages]
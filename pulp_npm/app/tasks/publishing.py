@@ -1,7 +1,31 @@
 import logging
+import time
+from functools import partial
+from gettext import gettext as _
 
-from pulpcore.plugin.models import RepositoryVersion
-from pulp_npm.app.models import NpmRepository, Package 
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions import ParseError
+
+from pulpcore.plugin.constants import TASK_STATES
+from pulpcore.plugin.files import PulpTemporaryUploadedFile
+from pulpcore.plugin.models import (
+    Artifact,
+    ContentArtifact,
+    PulpTemporaryFile,
+    RepositoryVersion,
+    Task,
+)
+from pulpcore.plugin.tasking import dispatch
+from pulpcore.plugin.util import get_domain, get_prn
+from pulp_npm.app.cache import notify_dist_tags_changed
+from pulp_npm.app.models import DistTag, NpmRepository, Package, PendingPublish
+from pulp_npm.app.packument import repository_version_packages
+from pulp_npm.app.parsers import CHUNK_SIZE, PublishDocumentReader
+from pulp_npm.app.pull_through import expected_digests
+from pulp_npm.app.serializers import PackageSerializer
+from pulp_npm.app.storage import StorageUpload, streams_to_storage
+from pulp_npm.app.tarball import TarballReader
 
 log = logging.getLogger(__name__)
 
@@ -12,3 +36,525 @@ def publish(repository_pk, package_pk):
     with repository.new_version() as new_version:
         new_version.add_content(Package.objects.filter(pk=package_pk))
 
+
+def publish_upload(repository_pk, temp_file_pk):
+    """
+    Create the packages of a spooled npm publish document and add them to a repository.
+
+    Every version attached to the document is added in the same repository version, and its
+    dist-tags are stored, including those of a document without attachments.
+
+    The document is first read without decoding its attachments, to look for the ones that
+    already exist from the digests it declares, see ``match_attachments()``. Only the others
+    are decoded.
+
+    Args:
+        repository_pk (str): The repository PK.
+        temp_file_pk (str): The PK of the PulpTemporaryFile holding the publish document.
+
+    Raises:
+        ValueError: If the publish document is not valid.
+    """
+    temp_file = PulpTemporaryFile.objects.get(pk=temp_file_pk)
+    reader = None
+    try:
+        try:
+            with temp_file.file.open("rb") as document_file:
+                document = PublishDocumentReader(document_file, decode=False).read()
+                if not isinstance(document, dict) or not isinstance(document.get("name"), str):
+                    raise ValueError(_("The publish document has no package name."))
+                matches = match_attachments(document)
+                packages = {
+                    name: match.pk for name, match in matches.items() if isinstance(match, Package)
+                }
+                artifacts = {
+                    name: match.pk for name, match in matches.items() if name not in packages
+                }
+                if len(matches) < len(document.get("_attachments") or {}):
+                    document_file.seek(0)
+                    upload_class = StorageUpload if streams_to_storage() else None
+                    reader = PublishDocumentReader(
+                        document_file, skip=set(matches), upload_class=upload_class
+                    )
+                    document = reader.read()
+        except ParseError as exc:
+            raise ValueError(str(exc.detail))
+        finally:
+            temp_file.delete()
+
+        repository = NpmRepository.objects.get(pk=repository_pk)
+        packages = create_packages(document, packages, artifacts)
+    finally:
+        # remove the decoded tarballs that did not become artifacts, also when anything failed
+        for upload in reader.attachments.values() if reader else ():
+            upload.close()
+    link_packages(repository, document, packages)
+
+
+def link_packages(repository, document, packages):
+    """
+    Queue the packages of a publish document and store its dist-tags.
+
+    Returns:
+        pulpcore.plugin.models.Task: The task adding the packages to the repository, if any.
+    """
+    dist_tags = document.get("dist-tags") or {}
+    validate_dist_tags(document["name"], dist_tags)
+    check_dist_tags(repository, document["name"], dist_tags, packages)
+
+    task = None
+    with transaction.atomic():
+        if packages:
+            task = queue_publish(repository, packages)
+        store_dist_tags(repository, document["name"], dist_tags)
+    return task
+
+
+def queue_publish(repository, packages):
+    """
+    Queue packages to be added to a repository by the next ``publish_pending`` task.
+
+    A new task is only dispatched if none is going to pick up the packages, see
+    ``upcoming_publish()``. The packages are only visible to that task once the current
+    transaction commits, by which time it may have started already: that is checked again after
+    the commit, see ``ensure_published()``.
+
+    Returns:
+        pulpcore.plugin.models.Task: The task that will add the packages, or the
+            ``batch_publish`` task that will dispatch it.
+    """
+    PendingPublish.objects.bulk_create(
+        [PendingPublish(repository=repository, package=package) for package in packages],
+        ignore_conflicts=True,
+    )
+
+    task = upcoming_publish(repository)
+    if task is None:
+        # not visible to the workers before the packages are
+        return dispatch_publish(repository)
+    package_pks = [package.pk for package in packages]
+    transaction.on_commit(partial(ensure_published, repository.pk, package_pks))
+    return task
+
+
+def ensure_published(repository_pk, package_pks):
+    """
+    Dispatch a ``publish_pending`` task if no task is going to add queued packages anymore.
+
+    Args:
+        repository_pk (str): The repository PK.
+        package_pks (list): The PKs of the queued packages.
+    """
+    queued = PendingPublish.objects.filter(repository_id=repository_pk, package_id__in=package_pks)
+    if not queued.exists():
+        return
+    repository = NpmRepository.objects.get(pk=repository_pk)
+    if upcoming_publish(repository) is None:
+        dispatch_publish(repository)
+
+
+def upcoming_publish(repository):
+    """
+    The task that will add the packages queued for a repository from now on, if any.
+
+    That is a ``publish_pending`` task that has not started yet, or a ``batch_publish`` task
+    that has not dispatched its ``publish_pending`` task yet.
+
+    Returns:
+        pulpcore.plugin.models.Task: The task, or None.
+    """
+    waiting = Task.objects.filter(
+        name=f"{publish_pending.__module__}.{publish_pending.__name__}",
+        state=TASK_STATES.WAITING,
+        reserved_resources_record__contains=[get_prn(repository)],
+    )
+    batching = Task.objects.filter(
+        name=f"{batch_publish.__module__}.{batch_publish.__name__}",
+        state__in=[TASK_STATES.WAITING, TASK_STATES.RUNNING],
+        reserved_resources_record__contains=[f"shared:{batch_resource(repository)}"],
+        child_tasks__isnull=True,
+    )
+    return waiting.first() or batching.first()
+
+
+def batch_resource(repository):
+    """
+    The resource the ``batch_publish`` tasks of a repository are found by.
+    """
+    return f"npm-publish-batch:{repository.pk}"
+
+
+def dispatch_publish(repository):
+    """
+    Dispatch the task adding the packages queued for a repository.
+
+    That is a ``batch_publish`` task if ``NPM_PUBLISH_BATCH_WINDOW`` is set, so that the
+    repository is not locked while waiting for more packages.
+
+    Returns:
+        pulpcore.plugin.models.Task: The task.
+    """
+    if settings.NPM_PUBLISH_BATCH_WINDOW:
+        return dispatch(
+            batch_publish,
+            kwargs={"repository_pk": repository.pk},
+            shared_resources=[batch_resource(repository)],
+        )
+    return dispatch(
+        publish_pending,
+        kwargs={"repository_pk": repository.pk},
+        exclusive_resources=[repository],
+    )
+
+
+def batch_publish(repository_pk):
+    """
+    Wait for more packages to be queued for a repository, then dispatch ``publish_pending``.
+
+    Waits ``NPM_PUBLISH_BATCH_WINDOW`` seconds, to include uploads made in quick succession,
+    like the packages of a monorepo release. The repository is not locked meanwhile.
+
+    Args:
+        repository_pk (str): The repository PK.
+    """
+    time.sleep(settings.NPM_PUBLISH_BATCH_WINDOW)
+    repository = NpmRepository.objects.get(pk=repository_pk)
+    dispatch(
+        publish_pending,
+        kwargs={"repository_pk": repository.pk},
+        exclusive_resources=[repository],
+    )
+
+
+def publish_pending(repository_pk):
+    """
+    Add every package queued for a repository in a single new repository version.
+
+    Args:
+        repository_pk (str): The repository PK.
+    """
+    repository = NpmRepository.objects.get(pk=repository_pk)
+    pending = list(
+        PendingPublish.objects.filter(repository=repository).values_list("pk", "package_id")
+    )
+    if not pending:
+        return
+
+    with repository.new_version() as new_version:
+        new_version.add_content(Package.objects.filter(pk__in=[pk for _, pk in pending]))
+    PendingPublish.objects.filter(pk__in=[pk for pk, _ in pending]).delete()
+
+
+def create_packages(document, packages=None, artifacts=None):
+    """
+    Create the packages of every version attached to an npm publish document.
+
+    Args:
+        document (dict): The publish document, as read by ``PublishDocumentReader``.
+        packages (dict): The PKs of the existing packages of attachments left out of the
+            document, by attachment name.
+        artifacts (dict): The PKs of the existing artifacts of attachments left out of the
+            document, by attachment name.
+
+    Returns:
+        list: The ``pulp_npm.app.models.Package`` of each attachment.
+
+    Raises:
+        ValueError: If the document has no attachment, or an attachment has no data.
+    """
+    packages = packages or {}
+    artifacts = artifacts or {}
+    name = document["name"]
+    attachments = document.get("_attachments") or {}
+    if not isinstance(attachments, dict):
+        raise ValueError(_("The attachments of {} are not an object.").format(name))
+    if not attachments and not document.get("dist-tags"):
+        raise ValueError(_("The publish document of {} has no attachment.").format(name))
+
+    versions = document.get("versions") or {}
+    created = []
+    for attachment_name, attachment in attachments.items():
+        if attachment_name in packages:
+            created.append(Package.objects.get(pk=packages[attachment_name]))
+        elif attachment_name in artifacts:
+            artifact = Artifact.objects.get(pk=artifacts[attachment_name])
+            created.append(create_package_from_artifact(name, attachment_name, artifact, versions))
+        else:
+            upload = attachment.get("data") if isinstance(attachment, dict) else None
+            if not isinstance(upload, (PulpTemporaryUploadedFile, StorageUpload)):
+                raise ValueError(
+                    _("The attachment {} of {} has no data.").format(attachment_name, name)
+                )
+            created.append(create_package(name, attachment_name, upload, versions))
+    return created
+
+
+def attachment_version(name, attachment_name, versions):
+    """
+    Find the version of the publish document an attachment belongs to.
+
+    Args:
+        name (str): The package name.
+        attachment_name (str): The name of the attachment, like "name-1.0.0.tgz".
+        versions (dict): The "versions" of the publish document.
+
+    Returns:
+        str: The version.
+    """
+    for version, entry in versions.items():
+        tarball = ((entry or {}).get("dist") or {}).get("tarball") or ""
+        if tarball.split("/")[-1] == attachment_name:
+            return version
+    if len(versions) == 1:
+        return next(iter(versions))
+    raise ValueError(
+        _("The attachment {} of {} matches none of its versions.").format(attachment_name, name)
+    )
+
+
+def match_attachments(document):
+    """
+    Find what already exists of the attachments of a publish document, from its declared digests.
+
+    The "integrity" and "shasum" the document declares in the "dist" of each version are
+    matched against the packages of the same name and version, then against any artifact, so
+    that the attachments found do not need to be decoded and stored again.
+
+    Args:
+        document (dict): The publish document, attachment data may be left out.
+
+    Returns:
+        dict: The ``pulp_npm.app.models.Package`` or ``pulpcore.plugin.models.Artifact`` of
+            each attachment found, by attachment name.
+    """
+    name = document["name"]
+    versions = document.get("versions") or {}
+    domain = get_domain()
+    matches = {}
+    for attachment_name in document.get("_attachments") or {}:
+        try:
+            version = attachment_version(name, attachment_name, versions)
+            dist = (versions[version] or {}).get("dist") or {}
+            digests = expected_digests(dist) or {}
+        except (ValueError, AttributeError):
+            continue
+        if not digests and dist.get("shasum"):
+            digests = {"sha1": dist["shasum"]}
+        if not digests:
+            continue
+
+        declared = {f"contentartifact__artifact__{key}": value for key, value in digests.items()}
+        package = Package.objects.filter(
+            _pulp_domain=domain, name=name, version=version, **declared
+        ).first()
+        artifact = package or Artifact.objects.filter(pulp_domain=domain, **digests).first()
+        if artifact:
+            matches[attachment_name] = artifact
+    return matches
+
+
+def package_fields(name, attachment_name, package_json, versions):
+    """
+    Get the version and the dependencies of an attachment of a publish document.
+
+    The package.json of the tarball is authoritative over the publish document.
+
+    Returns:
+        tuple: The version and the dependencies.
+    """
+    package_json = package_json or {}
+    if package_json.get("name", name) != name:
+        raise ValueError(
+            _("The tarball of {} holds the package {}.").format(name, package_json["name"])
+        )
+    version = package_json.get("version") or attachment_version(name, attachment_name, versions)
+    dependencies = package_json.get("dependencies")
+    if dependencies is None:
+        dependencies = (versions.get(version) or {}).get("dependencies", {})
+    return version, dependencies
+
+
+def create_package(name, attachment_name, upload, versions):
+    """
+    Create the package of an attachment of an npm publish document, unless it already exists.
+
+    Args:
+        name (str): The package name.
+        attachment_name (str): The name of the attachment.
+        upload (pulpcore.plugin.files.PulpTemporaryUploadedFile): The decoded tarball, as
+            attached by ``PublishDocumentReader``, or a ``pulp_npm.app.storage.StorageUpload``.
+        versions (dict): The "versions" of the publish document.
+
+    Returns:
+        pulp_npm.app.models.Package: The package.
+    """
+    version, dependencies = package_fields(name, attachment_name, upload.package_json, versions)
+
+    # find existing package
+    package = Package.objects.filter(_pulp_domain=get_domain(), name=name, version=version).first()
+    if package:
+        upload.close()
+        return package
+
+    # create and save artifact, the reader already decoded and hashed the tarball
+    if isinstance(upload, StorageUpload):
+        artifact = upload.save_artifact()
+    else:
+        artifact = Artifact.init_and_validate(upload)
+        try:
+            with transaction.atomic():
+                artifact.save()
+        except IntegrityError:
+            artifact = Artifact.objects.get(artifact.q())
+            artifact.touch()
+
+    return save_package(name, version, dependencies, upload.manifest, artifact, attachment_name)
+
+
+def create_package_from_artifact(name, attachment_name, artifact, versions):
+    """
+    Create the package of an attachment of an npm publish document from an existing artifact.
+
+    The tarball is read from the artifact instead of being decoded from the document.
+
+    Args:
+        name (str): The package name.
+        attachment_name (str): The name of the attachment.
+        artifact (pulpcore.plugin.models.Artifact): The artifact matching the attachment, see
+            ``match_attachments()``.
+        versions (dict): The "versions" of the publish document.
+
+    Returns:
+        pulp_npm.app.models.Package: The package.
+    """
+    tarball = TarballReader()
+    with artifact.file.open("rb") as artifact_file:
+        while chunk := artifact_file.read(CHUNK_SIZE):
+            tarball.feed(chunk)
+    manifest = tarball.manifest()
+    package_json = tarball.package_json if manifest is not None else None
+    version, dependencies = package_fields(name, attachment_name, package_json, versions)
+
+    # find existing package
+    package = Package.objects.filter(_pulp_domain=get_domain(), name=name, version=version).first()
+    if package:
+        return package
+
+    artifact.touch()
+    return save_package(name, version, dependencies, manifest, artifact, attachment_name)
+
+
+def save_package(name, version, dependencies, manifest, artifact, attachment_name):
+    """
+    Create a package and its content artifact, unless the package was created concurrently.
+
+    Returns:
+        pulp_npm.app.models.Package: The package.
+    """
+    # validate data
+    serializer = PackageSerializer(
+        data={
+            "name": name,
+            "version": version,
+            "dependencies": dependencies,
+            "relative_path": f"{name}/-/{attachment_name}",
+            "artifact": f"{settings.V3_API_ROOT}artifacts/{artifact.pk}/",
+        }
+    )
+    serializer.is_valid(raise_exception=True)
+
+    try:
+        with transaction.atomic():
+            # create and save package
+            package = Package(
+                name=serializer.validated_data["name"],
+                version=serializer.validated_data["version"],
+                dependencies=serializer.validated_data["dependencies"],
+                manifest=manifest or {},
+            )
+            package.save()
+
+            # create and save content artifact
+            ContentArtifact.objects.create(
+                content=package,
+                artifact=artifact,
+                relative_path=f"{package.name}/-/{package.relative_path.split('/')[-1]}",
+            )
+    except IntegrityError:
+        # published concurrently by another upload task
+        package = Package.objects.get(_pulp_domain=get_domain(), name=name, version=version)
+    return package
+
+
+def validate_dist_tags(name, dist_tags):
+    """
+    Check that the dist-tags of a publish document are ``{tag: version}`` strings.
+
+    Raises:
+        ValueError: If they are not.
+    """
+    if not isinstance(dist_tags, dict):
+        raise ValueError(_("The dist-tags of {} are not an object.").format(name))
+    for tag, version in dist_tags.items():
+        if not 0 < len(tag) <= 255 or not isinstance(version, str) or not 0 < len(version) <= 128:
+            raise ValueError(_("The dist-tag {} of {} is not valid.").format(tag, name))
+
+
+def check_dist_tags(repository, name, dist_tags, packages):
+    """
+    Check that dist-tags point to versions published or being published to a repository.
+
+    Args:
+        repository (pulp_npm.app.models.NpmRepository): The repository.
+        name (str): The package name.
+        dist_tags (dict): The ``{tag: version}`` to check.
+        packages (list): The packages being published along with the dist-tags.
+
+    Raises:
+        ValueError: If a dist-tag points to an unknown version.
+    """
+    known = {package.version for package in packages}
+    unknown = set(dist_tags.values()) - known
+    if not unknown:
+        return
+
+    domain = get_domain()
+    versions = sorted(unknown)
+    candidates = Package.objects.filter(_pulp_domain=domain, name=name, version__in=versions)
+    latest = repository.latest_version()
+    if latest:
+        in_repository = repository_version_packages(latest, domain.pk)
+        in_repository = in_repository.filter(name=name, version__in=versions)
+    else:
+        in_repository = candidates.none()
+    pending = candidates.filter(pendingpublish__repository=repository)
+    unknown -= set(in_repository.values_list("version", flat=True))
+    unknown -= set(pending.values_list("version", flat=True))
+    if unknown:
+        raise ValueError(
+            _("The dist-tags of {} point to unknown versions: {}.").format(
+                name, ", ".join(sorted(unknown))
+            )
+        )
+
+
+def store_dist_tags(repository, name, dist_tags):
+    """
+    Create or move the dist-tags of a package in a repository.
+
+    Args:
+        repository (pulp_npm.app.models.NpmRepository): The repository.
+        name (str): The package name.
+        dist_tags (dict): The ``{tag: version}`` to store.
+    """
+    DistTag.objects.bulk_create(
+        [
+            DistTag(repository=repository, name=name, tag=tag, version=version)
+            for tag, version in dist_tags.items()
+        ],
+        update_conflicts=True,
+        unique_fields=("repository", "name", "tag"),
+        update_fields=("version",),
+    )
+    if dist_tags:
+        notify_dist_tags_changed(repository.pk, name)
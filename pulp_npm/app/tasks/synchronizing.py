@@ -12,6 +12,7 @@ from pulpcore.plugin.stages import (
 )
 
 from pulp_npm.app.models import Package, NpmRemote
+from pulp_npm.app.utils import manifest_fields
 
 
 log = logging.getLogger(__name__)
@@ -123,7 +124,12 @@ class NpmFirstStage(Stage):
 
         for pkg in pkgs:
             dependencies = pkg.get("dependencies", {})
-            package = Package(name=pkg["name"], version=pkg["version"], dependencies=dependencies)
+            package = Package(
+                name=pkg["name"],
+                version=pkg["version"],
+                dependencies=dependencies,
+                manifest=manifest_fields(pkg),
+            )
             artifact = Artifact()
             url = pkg["dist"]["tarball"]
 
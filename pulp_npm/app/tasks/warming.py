@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from gettext import gettext as _
+
+from pulpcore.plugin.models import ProgressReport
+
+from pulp_npm.app import json_codec
+from pulp_npm.app.models import NpmDistribution, Package
+from pulp_npm.app.pull_through import download_packument, fetch_tarball
+
+log = logging.getLogger(__name__)
+
+
+def warm_up(distribution_pk, packages, concurrency=10):
+    """
+    Fetch packages through the remote of a distribution ahead of the clients.
+
+    The tarballs are saved as packages, like pull-through requests do, and added to the
+    repository of the distribution, if any, in a single new version.
+
+    Args:
+        distribution_pk (str): The distribution PK.
+        packages (list): (name, version) pairs, the version may also be a dist-tag.
+        concurrency (int): Maximum number of concurrent downloads.
+
+    Raises:
+        ValueError: If the distribution has no remote.
+        RuntimeError: If none of the packages could be fetched.
+    """
+    distribution = NpmDistribution.objects.select_related("repository", "remote").get(
+        pk=distribution_pk
+    )
+    if not distribution.remote:
+        raise ValueError(_("Distribution '{}' has no remote.").format(distribution.name))
+    remote = distribution.remote.cast()
+
+    started = time.monotonic()
+    fetcher = WarmUp(remote, concurrency)
+    asyncio.run(fetcher.run(packages))
+    elapsed = time.monotonic() - started
+
+    log.info(
+        _("Fetched %d packages in %.1fs (%.1f packages/s), %d failed."),
+        len(fetcher.fetched),
+        elapsed,
+        len(fetcher.fetched) / elapsed if elapsed else 0,
+        len(fetcher.failures),
+    )
+    if fetcher.failures and not fetcher.fetched:
+        raise RuntimeError(_("None of the {} packages could be fetched.").format(len(packages)))
+
+    if distribution.repository and fetcher.fetched:
+        add_to_repository(distribution.repository.cast(), remote.pulp_domain_id, fetcher.fetched)
+
+
+def add_to_repository(repository, domain_pk, fetched):
+    """
+    Add the fetched packages to a repository in a new version.
+    """
+    candidates = Package.objects.filter(
+        name__in={name for name, version in fetched}, _pulp_domain_id=domain_pk
+    ).values_list("pk", "name", "version")
+    package_pks = [pk for pk, name, version in candidates if (name, version) in fetched]
+
+    with repository.new_version() as new_version:
+        new_version.add_content(Package.objects.filter(pk__in=package_pks))
+
+
+class WarmUp:
+    """
+    Fetches packuments and tarballs from a remote concurrently, reporting progress.
+    """
+
+    def __init__(self, remote, concurrency):
+        self.remote = remote
+        self.budget = asyncio.Semaphore(concurrency)
+        self.fetched = set()
+        self.failures = []
+
+    async def run(self, packages):
+        """
+        Fetch (name, version) pairs, recording successes in ``fetched`` and the others in
+        ``failures``.
+        """
+        versions = defaultdict(set)
+        for name, version in packages:
+            versions[name].add(version)
+
+        self.packuments_progress = ProgressReport(
+            message=_("Fetching packuments"), code="warmup.packuments", total=len(versions)
+        )
+        self.tarballs_progress = ProgressReport(
+            message=_("Fetching tarballs"), code="warmup.tarballs", total=len(packages)
+        )
+        self.failures_progress = ProgressReport(
+            message=_("Failed packages"), code="warmup.failures"
+        )
+        async with self.packuments_progress, self.tarballs_progress, self.failures_progress:
+            await asyncio.gather(
+                *(self.warm_package(name, wanted) for name, wanted in versions.items())
+            )
+
+    async def fail(self, name, version, reason):
+        """
+        Record a package that could not be fetched.
+        """
+        log.warning(_("Could not fetch %s@%s: %s"), name, version, reason)
+        self.failures.append((name, version, str(reason)))
+        await self.failures_progress.aincrement()
+
+    async def warm_package(self, name, versions):
+        """
+        Fetch the packument of a package, then the tarballs of the requested versions.
+        """
+        try:
+            async with self.budget:
+                body = await download_packument(self.remote, name)
+        except Exception as exc:
+            body, reason = None, exc
+        else:
+            reason = _("not found")
+        await self.packuments_progress.aincrement()
+
+        if body is None:
+            for version in versions:
+                await self.fail(name, version, reason)
+            return
+
+        packument = await asyncio.to_thread(json_codec.loads, body)
+        await asyncio.gather(*(self.warm_version(packument, version) for version in versions))
+
+    async def warm_version(self, packument, version):
+        """
+        Fetch the tarball of a version, or of the version a dist-tag points to.
+        """
+        name = packument.get("name")
+        entries = packument.get("versions") or {}
+        entry = entries.get(version) or entries.get((packument.get("dist-tags") or {}).get(version))
+        if not entry:
+            await self.fail(name, version, _("no such version"))
+            return
+
+        try:
+            async with self.budget:
+                await fetch_tarball(self.remote, entry)
+        except Exception as exc:
+            await self.fail(name, version, exc)
+        else:
+            self.fetched.add((entry["name"], entry["version"]))
+            await self.tarballs_progress.aincrement()
@@ -1,5 +1,11 @@
 from django.urls import path, re_path
-from .viewsets import NpmUserLoginView, PackageViewSet
+from .viewsets import (
+    NpmDistTagView,
+    NpmDistTagsView,
+    NpmUserLoginView,
+    NpmUserLogoutView,
+    PackageViewSet,
+)
 
 urlpatterns = [
     # NPM user login endpoint
@@ -9,6 +15,27 @@ urlpatterns = [
         name='npm-user-login',
     ),
 
+    # NPM user logout endpoint, revokes the token
+    path(
+        'pulp/api/v3/npm/cli/<str:reponame>/-/user/token/<str:token>',
+        NpmUserLogoutView.as_view(),
+        name='npm-user-logout',
+    ),
+
+    # NPM dist-tags of a scoped/unscoped package
+    re_path(
+        r'^pulp/api/v3/npm/cli/(?P<reponame>[^/]+)/-/package/'
+        r'(?P<packagename>(@[^/]+/)?[^/]+)/dist-tags$',
+        NpmDistTagsView.as_view(),
+        name='npm-dist-tags',
+    ),
+    re_path(
+        r'^pulp/api/v3/npm/cli/(?P<reponame>[^/]+)/-/package/'
+        r'(?P<packagename>(@[^/]+/)?[^/]+)/dist-tags/(?P<tag>[^/]+)$',
+        NpmDistTagView.as_view(),
+        name='npm-dist-tag',
+    ),
+
     # NPM scoped/unscoped package upload
     re_path(
         r'^pulp/api/v3/npm/cli/(?P<reponame>[^/]+)/(?P<packagename>.+)/$',
@@ -1,5 +1,20 @@
 import re
 
+SEMVER_PATTERN = re.compile(
+    r"^\s*[=v]?(?P<major>\d+)(?:\.(?P<minor>\d+))?(?:\.(?P<patch>\d+))?"
+    r"(?:-?(?P<prerelease>[0-9A-Za-z.-]+?))?(?:\+[0-9A-Za-z.-]*)?\s*$"
+)
+
+# Sort key of a version without pre-release identifiers, it sorts after every pre-release key
+RELEASE_KEY = "~"
+
+# Length of the pre-release keys, the size of the Package.version_prerelease column. Longer keys
+# are truncated: versions differing only past it sort as equal.
+PRERELEASE_KEY_LENGTH = 255
+
+# Digits of the length prefixing numeric pre-release identifiers, versions are 128 characters
+PRERELEASE_NUMBER_LENGTH_WIDTH = 3
+
 
 def urlpath_sanitize(*args):
     """
@@ -37,3 +52,149 @@ def extract_package_info(relative_path):
         return name, version
     else:
         return None, None
+
+
+def semver_sort_key(version):
+    """
+    Split a version string into components that sort in semver precedence order.
+
+    The pre-release part is encoded so that a plain byte-wise comparison (e.g. the "C" collation
+    in PostgreSQL) gives the same order as the semver specification: numeric identifiers are
+    prefixed with their number of digits and sort before alphanumeric ones, and a release sorts
+    after all of its pre-releases. Versions that cannot be parsed sort before any valid version.
+    The key is truncated to ``PRERELEASE_KEY_LENGTH`` characters.
+
+    Args:
+        version (str): The version string. "1.2.3-beta.1"
+
+    Returns:
+        tuple: (major, minor, patch, prerelease) where prerelease is a string key.
+    """
+    match = SEMVER_PATTERN.match(version or "")
+    if not match:
+        return 0, 0, 0, ""
+
+    prerelease = match.group("prerelease")
+    if prerelease:
+        identifiers = []
+        for identifier in prerelease.split("."):
+            if identifier.isdigit():
+                number = identifier.lstrip("0") or "0"
+                length = str(len(number)).zfill(PRERELEASE_NUMBER_LENGTH_WIDTH)
+                identifiers.append(f"0{length}{number}")
+            else:
+                identifiers.append("1" + identifier)
+        prerelease_key = " ".join(identifiers)[:PRERELEASE_KEY_LENGTH]
+    else:
+        prerelease_key = RELEASE_KEY
+
+    return (
+        int(match.group("major")),
+        int(match.group("minor") or 0),
+        int(match.group("patch") or 0),
+        prerelease_key,
+    )
+
+
+def parse_package_spec(spec):
+    """
+    Split a package spec into the package name and the requested version or dist-tag.
+
+    Args:
+        spec (str): The spec. "@scope/name@1.2.3", "name@next" or "name"
+
+    Returns:
+        tuple: (name, version) where version defaults to "latest".
+    """
+    spec = spec.strip()
+    name, _, version = spec.rpartition("@")
+    if not name:
+        return spec, "latest"
+    return name, version or "latest"
+
+
+def lockfile_packages(lockfile):
+    """
+    List the registry packages a package-lock.json or npm-shrinkwrap.json resolves to.
+
+    Supports lockfile versions 1 to 3. Linked, bundled and non-registry packages are skipped.
+
+    Args:
+        lockfile (dict): The parsed lockfile.
+
+    Returns:
+        list: Sorted (name, version) tuples.
+    """
+    packages = set()
+
+    def add(name, version):
+        if version.startswith("npm:"):
+            name, version = parse_package_spec(version[len("npm:") :])
+        if SEMVER_PATTERN.match(version):
+            packages.add((name, version))
+
+    for path, data in (lockfile.get("packages") or {}).items():
+        if not path or data.get("link") or data.get("bundled") or "version" not in data:
+            continue
+        add(data.get("name") or path.rsplit("node_modules/", 1)[-1], data["version"])
+
+    if not lockfile.get("packages"):
+        pending = list((lockfile.get("dependencies") or {}).items())
+        while pending:
+            name, data = pending.pop()
+            if "version" in data and not data.get("bundled"):
+                add(name, data["version"])
+            pending.extend((data.get("dependencies") or {}).items())
+
+    return sorted(packages)
+
+
+# Fields of a package.json npm clients need to install a version, besides name, version and
+# dependencies
+MANIFEST_FIELDS = (
+    "description",
+    "license",
+    "deprecated",
+    "bin",
+    "directories",
+    "engines",
+    "os",
+    "cpu",
+    "libc",
+    "peerDependencies",
+    "peerDependenciesMeta",
+    "optionalDependencies",
+    "bundleDependencies",
+    "acceptDependencies",
+    "funding",
+    "_hasShrinkwrap",
+    "hasInstallScript",
+)
+INSTALL_SCRIPTS = ("preinstall", "install", "postinstall")
+
+
+def manifest_fields(package_json):
+    """
+    Pick the manifest of a version from a package.json or a packument version entry.
+
+    Args:
+        package_json (dict): The package.json or version entry.
+
+    Returns:
+        dict: The ``MANIFEST_FIELDS`` present, with a "dist" object holding "fileCount" and
+            "unpackedSize" when known.
+    """
+    manifest = {field: package_json[field] for field in MANIFEST_FIELDS if field in package_json}
+
+    if isinstance(manifest.get("bin"), str):
+        manifest["bin"] = {str(package_json.get("name", "")).split("/")[-1]: manifest["bin"]}
+    scripts = package_json.get("scripts")
+    if isinstance(scripts, dict) and any(script in scripts for script in INSTALL_SCRIPTS):
+        manifest["hasInstallScript"] = True
+
+    dist = package_json.get("dist")
+    if isinstance(dist, dict):
+        stats = {key: dist[key] for key in ("fileCount", "unpackedSize") if key in dist}
+        if stats:
+            manifest["dist"] = stats
+    return manifest
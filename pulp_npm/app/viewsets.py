@@ -1,26 +1,29 @@
-import base64
-import uuid
+from gettext import gettext as _
 
-from django.conf import settings
 from django.contrib.auth import authenticate
-from django.core.files.base import ContentFile
 from django.db import transaction
+from django.http import StreamingHttpResponse
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema
 
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from pulpcore.plugin import viewsets as core
 from pulpcore.plugin.actions import ModifyRepositoryActionMixin
-from pulpcore.plugin.models import Artifact, ContentArtifact, PulpTemporaryFile
+from pulpcore.plugin.models import PulpTemporaryFile
 from pulpcore.plugin.serializers import (
     AsyncOperationResponseSerializer,
 )
 from pulpcore.plugin.tasking import dispatch
 
-from . import models, serializers, tasks
+from . import json_codec, models, parsers, serializers, tasks
+from .cache import notify_dist_tags_changed
+from .packument import package_dist_tags, repository_version_packages
 
 
 def get_auth_token(request):
@@ -33,11 +36,24 @@ def get_auth_token(request):
         return None, Response({"error": "Missing or invalid Authorization header"}, status=status.HTTP_401_UNAUTHORIZED)
 
     token_str = auth_header.split(' ')[1]
-    try:
-        token = models.AuthToken.objects.get(token=token_str)
-        return token, None
-    except models.AuthToken.DoesNotExist:
+    token = models.AuthToken.verify(token_str)
+    if token is None:
         return None, Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
+    return token, None
+
+
+def ndjson_packuments(distribution, names):
+    """
+    Serialize the packuments of several packages as newline delimited JSON.
+
+    Packages the distribution does not serve get a line with an "error" instead.
+    """
+    missing = set(names)
+    for name, body in distribution.render_packuments(names):
+        missing.discard(name)
+        yield body + b"\n"
+    for name in sorted(missing):
+        yield json_codec.dumps({"name": name, "error": "Not found"}) + b"\n"
 
 
 class PackageFilter(core.ContentFilter):
@@ -67,6 +83,7 @@ class PackageViewSet(core.SingleArtifactContentUploadViewSet):
     filterset_class = PackageFilter
     authentication_classes = []
     permission_classes = []
+    parser_classes = [parsers.NpmPublishParser, FormParser, MultiPartParser]
 
     @transaction.atomic
     def create(self, request, reponame=None, packagename=None, *args, **kwargs):
@@ -79,57 +96,20 @@ class PackageViewSet(core.SingleArtifactContentUploadViewSet):
         if error:
             return error
 
-        # extract request data
-        name = request.data['name']
-        version = request.data['dist-tags']['latest']
-        dependencies = request.data.get("versions", {}).get(version, {}).get("dependencies", {})
         repository = models.NpmRepository.objects.get(name=reponame)
-        attachment_name, attachment = next(iter(request.data.get('_attachments', {}).items()))
-        binary_data = base64.b64decode(attachment['data'])
-        file = ContentFile(binary_data, name=f"{uuid.uuid4().hex[:8]}-{name}")
-
-        # find existing package
-        package = models.Package.objects.filter(name=name, version=version).first()
-
-        if not package:
-            # create and save artifact
-            temp_file = PulpTemporaryFile(file=file)
-            artifact = Artifact.from_pulp_temporary_file(temp_file)
-            artifact.save()
-
-            # prepare data for validation
-            data = {
-                "name": name,
-                "version": version,
-                "dependencies": dependencies,
-                "relative_path": f"{name}/-/{attachment_name}",
-                "artifact": f"{settings.V3_API_ROOT}artifacts/{str(artifact.pk)}/"
-            }
-
-            # validate data
-            serializer = serializers.PackageSerializer(data=data)
-            serializer.is_valid(raise_exception=True)
-
-            # create and save package
-            package = models.Package(
-                name=serializer.validated_data['name'],
-                version=serializer.validated_data['version'],
-                dependencies=serializer.validated_data['dependencies']
-            )
-            package.save()
-
-            # create and save content artifact
-            ContentArtifact.objects.create(
-                content=package,
-                artifact=artifact,
-                relative_path=f"{package.name}/-/{package.relative_path.split('/')[-1]}",
+        document = request.data.get("document")
+        if document is None:
+            return Response(
+                {"error": "Expected an npm publish document"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        # add package to repository
+        # the publish task parses the document and creates the packages
+        temp_file = PulpTemporaryFile.init_and_validate(document)
+        temp_file.save()
         result = dispatch(
-            tasks.publish,
-            kwargs={"repository_pk": repository.pk, "package_pk": package.pk},
-            exclusive_resources=[repository, package],
+            tasks.publish_upload,
+            kwargs={"repository_pk": repository.pk, "temp_file_pk": temp_file.pk},
+            shared_resources=[repository],
         )
 
         return core.OperationPostponedResponse(result, request)
@@ -192,6 +172,36 @@ class NpmRepositoryViewSet(core.RepositoryViewSet, ModifyRepositoryActionMixin):
         )
         return core.OperationPostponedResponse(result, request)
 
+    @extend_schema(
+        description="Trigger an asynchronous task to import the npm tarballs of a directory of "
+        "the Pulp server into a new repository version.",
+        summary="Import a directory",
+        responses={202: AsyncOperationResponseSerializer},
+    )
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="import",
+        serializer_class=serializers.NpmRepositoryImportSerializer,
+    )
+    def import_directory(self, request, pk):
+        """
+        Dispatches a directory import task.
+        """
+        repository = self.get_object()
+        serializer = serializers.NpmRepositoryImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        result = dispatch(
+            tasks.import_directory,
+            kwargs={
+                "repository_pk": repository.pk,
+                "path": serializer.validated_data["path"],
+            },
+            exclusive_resources=[repository],
+        )
+        return core.OperationPostponedResponse(result, request)
+
 
 class NpmRepositoryVersionViewSet(core.RepositoryVersionViewSet):
     """
@@ -210,6 +220,60 @@ class NpmDistributionViewSet(core.DistributionViewSet):
     queryset = models.NpmDistribution.objects.all()
     serializer_class = serializers.NpmDistributionSerializer
 
+    @extend_schema(
+        description="Trigger an asynchronous task to fetch packages through the remote of the "
+        "distribution ahead of the clients.",
+        summary="Warm up the pull-through cache",
+        responses={202: AsyncOperationResponseSerializer},
+    )
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="warm-up",
+        serializer_class=serializers.NpmDistributionWarmUpSerializer,
+    )
+    def warm_up(self, request, pk):
+        """
+        Dispatches a warm-up task.
+        """
+        distribution = self.get_object()
+        if not distribution.remote:
+            raise ValidationError(_("The distribution has no remote to fetch packages from."))
+        serializer = serializers.NpmDistributionWarmUpSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        result = dispatch(
+            tasks.warm_up,
+            kwargs={
+                "distribution_pk": distribution.pk,
+                "packages": serializer.validated_data["packages"],
+                "concurrency": serializer.validated_data["concurrency"],
+            },
+            exclusive_resources=[distribution.repository] if distribution.repository else [],
+            shared_resources=[distribution.remote],
+        )
+        return core.OperationPostponedResponse(result, request)
+
+    @extend_schema(
+        description="Return the packuments of several packages served by the distribution as "
+        "newline delimited JSON, one packument per line.",
+        summary="Get packuments in bulk",
+        request=serializers.NpmPackumentsSerializer,
+        responses={(200, "application/x-ndjson"): OpenApiTypes.STR},
+    )
+    @action(detail=True, methods=["post"], serializer_class=serializers.NpmPackumentsSerializer)
+    def packuments(self, request, pk):
+        """
+        Streams the packuments of the requested packages.
+        """
+        distribution = self.get_object()
+        serializer = serializers.NpmPackumentsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return StreamingHttpResponse(
+            ndjson_packuments(distribution, serializer.validated_data["names"]),
+            content_type="application/x-ndjson",
+        )
+
 
 class NpmUserLoginView(APIView):
     """
@@ -234,13 +298,144 @@ class NpmUserLoginView(APIView):
                 try:
                     repository = models.NpmRepository.objects.get(name=reponame)
 
-                    # Generate login token
-                    token, created = models.AuthToken.objects.get_or_create(user=user)
-                    if not created:
-                        token.save()
+                    # Generate login token, only its HMAC is stored
+                    _token, token_str = models.AuthToken.issue(user)
 
-                    return Response({"token": token.token}, status=status.HTTP_200_OK)
+                    return Response({"token": token_str}, status=status.HTTP_200_OK)
                 except models.NpmRepository.DoesNotExist:
                     return Response({"error": "Repository not found"}, status=status.HTTP_404_NOT_FOUND)
             return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class NpmUserLogoutView(APIView):
+    """
+    ViewSet for NPM logout.
+    """
+
+    authentication_classes = []
+    permission_classes = []
+
+    def delete(self, request, reponame, token, *args, **kwargs):
+        """
+        Handle npm user logout by revoking the token.
+        """
+
+        auth_token, error = get_auth_token(request)
+        if error:
+            return error
+        if models.AuthToken.verify(token) != auth_token:
+            return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        auth_token.delete()
+        return Response({"ok": True}, status=status.HTTP_200_OK)
+
+
+class NpmDistTagsView(APIView):
+    """
+    ViewSet for "npm dist-tag ls".
+    """
+
+    authentication_classes = []
+    permission_classes = []
+
+    def get_dist_tags(self, repository, packagename):
+        """
+        Get the dist-tags of a package as served from the latest version of a repository.
+        """
+        repository_version = repository.latest_version()
+        if not repository_version:
+            return None
+        return package_dist_tags(repository_version, repository.pulp_domain_id, packagename)
+
+    def get(self, request, reponame, packagename, *args, **kwargs):
+        """
+        List the dist-tags of a package.
+        """
+
+        try:
+            repository = models.NpmRepository.objects.get(name=reponame)
+        except models.NpmRepository.DoesNotExist:
+            return Response({"error": "Repository not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        tags = self.get_dist_tags(repository, packagename)
+        if tags is None:
+            return Response({"error": "Package not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(tags, status=status.HTTP_200_OK)
+
+
+class NpmDistTagView(APIView):
+    """
+    ViewSet for "npm dist-tag add" and "npm dist-tag rm".
+
+    Dist-tags are stored apart from the repository content, changing one does not create a
+    repository version.
+    """
+
+    authentication_classes = []
+    permission_classes = []
+
+    @transaction.atomic
+    def put(self, request, reponame, packagename, tag, *args, **kwargs):
+        """
+        Point a dist-tag of a package to a version, the request body is the version as JSON.
+        """
+
+        token, error = get_auth_token(request)
+        if error:
+            return error
+
+        try:
+            repository = models.NpmRepository.objects.get(name=reponame)
+        except models.NpmRepository.DoesNotExist:
+            return Response({"error": "Repository not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        version = request.data
+        if not isinstance(version, str) or not version:
+            return Response(
+                {"error": "Expected the version as a JSON string"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        repository_version = repository.latest_version()
+        if repository_version:
+            packages = repository_version_packages(repository_version, repository.pulp_domain_id)
+            packages = packages.filter(name=packagename, version=version)
+        if not repository_version or not packages.exists():
+            return Response(
+                {"error": f"Version {version} of {packagename} not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        models.DistTag.objects.update_or_create(
+            repository=repository, name=packagename, tag=tag, defaults={"version": version}
+        )
+        notify_dist_tags_changed(repository.pk, packagename)
+        return Response({"ok": True}, status=status.HTTP_200_OK)
+
+    @transaction.atomic
+    def delete(self, request, reponame, packagename, tag, *args, **kwargs):
+        """
+        Remove a dist-tag of a package.
+        """
+
+        token, error = get_auth_token(request)
+        if error:
+            return error
+
+        if tag == "latest":
+            return Response(
+                {"error": "The latest dist-tag cannot be removed"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            repository = models.NpmRepository.objects.get(name=reponame)
+        except models.NpmRepository.DoesNotExist:
+            return Response({"error": "Repository not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        dist_tags = models.DistTag.objects.filter(repository=repository, name=packagename, tag=tag)
+        if not dist_tags.delete()[0]:
+            return Response({"error": "Dist-tag not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        notify_dist_tags_changed(repository.pk, packagename)
+        return Response({"ok": True}, status=status.HTTP_200_OK)
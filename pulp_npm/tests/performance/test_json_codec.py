@@ -0,0 +1,96 @@
+import json
+import logging
+import timeit
+import unittest
+
+from pulp_npm.app import json_codec
+from pulp_npm.app.packument import build_packument, integrity
+from pulp_npm.app.utils import RELEASE_KEY
+
+log = logging.getLogger(__name__)
+
+PREFIX_URL = "https://pulp.example.com/pulp/content/npm/"
+SHA512 = "cf83e1357eefb8bdf1542850d66d8007d620e4050b5715dc83f4a921d36ce9ce" * 2
+MANIFEST = {"description": "A synthetic package", "license": "MIT", "dist": {"fileCount": 3}}
+
+
+def synthetic_rows(count, manifest=None):
+    """Rows of a package with ``count`` versions, as returned by packument_rows()."""
+    name = "synthetic-package"
+    dependencies = {"left-pad": "^1.3.0", "lodash": "~4.17.21", "react": ">=18.0.0"}
+    return [
+        (
+            name,
+            f"1.{i}.0",
+            RELEASE_KEY,
+            dependencies,
+            f"{name}/-/{name}-1.{i}.0.tgz",
+            None,
+            SHA512,
+            manifest,
+        )
+        for i in range(count)
+    ]
+
+
+def stdlib_packument(rows):
+    """The same packument built from plain dicts, as it was before json_codec existed."""
+    versions = {}
+    for name, version, _, dependencies, relative_path, _, sha512, manifest in rows:
+        manifest = manifest or {}
+        dist = {"tarball": f"{PREFIX_URL}{relative_path}", "integrity": integrity(sha512)}
+        versions[version] = {
+            **manifest,
+            "name": name,
+            "version": version,
+            "_id": f"{name}@{version}",
+            "dist": {**manifest.get("dist", {}), **dist},
+            "dependencies": dependencies,
+        }
+    return {
+        "name": rows[0][0],
+        "versions": versions,
+        "dependencies": {},
+        "dist-tags": {"latest": rows[-1][1]},
+    }
+
+
+class TestPackumentSerialization(unittest.TestCase):
+    """Compare rendering and parsing a packument with json_codec and with the stdlib."""
+
+    counts = (1000, 10000)
+
+    def codec_roundtrip(self, rows):
+        return json_codec.loads(json_codec.dumps(build_packument(rows[0][0], rows, PREFIX_URL)))
+
+    def stdlib_roundtrip(self, rows):
+        return json.loads(json.dumps(stdlib_packument(rows)))
+
+    def test_same_packument(self):
+        """Test that both build the same packument, with and without manifests."""
+        for manifest in (None, MANIFEST):
+            with self.subTest(manifest=manifest):
+                rows = synthetic_rows(10, manifest)
+                self.assertEqual(self.codec_roundtrip(rows), self.stdlib_roundtrip(rows))
+
+    def test_faster(self):
+        """Test that json_codec is faster than the stdlib when a faster backend is installed."""
+        for count in self.counts:
+            with self.subTest(count=count):
+                rows = synthetic_rows(count)
+                codec_time = min(
+                    timeit.repeat(lambda: self.codec_roundtrip(rows), number=3, repeat=5)
+                )
+                stdlib_time = min(
+                    timeit.repeat(lambda: self.stdlib_roundtrip(rows), number=3, repeat=5)
+                )
+                log.info(
+                    "%s versions: %s %.4fs, json %.4fs (%.1fx)",
+                    count,
+                    json_codec.BACKEND,
+                    codec_time,
+                    stdlib_time,
+                    stdlib_time / codec_time,
+                )
+                if json_codec.BACKEND != "json":
+                    self.assertLess(codec_time, stdlib_time)
@@ -0,0 +1,86 @@
+import logging
+import os
+import timeit
+
+from django.test import TestCase
+
+from pulpcore.plugin.util import get_domain
+from pulp_npm.app.models import NpmRepository, Package
+from pulp_npm.app.packument import packument_rows
+
+log = logging.getLogger(__name__)
+
+# Numbers of content units of the benchmarked repository versions. Set NPM_BENCHMARK_CONTENT_UNITS
+# to a comma separated list, like "1000000", to benchmark the sizes of a large deployment.
+CONTENT_UNITS = [
+    int(count) for count in os.environ.get("NPM_BENCHMARK_CONTENT_UNITS", "1000,10000").split(",")
+]
+
+# Number of versions of the package whose packument is queried
+VERSIONS = 100
+
+NAME = "benchmarked-package"
+
+
+def instance_query(repository_version, name):
+    """The packument query as it was before packument.py: full instances and an IN subquery."""
+    packages = Package.objects.filter(name=name, pk__in=repository_version.content).order_by(
+        *Package.VERSION_ORDERING
+    )
+    return [
+        (package.name, package.version, package.dependencies, package.relative_path)
+        for package in packages
+    ]
+
+
+def row_query(repository_version, domain_pk, name):
+    """The packument query of packument.py: joined, column-only rows."""
+    return list(packument_rows(repository_version, domain_pk, [name]))
+
+
+class TestPackumentQuery(TestCase):
+    """Compare querying a packument with packument_rows() and with full Package instances."""
+
+    def create_packages(self, start, stop):
+        """Create the packages of the other names, ten versions each."""
+        for i in range(start, stop):
+            Package(name=f"other-package-{i // 10}", version=f"1.0.{i % 10}").save()
+
+    def test_packument_query(self):
+        """Test that both return the same versions and that the rows are faster to get."""
+        domain_pk = get_domain().pk
+        repository = NpmRepository.objects.create(name="benchmark")
+        for i in range(VERSIONS):
+            Package(name=NAME, version=f"1.{i}.0", dependencies={"left-pad": "^1.3.0"}).save()
+
+        created = VERSIONS
+        for count in sorted(CONTENT_UNITS):
+            with self.subTest(count=count):
+                self.create_packages(created, count)
+                created = max(created, count)
+                with repository.new_version() as new_version:
+                    new_version.add_content(Package.objects.all())
+                repository_version = repository.latest_version()
+
+                instances = instance_query(repository_version, NAME)
+                rows = row_query(repository_version, domain_pk, NAME)
+                self.assertEqual([row[1] for row in rows], [row[1] for row in instances])
+
+                instance_time = min(
+                    timeit.repeat(
+                        lambda: instance_query(repository_version, NAME), number=3, repeat=5
+                    )
+                )
+                row_time = min(
+                    timeit.repeat(
+                        lambda: row_query(repository_version, domain_pk, NAME), number=3, repeat=5
+                    )
+                )
+                log.info(
+                    "%s content units: rows %.4fs, instances %.4fs (%.1fx)",
+                    count,
+                    row_time,
+                    instance_time,
+                    instance_time / row_time,
+                )
+                self.assertLess(row_time, instance_time)
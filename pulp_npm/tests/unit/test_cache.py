@@ -0,0 +1,161 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from pulp_npm.app.cache import (
+    DistTagCache,
+    ResolutionCache,
+    TokenCache,
+    handle_notification,
+    notify_repository_changed,
+)
+
+
+class TestResolutionCache(SimpleTestCase):
+    """Test ResolutionCache."""
+
+    def setUp(self):
+        """Set up an enabled cache and a distribution."""
+        self.cache = ResolutionCache()
+        self.cache.enabled = True
+        self.distribution = SimpleNamespace(
+            pk=1,
+            repository_id="repo",
+            repository_version_id=None,
+            base_path="npm",
+            pulp_domain=SimpleNamespace(name="default"),
+        )
+
+    def test_set(self):
+        """Test that a resolution is cached until its repository changes."""
+        self.cache.set(
+            self.distribution, "version", "prefix", self.cache.generation(self.distribution)
+        )
+        self.assertEqual(self.cache.get(self.distribution), ("version", "prefix"))
+        self.cache.invalidate_repository("repo")
+        self.assertIsNone(self.cache.get(self.distribution))
+
+    def test_invalidated_while_querying(self):
+        """Test that a resolution is not cached if its repository changed during the query."""
+        generation = self.cache.generation(self.distribution)
+        self.cache.invalidate_repository("repo")
+        self.cache.set(self.distribution, "old version", "prefix", generation)
+        self.assertIsNone(self.cache.get(self.distribution))
+
+        generation = self.cache.generation(self.distribution)
+        self.cache.clear()
+        self.cache.set(self.distribution, "old version", "prefix", generation)
+        self.assertIsNone(self.cache.get(self.distribution))
+
+    def test_other_repository(self):
+        """Test that changes to other repositories do not prevent caching."""
+        generation = self.cache.generation(self.distribution)
+        self.cache.invalidate_repository("other")
+        self.cache.set(self.distribution, "version", "prefix", generation)
+        self.assertEqual(self.cache.get(self.distribution), ("version", "prefix"))
+
+
+class TestNotify(SimpleTestCase):
+    """Test notify."""
+
+    @mock.patch("pulp_npm.app.cache.connection")
+    @mock.patch("pulp_npm.app.cache.transaction.on_commit")
+    def test_on_commit(self, on_commit, connection):
+        """Test that the local caches are invalidated once the transaction commits."""
+        resolutions = mock.Mock()
+        with mock.patch("pulp_npm.app.cache.resolutions", resolutions):
+            notify_repository_changed("repo")
+            resolutions.invalidate_repository.assert_not_called()
+            on_commit.call_args.args[0]()
+        resolutions.invalidate_repository.assert_called_once_with("repo")
+
+
+@override_settings(NPM_TOKEN_CACHE_TTL=30)
+class TestTokenCache(SimpleTestCase):
+    """Test TokenCache."""
+
+    def setUp(self):
+        """Set up an enabled cache holding one token."""
+        self.cache = TokenCache()
+        self.cache.enabled = True
+        self.auth_token = SimpleNamespace(key="0123456789ab")
+        self.cache.set("digest", self.auth_token, self.cache.generation("0123456789ab"))
+
+    def test_get(self):
+        """Test that a cached token is returned until it expires."""
+        self.assertIs(self.cache.get("digest"), self.auth_token)
+        self.assertIsNone(self.cache.get("other"))
+        with mock.patch("pulp_npm.app.cache.time.monotonic", return_value=10**12):
+            self.assertIsNone(self.cache.get("digest"))
+
+    def test_invalidate_token(self):
+        """Test that a revoked token is dropped."""
+        self.cache.invalidate_token("0123456789ab")
+        self.assertIsNone(self.cache.get("digest"))
+
+    def test_least_recently_used(self):
+        """Test that the least recently used tokens are evicted first."""
+        self.cache.MAX_ENTRIES = 2
+        generation = self.cache.generation("0123456789ab")
+        self.cache.set("other", self.auth_token, generation)
+        self.cache.get("digest")
+        self.cache.set("third", self.auth_token, generation)
+        self.assertIs(self.cache.get("digest"), self.auth_token)
+        self.assertIsNone(self.cache.get("other"))
+        self.assertIs(self.cache.get("third"), self.auth_token)
+
+    def test_revoked_while_querying(self):
+        """Test that a token revoked while it was being verified is not cached."""
+        generation = self.cache.generation("0123456789ab")
+        self.cache.invalidate_token("0123456789ab")
+        self.cache.set("digest", self.auth_token, generation)
+        self.assertIsNone(self.cache.get("digest"))
+
+    def test_disabled(self):
+        """Test that nothing is cached while invalidations are not received."""
+        self.cache.enabled = False
+        self.assertIsNone(self.cache.get("digest"))
+        self.cache.set("other", self.auth_token, self.cache.generation("0123456789ab"))
+        self.cache.enabled = True
+        self.assertIsNone(self.cache.get("other"))
+
+
+class TestDistTagCache(SimpleTestCase):
+    """Test DistTagCache."""
+
+    def setUp(self):
+        """Set up an enabled cache holding the tags of two packages."""
+        self.cache = DistTagCache()
+        self.cache.enabled = True
+        self.cache.set("repo", "a", {"next": "2.0.0"}, self.cache.generation("repo", "a"))
+        self.cache.set("repo", "b", {}, self.cache.generation("repo", "b"))
+
+    def test_get(self):
+        """Test that names without tags are cached too."""
+        self.assertEqual(self.cache.get("repo", "a"), {"next": "2.0.0"})
+        self.assertEqual(self.cache.get("repo", "b"), {})
+        self.assertIsNone(self.cache.get("repo", "c"))
+
+    def test_invalidate(self):
+        """Test that only the changed name is dropped."""
+        with mock.patch("pulp_npm.app.cache.dist_tags", self.cache):
+            handle_notification('{"dist_tags": ["repo", "a"]}')
+        self.assertIsNone(self.cache.get("repo", "a"))
+        self.assertEqual(self.cache.get("repo", "b"), {})
+
+    def test_changed_while_querying(self):
+        """Test that tags changed while they were being queried are not cached."""
+        generation = self.cache.generation("repo", "c")
+        self.cache.invalidate("repo", "c")
+        self.cache.set("repo", "c", {"next": "1.0.0"}, generation)
+        self.assertIsNone(self.cache.get("repo", "c"))
+
+    def test_least_recently_used(self):
+        """Test that the least recently used names are evicted first."""
+        self.cache.MAX_ENTRIES = 2
+        self.cache.get("repo", "a")
+        self.cache.set("repo", "c", {}, self.cache.generation("repo", "c"))
+        self.assertEqual(self.cache.get("repo", "a"), {"next": "2.0.0"})
+        self.assertIsNone(self.cache.get("repo", "b"))
+        self.assertEqual(self.cache.get("repo", "c"), {})
@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from pulp_npm.app.tasks.importing import find_packages, packument_dist_tags
+
+
+class TestFindPackages(SimpleTestCase):
+    """Test find_packages."""
+
+    files = [
+        "lodash/package.json",
+        "lodash/lodash-4.17.21.tgz",
+        "@scope/tool/tool-1.0.0.tgz",
+        "left-pad/-/left-pad-1.3.0.tgz",
+        "@types/node/-/node-20.0.0.tgz",
+        "@types/node/-/node-18.0.0.tgz",
+        "stray-1.0.0.tgz",
+        "a/b/c/deep-1.0.0.tgz",
+        "lodash/README.md",
+    ]
+
+    def setUp(self):
+        """Lay out the files in a temporary directory."""
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        for path in self.files:
+            path = os.path.join(self.root.name, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as package_file:
+                package_file.write('{"dist-tags": {"latest": "4.17.21", "beta": 5}}')
+
+    def test_layouts(self):
+        """Test that Verdaccio and registry layouts are found, other tarballs left out."""
+        root = self.root.name
+        self.assertEqual(
+            find_packages(root),
+            {
+                "@scope/tool": [os.path.join(root, "@scope/tool/tool-1.0.0.tgz")],
+                "@types/node": [
+                    os.path.join(root, "@types/node/-/node-18.0.0.tgz"),
+                    os.path.join(root, "@types/node/-/node-20.0.0.tgz"),
+                ],
+                "left-pad": [os.path.join(root, "left-pad/-/left-pad-1.3.0.tgz")],
+                "lodash": [os.path.join(root, "lodash/lodash-4.17.21.tgz")],
+            },
+        )
+
+    def test_packument_dist_tags(self):
+        """Test that the dist-tags of a stored packument are read, invalid ones left out."""
+        root = self.root.name
+        self.assertEqual(
+            packument_dist_tags(os.path.join(root, "lodash/package.json")), {"latest": "4.17.21"}
+        )
+        self.assertEqual(packument_dist_tags(os.path.join(root, "left-pad/package.json")), {})
@@ -0,0 +1,87 @@
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from pulp_npm.app.metadata_index import MetadataIndex, build_index
+from pulp_npm.app.models import NpmRepository
+
+
+def row(name, version, dependencies=None):
+    """Make a row of PACKUMENT_FIELDS."""
+    return (
+        name,
+        version,
+        "~",
+        dependencies or {},
+        f"{name}/-/{name.split('/')[-1]}-{version}.tgz",
+        "sha1",
+        "sha512",
+        {"engines": {"node": ">=18"}},
+    )
+
+
+class TestMetadataIndex(SimpleTestCase):
+    """Test build_index and MetadataIndex."""
+
+    def setUp(self):
+        """Set up a temporary directory for the index."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "index.idx")
+
+    def build(self, rows):
+        """Write an index of rows and open it."""
+        with open(self.path, "wb") as index_file:
+            build_index(rows, index_file)
+        return MetadataIndex(self.path)
+
+    def test_round_trip(self):
+        """Test that the rows of every name are read back in order."""
+        # grouped in a collation order differing from the byte order the reader searches in
+        rows = [
+            row("@scope/tool", "1.0.0"),
+            row("lodash", "4.17.20"),
+            row("lodash", "4.17.21", {"dep": "^1"}),
+            row("Zebra", "0.1.0"),
+            row("ünicode", "2.0.0"),
+        ]
+        index = self.build(rows)
+        self.assertEqual((index.name_count, index.record_count), (4, 5))
+        self.assertEqual(index.rows("lodash"), rows[1:3])
+        self.assertEqual(index.rows("@scope/tool"), rows[:1])
+        self.assertEqual(index.rows("Zebra"), rows[3:4])
+        self.assertEqual(index.rows("ünicode"), rows[4:])
+        self.assertEqual(index.rows("missing"), [])
+
+    def test_empty(self):
+        """Test that an index without packages can be read."""
+        self.assertEqual(self.build([]).rows("lodash"), [])
+
+    def test_too_large(self):
+        """Test that data sections exceeding 32 bit offsets are refused."""
+        with mock.patch("pulp_npm.app.metadata_index.MAX_DATA_SIZE", 100):
+            with self.assertRaises(ValueError):
+                self.build([row("lodash", "4.17.21")])
+
+    def test_not_an_index(self):
+        """Test that other files are refused."""
+        with open(self.path, "wb") as index_file:
+            index_file.write(b"\0" * 64)
+        with self.assertRaises(ValueError):
+            MetadataIndex(self.path)
+
+
+class TestOnNewVersion(SimpleTestCase):
+    """Test NpmRepository.on_new_version."""
+
+    @mock.patch("pulp_npm.app.models.cache.notify_repository_changed")
+    @mock.patch("pulp_npm.app.models.metadata_index.write_index", side_effect=OSError)
+    def test_index_failure(self, write_index, notify_repository_changed):
+        """Test that failing to write the index does not fail the new version."""
+        repository = SimpleNamespace(pk="repo", pulp_domain_id="domain")
+        with self.assertLogs("pulp_npm.app.models", "ERROR"):
+            NpmRepository.on_new_version(repository, SimpleNamespace(pk="version"))
+        notify_repository_changed.assert_called_once_with("repo")
@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from pulp_npm.app.models import AuthToken, Package
+
+
+class TestVersionOrdering(SimpleTestCase):
+    """Test Package.set_version_ordering."""
+
+    def test_components(self):
+        """Test that the ordering columns are set from the version."""
+        package = Package(version="1.2.3-beta.1", pulp_domain_id=None, _pulp_domain_id=None)
+        package.set_version_ordering()
+        self.assertEqual(
+            (package.version_major, package.version_minor, package.version_patch),
+            (1, 2, 3),
+        )
+        self.assertEqual(package.version_prerelease, "1beta 00011")
+
+    def test_clamped(self):
+        """Test that numbers too large for the bigint columns are clamped."""
+        package = Package(
+            version="99999999999999999999.1.99999999999999999999",
+            pulp_domain_id=None,
+            _pulp_domain_id=None,
+        )
+        package.set_version_ordering()
+        self.assertEqual(
+            (package.version_major, package.version_minor, package.version_patch),
+            (Package.VERSION_NUMBER_MAX, 1, Package.VERSION_NUMBER_MAX),
+        )
+
+
+class TestAuthTokenExpiry(SimpleTestCase):
+    """Test AuthToken.is_expired."""
+
+    @override_settings(NPM_TOKEN_MAX_AGE=60)
+    def test_expired(self):
+        """Test that tokens expire after NPM_TOKEN_MAX_AGE seconds."""
+        self.assertFalse(AuthToken(created_at=timezone.now()).is_expired())
+        self.assertTrue(AuthToken(created_at=timezone.now() - timedelta(minutes=2)).is_expired())
+
+    @override_settings(NPM_TOKEN_MAX_AGE=0)
+    def test_never(self):
+        """Test that tokens never expire without NPM_TOKEN_MAX_AGE."""
+        self.assertFalse(AuthToken(created_at=timezone.now() - timedelta(days=10000)).is_expired())
+
+
+class TestAuthTokenIssue(TestCase):
+    """Test AuthToken.issue."""
+
+    def setUp(self):
+        """Set up a user."""
+        self.user = User.objects.create(username="npm-user")
+
+    @override_settings(NPM_MAX_TOKENS_PER_USER=2)
+    def test_oldest_deleted(self):
+        """Test that logging in again deletes the oldest tokens beyond the limit."""
+        tokens = [AuthToken.issue(self.user)[1] for _ in range(3)]
+
+        self.assertEqual(AuthToken.objects.filter(user=self.user).count(), 2)
+        self.assertIsNone(AuthToken.verify(tokens[0]))
+        self.assertIsNotNone(AuthToken.verify(tokens[2]))
+
+    @override_settings(NPM_TOKEN_MAX_AGE=60)
+    def test_expired_deleted(self):
+        """Test that logging in again deletes the expired tokens."""
+        expired, token = AuthToken.issue(self.user)
+        AuthToken.objects.filter(pk=expired.pk).update(
+            created_at=timezone.now() - timedelta(minutes=2)
+        )
+        self.assertIsNone(AuthToken.verify(token))
+
+        AuthToken.issue(self.user)
+        self.assertFalse(AuthToken.objects.filter(pk=expired.pk).exists())
@@ -0,0 +1,85 @@
+import base64
+import hashlib
+import io
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from rest_framework.exceptions import ParseError
+
+from pulp_npm.app.parsers import NpmPublishParser, PublishDocumentReader
+
+
+class TestNpmPublishParser(SimpleTestCase):
+    """Test NpmPublishParser."""
+
+    def test_spooled(self):
+        """Test that the document is spooled as is, without being hashed."""
+        body = json.dumps({"name": "package", "_attachments": {"x": {"data": "abcd" * 1000}}})
+        with mock.patch("pulp_npm.app.parsers.CHUNK_SIZE", 7):
+            upload = NpmPublishParser().parse(io.BytesIO(body.encode()))["document"]
+
+        self.assertEqual(upload.read(), body.encode())
+        self.assertEqual(upload.size, len(body))
+        self.assertEqual(upload.hashers["sha256"].hexdigest(), hashlib.sha256().hexdigest())
+
+
+class TestPublishDocumentReader(TestCase):
+    """Test PublishDocumentReader."""
+
+    def setUp(self):
+        """Set up a publish document."""
+        self.tarball = bytes(range(256)) * 1000
+        self.document = {
+            "name": "@scope/package",
+            "description": 'Tricky "strings" with } ] , : \\ characters',
+            "versions": {"1.0.0": {"name": "@scope/package", "version": "1.0.0"}},
+            "dist-tags": {"latest": "1.0.0"},
+            "_attachments": {
+                "@scope/package-1.0.0.tgz": {
+                    "content_type": "application/octet-stream",
+                    "data": base64.b64encode(self.tarball).decode(),
+                    "length": len(self.tarball),
+                }
+            },
+        }
+
+    def read(self, body, chunk_size):
+        """Read a document, returning it and its attachment."""
+        document = PublishDocumentReader(io.BytesIO(body), chunk_size=chunk_size).read()
+        attachment = document["_attachments"]["@scope/package-1.0.0.tgz"]
+        upload, attachment["data"] = attachment["data"], None
+        return document, upload
+
+    def test_attachment(self):
+        """Test that the attachment is decoded and hashed whatever the chunk size."""
+        expected = json.loads(json.dumps(self.document))
+        expected["_attachments"]["@scope/package-1.0.0.tgz"]["data"] = None
+        body = json.dumps(self.document, indent=2).replace("/", "\\/").encode()
+
+        for chunk_size in (1, 7, 4096, len(body)):
+            document, upload = self.read(body, chunk_size)
+            self.assertEqual(document, expected)
+            self.assertEqual(upload.read(), self.tarball)
+            self.assertEqual(upload.size, len(self.tarball))
+            self.assertEqual(
+                upload.hashers["sha256"].hexdigest(), hashlib.sha256(self.tarball).hexdigest()
+            )
+
+    def test_skip(self):
+        """Test that skipped attachments are left out without being decoded."""
+        expected = json.loads(json.dumps(self.document))
+        expected["_attachments"]["@scope/package-1.0.0.tgz"]["data"] = None
+        body = json.dumps(self.document, indent=2).replace("/", "\\/").encode()
+
+        for chunk_size in (1, 7, 4096, len(body)):
+            for options in ({"decode": False}, {"skip": {"@scope/package-1.0.0.tgz"}}):
+                reader = PublishDocumentReader(io.BytesIO(body), chunk_size=chunk_size, **options)
+                self.assertEqual(reader.read(), expected)
+                self.assertEqual(reader.attachments, {})
+
+    def test_invalid(self):
+        """Test that invalid documents are rejected."""
+        for body in (b'{"name":', b'{"name":"x}', b"]", b'{"_attachments":{"x":{"data":"abc"}}}'):
+            with self.assertRaises(ParseError):
+                PublishDocumentReader(io.BytesIO(body), chunk_size=3).read()
@@ -0,0 +1,327 @@
+import base64
+import io
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from pulp_npm.app.models import Package
+from pulp_npm.app.tasks.publishing import (
+    attachment_version,
+    batch_publish,
+    check_dist_tags,
+    create_package,
+    create_packages,
+    dispatch_publish,
+    ensure_published,
+    link_packages,
+    publish_pending,
+    publish_upload,
+    queue_publish,
+    validate_dist_tags,
+)
+
+
+class TestAttachmentVersion(SimpleTestCase):
+    """Test attachment_version."""
+
+    versions = {
+        "1.0.0": {"dist": {"tarball": "http://localhost/pkg/-/pkg-1.0.0.tgz"}},
+        "2.0.0": {"dist": {"tarball": "http://localhost/pkg/-/pkg-2.0.0.tgz"}},
+    }
+
+    def test_tarball_name(self):
+        """Test that attachments are matched on the tarball URL of each version."""
+        self.assertEqual(attachment_version("pkg", "pkg-2.0.0.tgz", self.versions), "2.0.0")
+        self.assertEqual(attachment_version("pkg", "pkg-1.0.0.tgz", self.versions), "1.0.0")
+
+    def test_single_version(self):
+        """Test that the only version of a document owns its attachment."""
+        self.assertEqual(attachment_version("pkg", "other.tgz", {"3.0.0": {}}), "3.0.0")
+
+    def test_unknown(self):
+        """Test that an attachment matching no version is rejected."""
+        with self.assertRaises(ValueError):
+            attachment_version("pkg", "pkg-3.0.0.tgz", self.versions)
+
+
+@mock.patch("pulp_npm.app.tasks.publishing.streams_to_storage", return_value=False)
+@mock.patch("pulp_npm.app.tasks.publishing.match_attachments", return_value={})
+@mock.patch("pulp_npm.app.tasks.publishing.link_packages")
+@mock.patch("pulp_npm.app.tasks.publishing.create_packages")
+@mock.patch("pulp_npm.app.tasks.publishing.NpmRepository")
+@mock.patch("pulp_npm.app.tasks.publishing.PulpTemporaryFile")
+class TestPublishUpload(SimpleTestCase):
+    """Test that publish_upload parses the document the parser spooled."""
+
+    document = {
+        "name": "pkg",
+        "versions": {"1.0.0": {"name": "pkg", "version": "1.0.0"}},
+        "_attachments": {"pkg-1.0.0.tgz": {"data": base64.b64encode(b"tarball").decode()}},
+    }
+
+    def spool(self, temp_file_class, body):
+        """Make the temporary file of the task hold a body."""
+        temp_file = temp_file_class.objects.get.return_value
+        temp_file.file.open.return_value = io.BytesIO(body)
+        return temp_file
+
+    def test_decoded(self, temp_file_class, repository_class, create_packages, link_packages, *_):
+        """Test that attachments are decoded by the task and the temporary file deleted."""
+        temp_file = self.spool(temp_file_class, json.dumps(self.document).encode())
+        tarballs = []
+
+        def read(document, *args):
+            tarballs.append(document["_attachments"]["pkg-1.0.0.tgz"]["data"].read())
+            return mock.DEFAULT
+
+        create_packages.side_effect = read
+        publish_upload("repository", "temp-file")
+
+        document, packages, artifacts = create_packages.call_args.args
+        self.assertEqual(tarballs, [b"tarball"])
+        self.assertEqual(document["versions"], self.document["versions"])
+        self.assertEqual((packages, artifacts), ({}, {}))
+        link_packages.assert_called_once_with(
+            repository_class.objects.get.return_value, document, create_packages.return_value
+        )
+        temp_file.delete.assert_called_once_with()
+
+    def test_existing_package(self, temp_file_class, repository_class, create_packages, *mocks):
+        """Test that the attachments of existing packages are not decoded."""
+        match_attachments = mocks[1]
+        package = mock.Mock(spec=Package)
+        match_attachments.return_value = {"pkg-1.0.0.tgz": package}
+        self.spool(temp_file_class, json.dumps(self.document).encode())
+        publish_upload("repository", "temp-file")
+
+        document, packages, artifacts = create_packages.call_args.args
+        self.assertIsNone(document["_attachments"]["pkg-1.0.0.tgz"]["data"])
+        self.assertEqual((packages, artifacts), ({"pkg-1.0.0.tgz": package.pk}, {}))
+
+    def test_existing_artifact(self, temp_file_class, repository_class, create_packages, *mocks):
+        """Test that the attachments of existing artifacts are not decoded."""
+        match_attachments = mocks[1]
+        artifact = mock.Mock()
+        match_attachments.return_value = {"pkg-1.0.0.tgz": artifact}
+        temp_file = self.spool(temp_file_class, json.dumps(self.document).encode())
+        document_file = temp_file.file.open.return_value
+        with mock.patch.object(document_file, "seek", wraps=document_file.seek) as seek:
+            publish_upload("repository", "temp-file")
+
+        # read once, without decoding, the attachment being known
+        seek.assert_not_called()
+
+        document, packages, artifacts = create_packages.call_args.args
+        self.assertIsNone(document["_attachments"]["pkg-1.0.0.tgz"]["data"])
+        self.assertEqual((packages, artifacts), ({}, {"pkg-1.0.0.tgz": artifact.pk}))
+
+    def test_cleanup(self, temp_file_class, repository_class, create_packages, link_packages, *_):
+        """Test that the decoded tarballs are closed when creating the packages fails."""
+        self.spool(temp_file_class, json.dumps(self.document).encode())
+        uploads = []
+
+        def fail(document, packages, artifacts):
+            uploads.append(document["_attachments"]["pkg-1.0.0.tgz"]["data"])
+            raise RuntimeError()
+
+        create_packages.side_effect = fail
+        with self.assertRaises(RuntimeError):
+            publish_upload("repository", "temp-file")
+
+        self.assertTrue(uploads[0].closed)
+        link_packages.assert_not_called()
+
+    def test_invalid(self, temp_file_class, repository_class, create_packages, *_):
+        """Test that an invalid document fails the task and still deletes the temporary file."""
+        for body in (b'{"name": "pkg", ', b"[]", b'{"versions": {}}'):
+            with self.subTest(body=body):
+                temp_file = self.spool(temp_file_class, body)
+                temp_file.delete.reset_mock()
+                with self.assertRaises(ValueError):
+                    publish_upload("repository", "temp-file")
+
+                create_packages.assert_not_called()
+                temp_file.delete.assert_called_once_with()
+
+
+@mock.patch("pulp_npm.app.tasks.publishing.NpmRepository")
+@mock.patch("pulp_npm.app.tasks.publishing.dispatch_publish")
+@mock.patch("pulp_npm.app.tasks.publishing.upcoming_publish")
+@mock.patch("pulp_npm.app.tasks.publishing.PendingPublish")
+@mock.patch("pulp_npm.app.tasks.publishing.transaction.on_commit")
+class TestQueuePublish(SimpleTestCase):
+    """Test that queued packages are always picked up by a publish task."""
+
+    repository = mock.Mock(pk="repository")
+    packages = [mock.Mock(pk="package")]
+
+    def test_dispatched(self, on_commit, pending_class, upcoming, dispatch, repository_class):
+        """Test that a task is dispatched if none is upcoming."""
+        upcoming.return_value = None
+        task = queue_publish(self.repository, self.packages)
+
+        self.assertEqual(task, dispatch.return_value)
+        on_commit.assert_not_called()
+        pending_class.objects.bulk_create.assert_called_once()
+
+    def test_upcoming(self, on_commit, pending_class, upcoming, dispatch, repository_class):
+        """Test that an upcoming task is reused, and checked again once committed."""
+        task = queue_publish(self.repository, self.packages)
+
+        self.assertEqual(task, upcoming.return_value)
+        dispatch.assert_not_called()
+        on_commit.assert_called_once()
+
+    def test_started_before_commit(
+        self, on_commit, pending_class, upcoming, dispatch, repository_class
+    ):
+        """Test that a task is dispatched if the reused one started before the commit."""
+        queue_publish(self.repository, self.packages)
+        upcoming.return_value = None
+        on_commit.call_args.args[0]()
+
+        dispatch.assert_called_once_with(repository_class.objects.get.return_value)
+
+    def test_ensure_published(self, on_commit, pending_class, upcoming, dispatch, repository_class):
+        """Test that nothing is dispatched if the packages are picked up or already added."""
+        ensure_published("repository", ["package"])
+        dispatch.assert_not_called()
+
+        pending_class.objects.filter.return_value.exists.return_value = False
+        upcoming.return_value = None
+        ensure_published("repository", ["package"])
+        dispatch.assert_not_called()
+
+
+@mock.patch("pulp_npm.app.tasks.publishing.dispatch")
+class TestBatchPublish(SimpleTestCase):
+    """Test that the repository is not locked while waiting for more packages."""
+
+    repository = mock.Mock(pk="repository")
+
+    @override_settings(NPM_PUBLISH_BATCH_WINDOW=1.0)
+    def test_window(self, dispatch):
+        """Test that a batch_publish task without the repository lock is dispatched."""
+        dispatch_publish(self.repository)
+
+        self.assertEqual(dispatch.call_args.args, (batch_publish,))
+        self.assertNotIn("exclusive_resources", dispatch.call_args.kwargs)
+
+    @override_settings(NPM_PUBLISH_BATCH_WINDOW=0)
+    def test_no_window(self, dispatch):
+        """Test that publish_pending is dispatched directly without a window."""
+        dispatch_publish(self.repository)
+
+        self.assertEqual(dispatch.call_args.args, (publish_pending,))
+        self.assertEqual(dispatch.call_args.kwargs["exclusive_resources"], [self.repository])
+
+    @override_settings(NPM_PUBLISH_BATCH_WINDOW=1.0)
+    @mock.patch("pulp_npm.app.tasks.publishing.NpmRepository")
+    @mock.patch("pulp_npm.app.tasks.publishing.time.sleep")
+    def test_batch_publish(self, sleep, repository_class, dispatch):
+        """Test that publish_pending is dispatched once the window is over."""
+        batch_publish("repository")
+
+        sleep.assert_called_once_with(1.0)
+        self.assertEqual(dispatch.call_args.args, (publish_pending,))
+        self.assertEqual(
+            dispatch.call_args.kwargs["exclusive_resources"],
+            [repository_class.objects.get.return_value],
+        )
+
+
+class TestCreatePackages(SimpleTestCase):
+    """Test create_packages."""
+
+    def test_no_data(self):
+        """Test that attachments without data are rejected."""
+        for attachments in ({"pkg-1.0.0.tgz": {}}, {"pkg-1.0.0.tgz": {"data": None}}, []):
+            with self.subTest(attachments=attachments):
+                document = {"name": "pkg", "versions": {"1.0.0": {}}, "_attachments": attachments}
+                with self.assertRaises(ValueError):
+                    create_packages(document)
+
+    @mock.patch("pulp_npm.app.tasks.publishing.get_domain")
+    @mock.patch("pulp_npm.app.tasks.publishing.Package")
+    def test_existing_in_domain(self, package_class, get_domain):
+        """Test that existing packages are only looked up in the current domain."""
+        upload = mock.Mock(package_json={"name": "pkg", "version": "1.0.0"})
+        package = create_package("pkg", "pkg-1.0.0.tgz", upload, {"1.0.0": {}})
+
+        package_class.objects.filter.assert_called_once_with(
+            _pulp_domain=get_domain.return_value, name="pkg", version="1.0.0"
+        )
+        self.assertEqual(package, package_class.objects.filter.return_value.first.return_value)
+        upload.close.assert_called_once_with()
+
+
+@mock.patch("pulp_npm.app.tasks.publishing.repository_version_packages")
+@mock.patch("pulp_npm.app.tasks.publishing.Package")
+@mock.patch("pulp_npm.app.tasks.publishing.get_domain")
+class TestCheckDistTags(SimpleTestCase):
+    """Test check_dist_tags."""
+
+    def test_published(self, get_domain, package_class, repository_version_packages):
+        """Test that tags may point to the versions being published, without any query."""
+        check_dist_tags(mock.Mock(), "pkg", {"latest": "1.0.0"}, [mock.Mock(version="1.0.0")])
+        package_class.objects.filter.assert_not_called()
+
+    def test_domain(self, get_domain, package_class, repository_version_packages):
+        """Test that other versions are only looked up in the current domain."""
+        repository = mock.Mock()
+        in_repository = repository_version_packages.return_value.filter.return_value
+        in_repository.values_list.return_value = ["2.0.0"]
+
+        check_dist_tags(repository, "pkg", {"next": "2.0.0"}, [])
+
+        package_class.objects.filter.assert_called_once_with(
+            _pulp_domain=get_domain.return_value, name="pkg", version__in=["2.0.0"]
+        )
+        repository_version_packages.assert_called_once_with(
+            repository.latest_version.return_value, get_domain.return_value.pk
+        )
+
+    def test_unknown(self, get_domain, package_class, repository_version_packages):
+        """Test that tags pointing to versions found nowhere are rejected."""
+        repository_version_packages.return_value.filter.return_value.values_list.return_value = []
+        candidates = package_class.objects.filter.return_value
+        candidates.filter.return_value.values_list.return_value = []
+
+        with self.assertRaises(ValueError):
+            check_dist_tags(mock.Mock(), "pkg", {"next": "2.0.0"}, [])
+
+
+class TestValidateDistTags(SimpleTestCase):
+    """Test validate_dist_tags."""
+
+    def test_valid(self):
+        """Test that string tags pointing to string versions are accepted."""
+        validate_dist_tags("pkg", {"latest": "1.0.0", "next": "2.0.0-rc.1"})
+        validate_dist_tags("pkg", {})
+
+    def test_invalid(self):
+        """Test that other values are rejected before reaching the database."""
+        for dist_tags in (
+            [],
+            "1.0.0",
+            {"latest": 1},
+            {"latest": ["1.0.0"]},
+            {"latest": {"version": "1.0.0"}},
+            {"latest": None},
+            {"latest": ""},
+            {"": "1.0.0"},
+            {"latest": "1" * 129},
+        ):
+            with self.subTest(dist_tags=dist_tags):
+                with self.assertRaises(ValueError):
+                    validate_dist_tags("pkg", dist_tags)
+
+    @mock.patch("pulp_npm.app.tasks.publishing.store_dist_tags")
+    @mock.patch("pulp_npm.app.tasks.publishing.check_dist_tags")
+    def test_link_packages(self, check_dist_tags, store_dist_tags):
+        """Test that a document with invalid dist-tags is rejected before anything is stored."""
+        with self.assertRaises(ValueError):
+            link_packages(mock.Mock(), {"name": "pkg", "dist-tags": {"latest": 1}}, [])
+        check_dist_tags.assert_not_called()
+        store_dist_tags.assert_not_called()
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from aiohttp import ClientConnectionError
+from django.test import SimpleTestCase, override_settings
+
+from pulpcore.plugin.exceptions import TimeoutException
+
+from pulp_npm.app import pull_through
+from pulp_npm.app.cache import NegativeCache, PackumentCache, SingleFlight
+
+ERRORS = (
+    ClientConnectionError(),
+    TimeoutException("http://registry/lodash"),
+    asyncio.TimeoutError(),
+)
+
+
+@override_settings(NPM_METADATA_STALE_WHILE_REVALIDATE=3600, NPM_METADATA_STALE_IF_ERROR=86400)
+class TestFetchPackument(SimpleTestCase):
+    """Test fetch_packument."""
+
+    def setUp(self):
+        """Set up empty caches and a distribution whose remote fails."""
+        self.packuments = PackumentCache(1024)
+        for name, value in (
+            ("upstream_packuments", self.packuments),
+            ("missing_upstream", NegativeCache(60, 100)),
+            ("upstream_fetches", SingleFlight()),
+        ):
+            patcher = mock.patch.object(pull_through, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.downloader = SimpleNamespace(run=mock.AsyncMock())
+        remote = SimpleNamespace(
+            get_downloader=mock.Mock(return_value=self.downloader),
+            get_remote_artifact_url=mock.Mock(return_value="http://registry/lodash"),
+        )
+        self.distribution = SimpleNamespace(
+            pk=1,
+            remote_id=2,
+            metadata_ttl=300,
+            remote=SimpleNamespace(acast=mock.AsyncMock(return_value=remote)),
+        )
+
+    def cache(self, body, age):
+        """Cache a packument fetched ``age`` seconds ago."""
+        key = pull_through._cache_key(self.distribution, "lodash")
+        self.packuments.set(key, body)
+        self.packuments._entries[key] = (body, time.monotonic() - age)
+
+    def fetch(self):
+        """Fetch the packument of lodash."""
+        return asyncio.run(pull_through.fetch_packument(self.distribution, "lodash"))
+
+    def test_stale_if_error(self):
+        """Test that a stale packument is served when the remote fails or times out."""
+        for error in ERRORS:
+            with self.subTest(error=type(error).__name__):
+                self.cache(b"stale", 300 + 7200)
+                self.downloader.run.side_effect = error
+                self.assertEqual(self.fetch(), b"stale")
+
+    def test_error_without_cache(self):
+        """Test that failures are raised when there is nothing to fall back to."""
+        for error in ERRORS:
+            with self.subTest(error=type(error).__name__):
+                self.downloader.run.side_effect = error
+                with self.assertRaises(type(error)):
+                    self.fetch()
+
+    def test_too_stale(self):
+        """Test that packuments older than the stale-if-error window are not served."""
+        self.cache(b"stale", 300 + 86400 + 1)
+        self.downloader.run.side_effect = ERRORS[1]
+        with self.assertRaises(TimeoutException):
+            self.fetch()
+
+
+class TestPrefetch(SimpleTestCase):
+    """Test the prefetching of pull-through distributions."""
+
+    def test_tarball_not_added(self):
+        """Test that prefetched tarballs are not added to the repository of the distribution."""
+        repository = mock.Mock()
+        distribution = SimpleNamespace(
+            pk=1, remote_id=2, name="npm", prefetch_depth=1, repository=repository
+        )
+        entry = {"name": "lodash", "version": "4.17.21", "dist": {"tarball": "http://t"}}
+        body = json.dumps(
+            {"name": "lodash", "dist-tags": {"latest": "4.17.21"}, "versions": {"4.17.21": entry}}
+        ).encode()
+        fetch_tarball = mock.AsyncMock(return_value=mock.Mock())
+        with mock.patch.object(pull_through, "fetch_tarball", fetch_tarball):
+            asyncio.run(
+                pull_through._prefetch_root(distribution, "remote", asyncio.Semaphore(1), body)
+            )
+        fetch_tarball.assert_awaited_once_with("remote", entry)
+        self.assertEqual(repository.mock_calls, [])
@@ -0,0 +1,38 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+from aiohttp import ClientConnectionError
+from django.test import SimpleTestCase
+
+from pulpcore.plugin.exceptions import TimeoutException
+
+from pulp_npm.app.responses import PackumentResponse
+
+
+class TestPrepareUpstream(SimpleTestCase):
+    """Test PackumentResponse._prepare_upstream."""
+
+    def prepare(self, error):
+        """Prepare a response whose remote fails with an error."""
+        distribution = SimpleNamespace(remote=object())
+        response = PackumentResponse(distribution, "lodash")
+        fetch = mock.AsyncMock(side_effect=error)
+        prepare_body = mock.AsyncMock()
+        with mock.patch("pulp_npm.app.responses.pull_through.fetch_packument", fetch):
+            with mock.patch.object(response, "_prepare_body", prepare_body):
+                asyncio.run(response._prepare_upstream(mock.Mock()))
+        return response.status, json.loads(prepare_body.call_args.args[1])
+
+    def test_unreachable(self):
+        """Test that unreachable or slow remotes are answered with a 502."""
+        for error in (
+            ClientConnectionError(),
+            TimeoutException("http://registry/lodash"),
+            asyncio.TimeoutError(),
+        ):
+            with self.subTest(error=type(error).__name__):
+                self.assertEqual(
+                    self.prepare(error), (502, {"error": "Upstream registry unreachable"})
+                )
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage
+from django.test import SimpleTestCase
+
+from pulpcore.plugin.models import Artifact
+from pulp_npm.app.storage import StorageUpload, copy_local_file, move
+
+
+class TestMove(SimpleTestCase):
+    """Test move."""
+
+    def setUp(self):
+        """Set up a storage holding a temporary file."""
+        self.storage = InMemoryStorage()
+        self.storage.save("tmp/npm/upload", ContentFile(b"tarball"))
+
+    def test_move(self):
+        """Test that the file is moved to its destination."""
+        move(self.storage, "tmp/npm/upload", "artifact/ab/cdef")
+
+        self.assertFalse(self.storage.exists("tmp/npm/upload"))
+        with self.storage.open("artifact/ab/cdef", "rb") as moved:
+            self.assertEqual(moved.read(), b"tarball")
+
+    def test_existing(self):
+        """Test that an existing destination is left as is and the source still removed."""
+        self.storage.save("artifact/ab/cdef", ContentFile(b"existing"))
+        move(self.storage, "tmp/npm/upload", "artifact/ab/cdef")
+
+        self.assertFalse(self.storage.exists("tmp/npm/upload"))
+        with self.storage.open("artifact/ab/cdef", "rb") as existing:
+            self.assertEqual(existing.read(), b"existing")
+
+
+class S3LikeStorage:
+    """An in-memory storage with a bucket, like ``storages.backends.s3.S3Storage``."""
+
+    location = "media/"
+
+    def __init__(self):
+        self.files = InMemoryStorage()
+        self.bucket = mock.Mock()
+        self.bucket.name = "pulp"
+
+    def exists(self, name):
+        return self.files.exists(name)
+
+    def delete(self, name):
+        self.files.delete(name)
+
+    def get_object_parameters(self, name):
+        return {"ContentType": "application/octet-stream"}
+
+    def open(self, name, mode="rb"):
+        raise AssertionError("The file was read back.")
+
+    def save(self, name, content):
+        raise AssertionError("The file was uploaded again.")
+
+
+class TestMoveS3(SimpleTestCase):
+    """Test move with an S3 compatible storage."""
+
+    def test_server_side_copy(self):
+        """Test that the object is copied on the server, without being read back."""
+        storage = S3LikeStorage()
+        storage.files.save("tmp/npm/upload", ContentFile(b"tarball"))
+        move(storage, "tmp/npm/upload", "artifact/ab/cdef")
+
+        storage.bucket.copy.assert_called_once_with(
+            {"Bucket": "pulp", "Key": "media/tmp/npm/upload"},
+            "media/artifact/ab/cdef",
+            ExtraArgs={"ContentType": "application/octet-stream"},
+        )
+        self.assertFalse(storage.exists("tmp/npm/upload"))
+
+
+class TestCopyLocalFile(SimpleTestCase):
+    """Test copy_local_file."""
+
+    def test_copy(self):
+        """Test that a local file is copied once, leaving the original in place."""
+        storage = InMemoryStorage()
+        with tempfile.NamedTemporaryFile() as local_file:
+            local_file.write(b"tarball")
+            local_file.flush()
+            self.assertEqual(copy_local_file(storage, local_file.name, "a/b"), "a/b")
+            self.assertEqual(copy_local_file(storage, local_file.name, "a/b"), "a/b")
+            self.assertTrue(os.path.exists(local_file.name))
+
+        self.assertEqual(storage.listdir("a"), ([], ["b"]))
+
+
+@mock.patch("pulp_npm.app.storage.get_domain")
+class TestStorageUpload(SimpleTestCase):
+    """Test StorageUpload."""
+
+    def upload(self, get_domain):
+        """Create an upload to an in-memory storage holding a tarball."""
+        self.storage = InMemoryStorage()
+        get_domain.return_value.get_storage.return_value = self.storage
+        upload = StorageUpload("package-1.0.0.tgz")
+        for chunk in (b"tar", b"ball"):
+            upload.write(chunk)
+            upload.size += len(chunk)
+            for hasher in upload.hashers.values():
+                hasher.update(chunk)
+        return upload
+
+    def test_read_back(self, get_domain):
+        """Test that the tarball is written to the storage and read back from it."""
+        upload = self.upload(get_domain)
+        upload.seek(0)
+
+        self.assertEqual(upload.read(), b"tarball")
+        self.assertTrue(self.storage.exists(upload.storage_name))
+
+    def test_close(self, get_domain):
+        """Test that closing removes the tarball from the storage, once."""
+        upload = self.upload(get_domain)
+        upload.close()
+        upload.close()
+
+        self.assertFalse(self.storage.exists(upload.storage_name))
+
+    @mock.patch("pulp_npm.app.storage.Artifact")
+    def test_existing_artifact(self, artifact_class, get_domain):
+        """Test that the tarball of an existing artifact is removed from the storage."""
+        artifact_class.DIGEST_FIELDS = Artifact.DIGEST_FIELDS
+        upload = self.upload(get_domain)
+        existing = artifact_class.objects.filter.return_value.first.return_value
+
+        self.assertEqual(upload.save_artifact(), existing)
+        self.assertFalse(self.storage.exists(upload.storage_name))
+        self.assertEqual(
+            artifact_class.call_args.kwargs["sha256"], hashlib.sha256(b"tarball").hexdigest()
+        )
+        existing.touch.assert_called_once_with()
+
+    @mock.patch("pulp_npm.app.storage.transaction")
+    @mock.patch("pulp_npm.app.storage.Artifact")
+    def test_new_artifact(self, artifact_class, transaction, get_domain):
+        """Test that the tarball of a new artifact is moved to the artifact path."""
+        artifact_class.DIGEST_FIELDS = Artifact.DIGEST_FIELDS
+        upload = self.upload(get_domain)
+        artifact_class.objects.filter.return_value.first.return_value = None
+        artifact = artifact_class.return_value
+        artifact.storage_path.return_value = "artifact/ab/cdef"
+
+        self.assertEqual(upload.save_artifact(), artifact)
+        artifact.save.assert_called_once_with()
+        self.assertFalse(self.storage.exists(upload.storage_name))
+        with self.storage.open("artifact/ab/cdef", "rb") as stored:
+            self.assertEqual(stored.read(), b"tarball")
+
+        upload.close()
+        self.assertTrue(self.storage.exists("artifact/ab/cdef"))
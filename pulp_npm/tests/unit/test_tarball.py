@@ -0,0 +1,92 @@
+import hashlib
+import io
+import json
+import tarfile
+import tempfile
+import unittest
+
+from pulp_npm.app.tarball import TarballReader, inspect_tarball
+
+
+def make_tarball(files, tar_format=tarfile.PAX_FORMAT):
+    """Make a gzipped tarball holding the given {path: bytes}."""
+    tarball = io.BytesIO()
+    with tarfile.open(fileobj=tarball, mode="w:gz", format=tar_format) as archive:
+        for path, data in files.items():
+            info = tarfile.TarInfo(path)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return tarball.getvalue()
+
+
+class TestTarballReader(unittest.TestCase):
+    """Test TarballReader."""
+
+    def setUp(self):
+        """Set up the package files."""
+        self.package_json = {
+            "name": "@scope/tool",
+            "version": "1.0.0",
+            "bin": "cli.js",
+            "engines": {"node": ">=18"},
+            "peerDependencies": {"react": "^18"},
+            "scripts": {"postinstall": "node setup.js", "test": "jest"},
+            "devDependencies": {"jest": "^29"},
+        }
+        self.files = {
+            "package/package.json": json.dumps(self.package_json).encode(),
+            "package/cli.js": b"#!/usr/bin/env node\n" * 100,
+            "package/lib/" + "deep/" * 30 + "index.js": b"module.exports = 1;\n",
+            "package/node_modules/dep/package.json": b'{"name": "dep"}',
+        }
+
+    def read(self, tarball, chunk_size):
+        """Feed a tarball to a reader in chunks."""
+        reader = TarballReader()
+        for start in range(0, len(tarball), chunk_size):
+            reader.feed(tarball[start : start + chunk_size])
+        return reader
+
+    def test_manifest(self):
+        """Test that the manifest and the statistics are read whatever the chunk size."""
+        expected = {
+            "bin": {"tool": "cli.js"},
+            "engines": {"node": ">=18"},
+            "peerDependencies": {"react": "^18"},
+            "hasInstallScript": True,
+            "dist": {
+                "fileCount": 4,
+                "unpackedSize": sum(len(data) for data in self.files.values()),
+            },
+        }
+        for tar_format in (tarfile.PAX_FORMAT, tarfile.GNU_FORMAT, tarfile.USTAR_FORMAT):
+            tarball = make_tarball(self.files, tar_format)
+            for chunk_size in (1, 100, 4096, len(tarball)):
+                with self.subTest(tar_format=tar_format, chunk_size=chunk_size):
+                    reader = self.read(tarball, chunk_size)
+                    self.assertIsNone(reader.error)
+                    self.assertEqual(reader.manifest(), expected)
+
+    def test_not_a_tarball(self):
+        """Test that invalid tarballs have no manifest."""
+        self.assertIsNone(self.read(b"not gzip data", 4).manifest())
+        tarball = make_tarball({"package/index.js": b""})
+        self.assertIsNone(self.read(tarball, 100).manifest())
+
+    def test_inspect_tarball(self):
+        """Test that a tarball file is hashed and its package.json read."""
+        tarball = make_tarball(self.files)
+        with tempfile.NamedTemporaryFile(suffix=".tgz") as tarball_file:
+            tarball_file.write(tarball)
+            tarball_file.flush()
+            result = inspect_tarball(tarball_file.name, ["sha1", "sha256"])
+        self.assertEqual(result["size"], len(tarball))
+        self.assertEqual(
+            result["digests"],
+            {
+                "sha1": hashlib.sha1(tarball).hexdigest(),
+                "sha256": hashlib.sha256(tarball).hexdigest(),
+            },
+        )
+        self.assertEqual(result["package_json"], self.package_json)
+        self.assertEqual(result["manifest"], self.read(tarball, len(tarball)).manifest())
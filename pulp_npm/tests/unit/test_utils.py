@@ -0,0 +1,100 @@
+import unittest
+
+from pulp_npm.app.utils import (
+    PRERELEASE_KEY_LENGTH,
+    RELEASE_KEY,
+    lockfile_packages,
+    parse_package_spec,
+    semver_sort_key,
+)
+
+
+class TestSemverSortKey(unittest.TestCase):
+    """Test semver_sort_key."""
+
+    def test_components(self):
+        """Test that the version is split into its components."""
+        self.assertEqual(semver_sort_key("1.2.3"), (1, 2, 3, RELEASE_KEY))
+        self.assertEqual(semver_sort_key("v1.2.3+build.5"), (1, 2, 3, RELEASE_KEY))
+        self.assertEqual(semver_sort_key("not-a-version"), (0, 0, 0, ""))
+
+    def test_precedence(self):
+        """Test that keys sort in semver precedence order."""
+        expected = [
+            "0.9.0",
+            "1.0.0-alpha",
+            "1.0.0-alpha.1",
+            "1.0.0-alpha.beta",
+            "1.0.0-beta",
+            "1.0.0-beta.2",
+            "1.0.0-beta.11",
+            "1.0.0-rc.1",
+            "1.0.0",
+            "1.9.0",
+            "1.10.0",
+        ]
+        self.assertEqual(sorted(reversed(expected), key=semver_sort_key), expected)
+
+    def test_long_numeric_identifiers(self):
+        """Test that numeric identifiers of any length sort numerically."""
+        expected = [
+            "1.0.0-9",
+            "1.0.0-99999999999",
+            "1.0.0-100000000000",
+            "1.0.0-1" + "0" * 100,
+        ]
+        self.assertEqual(sorted(reversed(expected), key=semver_sort_key), expected)
+
+    def test_key_length(self):
+        """Test that the key of the longest versions fits the version_prerelease column."""
+        version = "1.0.0-" + ".".join(["1"] * 61)
+        self.assertEqual(len(version), 127)
+        self.assertEqual(len(semver_sort_key(version)[3]), PRERELEASE_KEY_LENGTH)
+
+
+class TestParsePackageSpec(unittest.TestCase):
+    """Test parse_package_spec."""
+
+    def test_specs(self):
+        """Test that names, scopes and versions are told apart."""
+        self.assertEqual(parse_package_spec("lodash@4.17.21"), ("lodash", "4.17.21"))
+        self.assertEqual(parse_package_spec("@types/node@20.1.0"), ("@types/node", "20.1.0"))
+        self.assertEqual(parse_package_spec("@types/node"), ("@types/node", "latest"))
+        self.assertEqual(parse_package_spec("react@next"), ("react", "next"))
+        self.assertEqual(parse_package_spec("react"), ("react", "latest"))
+
+
+class TestLockfilePackages(unittest.TestCase):
+    """Test lockfile_packages."""
+
+    def test_lockfile_v3(self):
+        """Test that the packages of a version 2 or 3 lockfile are listed."""
+        lockfile = {
+            "lockfileVersion": 3,
+            "packages": {
+                "": {"name": "app", "version": "1.0.0"},
+                "node_modules/@types/node": {"version": "20.1.0"},
+                "node_modules/a/node_modules/b": {"version": "2.0.0"},
+                "node_modules/alias": {"name": "real", "version": "3.0.0"},
+                "node_modules/local": {"resolved": "../local", "link": True},
+                "node_modules/git": {"version": "git+ssh://git@example.com/git.git#abc"},
+            },
+        }
+        self.assertEqual(
+            lockfile_packages(lockfile),
+            [("@types/node", "20.1.0"), ("b", "2.0.0"), ("real", "3.0.0")],
+        )
+
+    def test_lockfile_v1(self):
+        """Test that the nested dependencies of a version 1 lockfile are listed."""
+        lockfile = {
+            "lockfileVersion": 1,
+            "dependencies": {
+                "a": {"version": "1.0.0", "dependencies": {"b": {"version": "2.0.0"}}},
+                "c": {"version": "npm:d@4.0.0"},
+                "e": {"version": "5.0.0", "bundled": True},
+            },
+        }
+        self.assertEqual(
+            lockfile_packages(lockfile), [("a", "1.0.0"), ("b", "2.0.0"), ("d", "4.0.0")]
+        )